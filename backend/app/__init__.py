@@ -7,12 +7,16 @@ from flask_marshmallow import Marshmallow
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 from flask_talisman import Talisman
+import redis
 from config import Config
 from .celery_app import create_celery_app
 from .translations import init_babel
 from .security import init_security, SecurityConfig, audit_log
+from .db_routing import RoutingSession, init_db_routing
+from .lazy import LazyService
+from .services.storage import create_storage
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 migrate = Migrate()
 jwt = JWTManager()
 ma = Marshmallow()
@@ -23,6 +27,12 @@ def create_app(config_class=Config):
     app = Flask(__name__)
     app.config.from_object(config_class)
 
+    # Shared Redis client (connections are opened lazily)
+    app.redis = redis.Redis.from_url(app.config['REDIS_URL'])
+
+    # Object storage for uploads, shared by web and worker processes
+    app.storage = LazyService(lambda: create_storage(app.config))
+
     # Initialize security features
     init_security(app)
     
@@ -36,7 +46,8 @@ def create_app(config_class=Config):
     # Initialize rate limiting
     limiter.init_app(app)
     
-    # Initialize database
+    # Initialize database (replica bind must be configured before init_app)
+    init_db_routing(app)
     db.init_app(app)
     migrate.init_app(app, db)
     
@@ -103,11 +114,44 @@ def create_app(config_class=Config):
     from app.api.language import bp as language_bp
     app.register_blueprint(language_bp, url_prefix='/api')
 
-    # Create upload directory if it doesn't exist
-    import os
-    if not os.path.exists('uploads'):
-        os.makedirs('uploads')
+    from app.api.jobs import bp as jobs_bp
+    app.register_blueprint(jobs_bp, url_prefix='/api')
+
+    from app.api.uploads import bp as uploads_bp
+    app.register_blueprint(uploads_bp, url_prefix='/api')
+
+    from app.api.meters import bp as meters_bp
+    app.register_blueprint(meters_bp, url_prefix='/api')
+
+    from app.api.notifications import bp as notifications_bp
+    app.register_blueprint(notifications_bp, url_prefix='/api')
+
+    # Register maintenance commands (flask rebuild-search-documents, ...)
+    from app.commands import register_commands
+    register_commands(app)
 
     return app
 
+def reinit_after_fork(app):
+    """Recreate per-process resources in a worker forked from a preloaded master.
+
+    Connections, clients and background threads inherited from the master
+    must not be shared, while the imported code and app object stay shared
+    copy-on-write.
+    """
+    import logging
+    from .security.audit_logging import init_audit_logging
+
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+    app.redis.connection_pool.reset()
+    for service in (app.data_encryption, app.field_encryption, app.secure_file_handler, app.storage):
+        service.reset()
+    init_audit_logging(app, logging.getLogger('app.security'))
+
 from app import models
+from app.services import bill_search  # registers search document maintenance
+from app.services import spend_summary  # registers cache invalidation
+from app.services import hierarchy  # registers tree maintenance
+from app.services import effective_dates  # registers index invalidation
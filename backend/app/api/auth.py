@@ -1,10 +1,14 @@
 from flask import jsonify, request
-from flask_jwt_extended import create_access_token, get_jwt_identity, jwt_required
+from flask_jwt_extended import create_access_token, jwt_required
 from app import db
 from app.api import bp
 from app.models import User
+from app.principal import get_current_user
+from app.security.login_guard import LoginOverloaded
+from app.security.middleware import rate_limit
 
 @bp.route('/auth/register', methods=['POST'])
+@rate_limit(5, 300)
 def register():
     data = request.get_json()
     
@@ -19,11 +23,17 @@ def register():
     return jsonify({'message': 'User registered successfully'}), 201
 
 @bp.route('/auth/login', methods=['POST'])
+@rate_limit(10, 60)
 def login():
     data = request.get_json()
     user = User.query.filter_by(email=data['email']).first()
     
-    if user and user.check_password(data['password']):
+    try:
+        authenticated = user is not None and user.check_password(data['password'])
+    except LoginOverloaded:
+        return jsonify({'error': 'Too many login attempts, try again shortly'}), 503, {'Retry-After': '1'}
+
+    if authenticated:
         access_token = create_access_token(identity=user.id)
         return jsonify({'access_token': access_token}), 200
     
@@ -32,11 +42,9 @@ def login():
 @bp.route('/auth/user', methods=['GET'])
 @jwt_required()
 def get_user():
-    current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
-    
+    user = get_current_user()
     return jsonify({
-        'id': user.id,
-        'email': user.email,
-        'name': user.name
+        'id': user['id'],
+        'email': user['email'],
+        'name': user['name']
     })
@@ -1,56 +1,97 @@
-from flask import Blueprint, request, jsonify
-from werkzeug.utils import secure_filename
-import os
+from datetime import date, datetime
+from flask import Blueprint, request, jsonify, current_app
+import uuid
 from app import db
-from app.models import Bill, BillAudit, LinkedAccountMeter
-from app.schemas import BillSchema, BillAuditSchema
-from app.tasks import process_bill_file, export_bills_to_accounting
+from app.models import Bill, BillAudit, BillReview, LinkedAccountMeter, Meter, Site
+from app.schemas import BillSchema, BillAuditSchema, BillReviewSchema, BillSearchResultSchema
+from app.tasks import enqueue_bill_file, export_bills_to_accounting
 from flask_jwt_extended import jwt_required
+from app.db_routing import read_only
+from app.principal import get_current_user
+from app.security.middleware import sanitize_response
+from app.security.sanitizer import SafeFields, safe_fields_from_schema
+from app.services.progress import register_job
+from app.services.storage import make_upload_key
+from app.services.file_inspection import InspectingReader
+from app.services.bill_processor import BillProcessor
+from app.services import bill_search
 
 bp = Blueprint('bills', __name__)
 bill_schema = BillSchema()
 bills_schema = BillSchema(many=True)
 bill_audit_schema = BillAuditSchema(many=True)
+bill_search_schema = BillSearchResultSchema(many=True)
+bill_review_schema = BillReviewSchema()
+bill_reviews_schema = BillReviewSchema(many=True)
 
-UPLOAD_FOLDER = 'uploads'
-if not os.path.exists(UPLOAD_FOLDER):
-    os.makedirs(UPLOAD_FOLDER)
+SEARCH_PAGE_SIZE = 50
+SEARCH_MAX_PAGE_SIZE = 200
+REVIEW_PAGE_SIZE = 50
 
 @bp.route('/bills', methods=['POST'])
 @jwt_required()
 def create_bill():
-    """Upload and process a new bill"""
-    if 'file' not in request.files:
-        return jsonify({'error': 'No file provided'}), 400
-    
-    file = request.files['file']
-    if file.filename == '':
-        return jsonify({'error': 'No file selected'}), 400
+    """
+    Upload and process a new bill.
 
-    linked_account_meter_id = request.form.get('linked_account_meter_id')
-    if not linked_account_meter_id:
-        return jsonify({'error': 'linked_account_meter_id is required'}), 400
+    Accepts either a multipart form with ``file`` and
+    ``linked_account_meter_id`` fields, or the raw file as the request body
+    with ``X-Filename`` and ``?linked_account_meter_id=``. The raw form is
+    streamed straight into storage without being buffered.
+
+    ``linked_account_meter_id`` is optional; without it the worker
+    identifies the vendor and account from the bill itself.
+    """
+    if request.mimetype == 'multipart/form-data':
+        if 'file' not in request.files:
+            return jsonify({'error': 'No file provided'}), 400
+        file = request.files['file']
+        filename, stream, content_type = file.filename, file.stream, file.mimetype
+        linked_account_meter_id = request.form.get('linked_account_meter_id')
+    else:
+        filename = request.headers.get('X-Filename', '')
+        stream, content_type = request.stream, request.mimetype
+        linked_account_meter_id = request.args.get('linked_account_meter_id')
+    if not filename:
+        return jsonify({'error': 'No file selected'}), 400
 
     # Verify linked_account_meter exists
-    lam = LinkedAccountMeter.query.get(linked_account_meter_id)
-    if not lam:
-        return jsonify({'error': 'Invalid linked_account_meter_id'}), 404
+    if linked_account_meter_id:
+        lam = LinkedAccountMeter.query.get(linked_account_meter_id)
+        if not lam:
+            return jsonify({'error': 'Invalid linked_account_meter_id'}), 404
+    else:
+        linked_account_meter_id = None
 
-    # Save file temporarily
-    filename = secure_filename(file.filename)
-    file_path = os.path.join(UPLOAD_FOLDER, filename)
-    file.save(file_path)
+    # Store under a unique key so web and worker processes need no shared
+    # disk; the type, size and hash are computed during the same pass
+    storage_key = make_upload_key(filename)
+    reader = InspectingReader(stream, filename)
+    current_app.storage.put_stream(storage_key, reader, content_type=content_type)
+    inspection = reader.result()
+    if inspection.mime_type not in BillProcessor.ALLOWED_EXTENSIONS:
+        current_app.storage.delete(storage_key)
+        return jsonify({'error': f'Unsupported file type: {inspection.mime_type}'}), 415
 
-    # Process file asynchronously
-    task = process_bill_file.delay(file_path, linked_account_meter_id)
+    # Process file asynchronously in the interactive lane; the job is
+    # registered first so its status exists before the worker reports
+    task_id = str(uuid.uuid4())
+    user_id = get_current_user()['id']
+    register_job(task_id, user_id, 'bill_upload')
+    enqueue_bill_file(storage_key, linked_account_meter_id, task_id=task_id,
+                      mime_type=inspection.mime_type, uploaded_by=user_id)
     
     return jsonify({
         'message': 'Bill processing started',
-        'task_id': task.id
+        'task_id': task_id,
+        'status_url': f'/api/jobs/{task_id}',
+        'events_url': f'/api/jobs/{task_id}/events'
     }), 202
 
 @bp.route('/bills', methods=['GET'])
+@read_only
 @jwt_required()
+@sanitize_response(schema=bill_schema)
 def get_bills():
     """Get all bills with optional filtering"""
     # Get query parameters
@@ -68,21 +109,72 @@ def get_bills():
         query = query.filter(Bill.bill_date <= end_date)
     
     bills = query.all()
-    return jsonify(bills_schema.dump(bills)), 200
+    return bills_schema.dump(bills), 200
+
+@bp.route('/bills/search', methods=['GET'])
+@read_only
+@jwt_required()
+@sanitize_response(safe_fields=SafeFields(nested={'results': safe_fields_from_schema(BillSearchResultSchema())}))
+def search_bills():
+    """
+    Find bills by account number, meter number, site or vendor.
+
+    ``q`` matches any of them; ``account``, ``meter``, ``site`` and
+    ``vendor`` match one each. Results are newest first and paged with the
+    returned ``next_cursor``.
+    """
+    terms = {name: request.args.get(name, '').strip()
+             for name in ('q', 'account', 'meter', 'site', 'vendor')}
+    if not any(terms.values()):
+        return jsonify({'error': 'At least one search term is required'}), 400
+    if any(0 < len(value) < bill_search.MIN_QUERY_LENGTH for value in terms.values()):
+        return jsonify({
+            'error': f'Search terms must be at least {bill_search.MIN_QUERY_LENGTH} characters'
+        }), 400
+
+    limit = request.args.get('limit', SEARCH_PAGE_SIZE, type=int)
+    limit = max(1, min(limit, SEARCH_MAX_PAGE_SIZE))
+    before = None
+    cursor = request.args.get('cursor')
+    if cursor:
+        try:
+            bill_date, bill_id = cursor.split(':')
+            before = (date.fromisoformat(bill_date), int(bill_id))
+        except ValueError:
+            return jsonify({'error': 'Invalid cursor'}), 400
+
+    user = get_current_user()
+    documents = bill_search.search_bills(
+        organization_id=None if user['role'] == 'admin' else user['organization_id'],
+        status=request.args.get('status'), before=before, limit=limit,
+        **{name: value or None for name, value in terms.items()}
+    )
+    next_cursor = None
+    if len(documents) == limit:
+        last = documents[-1]
+        next_cursor = f'{last.bill_date.isoformat()}:{last.bill_id}'
+    return {
+        'results': bill_search_schema.dump(documents),
+        'next_cursor': next_cursor
+    }, 200
 
 @bp.route('/bills/<int:id>', methods=['GET'])
+@read_only
 @jwt_required()
+@sanitize_response(schema=bill_schema)
 def get_bill(id):
     """Get a specific bill"""
     bill = Bill.query.get_or_404(id)
-    return jsonify(bill_schema.dump(bill)), 200
+    return bill_schema.dump(bill), 200
 
 @bp.route('/bills/<int:id>/audits', methods=['GET'])
+@read_only
 @jwt_required()
+@sanitize_response(schema=bill_audit_schema)
 def get_bill_audits(id):
     """Get audits for a specific bill"""
     bill = Bill.query.get_or_404(id)
-    return jsonify(bill_audit_schema.dump(bill.audits)), 200
+    return bill_audit_schema.dump(bill.audits), 200
 
 @bp.route('/bills/<int:id>/approve', methods=['POST'])
 @jwt_required()
@@ -129,9 +221,101 @@ def export_bills():
         return jsonify({'error': 'All bills must be approved before export'}), 400
     
     # Start export task
-    task = export_bills_to_accounting.delay(bill_ids)
+    task_id = str(uuid.uuid4())
+    register_job(task_id, get_current_user()['id'], 'bill_export')
+    export_bills_to_accounting.apply_async((bill_ids,), task_id=task_id)
     
     return jsonify({
         'message': 'Bill export started',
-        'task_id': task.id
+        'task_id': task_id,
+        'status_url': f'/api/jobs/{task_id}',
+        'events_url': f'/api/jobs/{task_id}/events'
     }), 202
+
+def _get_review(id):
+    """The review if it belongs to the current user's organization, else None"""
+    review = BillReview.query.get(id)
+    user = get_current_user()
+    if review is None or (user['role'] != 'admin' and review.organization_id != user['organization_id']):
+        return None
+    return review
+
+def _claim_review(review, **values):
+    """Move a pending review to another status; False if someone else got there first"""
+    claimed = BillReview.query.filter(
+        BillReview.id == review.id, BillReview.status == 'pending'
+    ).update(values, synchronize_session=False)
+    db.session.commit()
+    db.session.refresh(review)
+    return claimed == 1
+
+@bp.route('/bill-reviews', methods=['GET'])
+@read_only
+@jwt_required()
+@sanitize_response(schema=bill_review_schema)
+def get_bill_reviews():
+    """
+    Get bill files waiting for an account to be chosen, newest first.
+    ``status`` defaults to pending; pass the last id seen as ``before``
+    for the next page.
+    """
+    user = get_current_user()
+    query = BillReview.query.filter(BillReview.status == request.args.get('status', 'pending'))
+    if user['role'] != 'admin':
+        query = query.filter(BillReview.organization_id == user['organization_id'])
+    before = request.args.get('before', type=int)
+    if before:
+        query = query.filter(BillReview.id < before)
+    reviews = query.order_by(BillReview.id.desc()).limit(REVIEW_PAGE_SIZE).all()
+    return bill_reviews_schema.dump(reviews), 200
+
+@bp.route('/bill-reviews/<int:id>/resolve', methods=['POST'])
+@jwt_required()
+def resolve_bill_review(id):
+    """Process a reviewed bill file against the chosen ``linked_account_meter_id``"""
+    review = _get_review(id)
+    if review is None:
+        return jsonify({'error': 'Review not found'}), 404
+    linked_account_meter_id = (request.get_json(silent=True) or {}).get('linked_account_meter_id')
+    if not isinstance(linked_account_meter_id, int):
+        return jsonify({'error': 'linked_account_meter_id is required'}), 400
+
+    organization_id = db.session.query(Site.organization_id).join(
+        Meter, Meter.site_id == Site.id
+    ).join(
+        LinkedAccountMeter, LinkedAccountMeter.meter_id == Meter.id
+    ).filter(LinkedAccountMeter.id == linked_account_meter_id).scalar()
+    if organization_id is None or (review.organization_id is not None
+                                   and organization_id != review.organization_id):
+        return jsonify({'error': 'Invalid linked_account_meter_id'}), 404
+
+    user_id = get_current_user()['id']
+    task_id = str(uuid.uuid4())
+    if not _claim_review(review, status='resolved', linked_account_meter_id=linked_account_meter_id,
+                         resolved_by=user_id, resolved_task_id=task_id,
+                         resolved_at=datetime.utcnow()):
+        return jsonify({'error': f'Review is already {review.status}'}), 409
+
+    register_job(task_id, user_id, 'bill_upload')
+    enqueue_bill_file(review.storage_key, linked_account_meter_id, task_id=task_id,
+                      mime_type=review.mime_type, uploaded_by=review.uploaded_by)
+
+    return jsonify({
+        'review': bill_review_schema.dump(review),
+        'task_id': task_id,
+        'status_url': f'/api/jobs/{task_id}',
+        'events_url': f'/api/jobs/{task_id}/events'
+    }), 202
+
+@bp.route('/bill-reviews/<int:id>/discard', methods=['POST'])
+@jwt_required()
+def discard_bill_review(id):
+    """Drop a reviewed bill file without processing it and delete the stored file"""
+    review = _get_review(id)
+    if review is None:
+        return jsonify({'error': 'Review not found'}), 404
+    if not _claim_review(review, status='discarded', resolved_by=get_current_user()['id'],
+                         resolved_at=datetime.utcnow()):
+        return jsonify({'error': f'Review is already {review.status}'}), 409
+    current_app.storage.delete(review.storage_key)
+    return jsonify(bill_review_schema.dump(review)), 200
@@ -0,0 +1,94 @@
+import json
+import queue
+import time
+from flask import Blueprint, Response, jsonify, current_app
+from flask_jwt_extended import jwt_required
+import redis
+from app.principal import get_current_user
+from app.services.progress import get_job_status, progress_hub, LISTENER_LOST, TERMINAL_STATUSES
+
+bp = Blueprint('jobs', __name__)
+
+
+@bp.errorhandler(redis.RedisError)
+def redis_unavailable(error):
+    current_app.logger.error(f"Error reading job status: {str(error)}")
+    return jsonify({'error': 'Job status is temporarily unavailable'}), 503
+
+
+def _load_job(task_id):
+    """Return the job status if it exists and the current user may see it"""
+    status = get_job_status(task_id)
+    if status is None:
+        return None
+    user = get_current_user()
+    if user['role'] != 'admin' and status['owner_id'] != user['id']:
+        return None
+    return status
+
+
+def _sse(event: dict) -> str:
+    event = {k: v for k, v in event.items() if k != 'owner_id'}
+    return f"event: progress\ndata: {json.dumps(event, default=str)}\n\n"
+
+
+@bp.route('/jobs/<task_id>', methods=['GET'])
+@jwt_required()
+def get_job(task_id):
+    """Get the latest status of a background job"""
+    status = _load_job(task_id)
+    if status is None:
+        return jsonify({'error': 'Job not found'}), 404
+    status.pop('owner_id')
+    return jsonify(status), 200
+
+
+@bp.route('/jobs/<task_id>/events', methods=['GET'])
+@jwt_required()
+def stream_job_events(task_id):
+    """
+    Stream job progress as Server-Sent Events until the job finishes.
+
+    Each open stream holds a greenlet under the default gevent worker class
+    (a whole thread under gthread; see gunicorn.conf.py).
+    """
+    if _load_job(task_id) is None:
+        return jsonify({'error': 'Job not found'}), 404
+
+    keepalive = current_app.config.get('JOB_EVENTS_KEEPALIVE', 15)
+    max_duration = current_app.config.get('JOB_EVENTS_MAX_DURATION', 600)
+    # Subscribe before reading the status so no event falls in between
+    events = progress_hub.watch(task_id)
+    try:
+        status = get_job_status(task_id)
+    except redis.RedisError:
+        progress_hub.unwatch(task_id, events)
+        raise
+
+    def generate():
+        try:
+            yield 'retry: 3000\n\n'
+            if status is not None:
+                yield _sse(status)
+                if status['status'] in TERMINAL_STATUSES:
+                    return
+            deadline = time.monotonic() + max_duration
+            while time.monotonic() < deadline:
+                try:
+                    event = events.get(timeout=keepalive)
+                except queue.Empty:
+                    yield ': keepalive\n\n'
+                    continue
+                if event is LISTENER_LOST:
+                    # Closing makes the client reconnect and re-read the status
+                    return
+                yield _sse(event)
+                if event['status'] in TERMINAL_STATUSES:
+                    return
+        finally:
+            progress_hub.unwatch(task_id, events)
+
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
@@ -1,7 +1,8 @@
 from flask import Blueprint, jsonify, request, current_app
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask_jwt_extended import jwt_required
 from app import db
 from app.models import User
+from app.principal import get_current_user, invalidate_user
 
 bp = Blueprint('language', __name__)
 
@@ -14,10 +15,9 @@ def get_languages():
 @jwt_required()
 def get_language():
     """Get current user's language preference"""
-    current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
+    user = get_current_user()
     return jsonify({
-        'language': user.language,
+        'language': user['language'],
         'available_languages': current_app.config['LANGUAGES']
     }), 200
 
@@ -25,9 +25,7 @@ def get_language():
 @jwt_required()
 def update_language():
     """Update user's language preference"""
-    current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
-    
+    user = get_current_user()
     data = request.get_json()
     language = data.get('language')
     
@@ -37,8 +35,9 @@ def update_language():
     if language not in current_app.config['LANGUAGES']:
         return jsonify({'error': 'Unsupported language'}), 400
     
-    user.language = language
+    User.query.filter_by(id=user['id']).update({'language': language})
     db.session.commit()
+    invalidate_user(user['id'])
     
     return jsonify({
         'message': 'Language updated successfully',
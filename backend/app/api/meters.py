@@ -0,0 +1,122 @@
+from datetime import datetime
+from flask import Blueprint, current_app, g, request, jsonify
+from flask_jwt_extended import jwt_required
+from sqlalchemy import or_
+from app import db
+from app.models import LinkedAccountMeter, Meter, Site, UsageAlert
+from app.schemas import UsageAlertSchema
+from app.db_routing import read_only
+from app.principal import get_current_user
+from app.security.middleware import require_api_key
+from app.services.storage import make_upload_key
+from app.tasks import process_interval_data
+
+bp = Blueprint('meters', __name__)
+
+usage_alert_schema = UsageAlertSchema()
+usage_alerts_schema = UsageAlertSchema(many=True)
+
+DEFAULT_POINTS = 1000
+MAX_POINTS = 5000
+ALERTS_LIMIT = 100
+
+
+def _can_view_meter(meter_id, user=None):
+    """Whether the meter exists and belongs to the user's (default: current user's) organization"""
+    organization_id = db.session.query(Site.organization_id).join(
+        Meter, Meter.site_id == Site.id
+    ).filter(Meter.id == meter_id).scalar()
+    user = user or get_current_user()
+    return organization_id is not None and (
+        user['role'] == 'admin' or user['organization_id'] == organization_id)
+
+
+@bp.route('/meters/<int:id>/interval-data', methods=['GET'])
+@read_only
+@jwt_required()
+def get_interval_data(id):
+    """
+    Get a meter's interval readings sized for a chart.
+
+    ``start`` and ``end`` are ISO timestamps (end exclusive). ``interval``
+    (15m, 1h, 1d, 1w) buckets the readings using ``agg`` (sum, avg, min,
+    max); the result is then downsampled to at most ``points`` points.
+    """
+    # NumPy is only loaded by processes that serve chart data
+    from app.services import interval_series
+
+    if not _can_view_meter(id):
+        return jsonify({'error': 'Meter not found'}), 404
+
+    try:
+        start = interval_series.to_utc(datetime.fromisoformat(request.args['start']))
+        end = interval_series.to_utc(datetime.fromisoformat(request.args['end']))
+    except KeyError:
+        return jsonify({'error': 'start and end are required'}), 400
+    except ValueError:
+        return jsonify({'error': 'start and end must be ISO timestamps'}), 400
+    if start >= end:
+        return jsonify({'error': 'start must be before end'}), 400
+
+    interval = request.args.get('interval')
+    if interval and interval not in interval_series.INTERVALS:
+        return jsonify({'error': f"interval must be one of {', '.join(interval_series.INTERVALS)}"}), 400
+    agg = request.args.get('agg', 'sum')
+    if agg not in interval_series.AGGREGATES:
+        return jsonify({'error': f"agg must be one of {', '.join(interval_series.AGGREGATES)}"}), 400
+    points = request.args.get('points', DEFAULT_POINTS, type=int)
+    points = max(3, min(points, MAX_POINTS))
+
+    return jsonify(interval_series.chart_series(id, start, end, interval, agg, points)), 200
+
+
+@bp.route('/meters/<int:id>/interval-data', methods=['POST'])
+@require_api_key
+def upload_interval_data(id):
+    """
+    Ingest interval readings sent by a metering system with an API key.
+
+    The body is a CSV with ``timestamp`` and ``value`` columns, streamed
+    into storage and loaded by a worker; ``unit`` and ``cadence`` (seconds)
+    are optional query parameters.
+    """
+    if not _can_view_meter(id, g.current_user):
+        return jsonify({'error': 'Meter not found'}), 404
+
+    storage_key = make_upload_key(request.headers.get('X-Filename') or f'meter-{id}.csv')
+    current_app.storage.put_stream(storage_key, request.stream, content_type='text/csv')
+    task = process_interval_data.delay(id, storage_key, request.args.get('unit', 'kWh'),
+                                       request.args.get('cadence', type=int))
+    return jsonify({'message': 'Interval data queued', 'task_id': task.id}), 202
+
+
+@bp.route('/meters/<int:id>/alerts', methods=['GET'])
+@read_only
+@jwt_required()
+def get_usage_alerts(id):
+    """Get unusual-usage alerts for a meter and its bills, newest first; ``status`` filters them"""
+    if not _can_view_meter(id):
+        return jsonify({'error': 'Meter not found'}), 404
+    # Interval alerts name the meter; bill alerts name one of its account links
+    links = db.session.query(LinkedAccountMeter.id).filter(LinkedAccountMeter.meter_id == id)
+    query = UsageAlert.query.filter(or_(
+        UsageAlert.meter_id == id, UsageAlert.linked_account_meter_id.in_(links.scalar_subquery())
+    ))
+    if request.args.get('status'):
+        query = query.filter(UsageAlert.status == request.args['status'])
+    alerts = query.order_by(UsageAlert.observed_at.desc()).limit(ALERTS_LIMIT).all()
+    return jsonify(usage_alerts_schema.dump(alerts)), 200
+
+
+@bp.route('/alerts/<int:id>/acknowledge', methods=['POST'])
+@jwt_required()
+def acknowledge_usage_alert(id):
+    """Mark an alert as seen"""
+    alert = UsageAlert.query.get_or_404(id)
+    meter_id = alert.meter_id or db.session.query(LinkedAccountMeter.meter_id).filter(
+        LinkedAccountMeter.id == alert.linked_account_meter_id).scalar()
+    if not _can_view_meter(meter_id):
+        return jsonify({'error': 'Alert not found'}), 404
+    alert.status = 'acknowledged'
+    db.session.commit()
+    return jsonify(usage_alert_schema.dump(alert)), 200
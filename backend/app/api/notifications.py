@@ -0,0 +1,48 @@
+from datetime import datetime
+from flask import Blueprint, request, jsonify
+from flask_jwt_extended import jwt_required
+from app import db
+from app.models import Notification
+from app.schemas import NotificationSchema
+from app.db_routing import read_only
+from app.principal import get_current_user
+from app.security.middleware import sanitize_response
+
+bp = Blueprint('notifications', __name__)
+
+notification_schema = NotificationSchema()
+notifications_schema = NotificationSchema(many=True)
+
+PAGE_SIZE = 50
+
+
+@bp.route('/notifications', methods=['GET'])
+@read_only
+@jwt_required()
+@sanitize_response(schema=notification_schema)
+def get_notifications():
+    """
+    Get the current user's notifications, newest first. ``unread=true``
+    leaves out read ones; pass the last id seen as ``before`` for the next page.
+    """
+    query = Notification.query.filter(Notification.user_id == get_current_user()['id'])
+    if request.args.get('unread', '').lower() == 'true':
+        query = query.filter(Notification.read_at.is_(None))
+    before = request.args.get('before', type=int)
+    if before:
+        query = query.filter(Notification.id < before)
+    notifications = query.order_by(Notification.id.desc()).limit(PAGE_SIZE).all()
+    return notifications_schema.dump(notifications), 200
+
+
+@bp.route('/notifications/<int:id>/read', methods=['POST'])
+@jwt_required()
+def mark_notification_read(id):
+    """Mark a notification as read"""
+    notification = Notification.query.get_or_404(id)
+    if notification.user_id != get_current_user()['id']:
+        return jsonify({'error': 'Notification not found'}), 404
+    if notification.read_at is None:
+        notification.read_at = datetime.utcnow()
+        db.session.commit()
+    return jsonify(notification_schema.dump(notification)), 200
@@ -1,10 +1,18 @@
-from flask import Blueprint, request, jsonify
+import uuid
+from datetime import date
+from flask import Blueprint, request, jsonify, make_response
 from app import db
 from app.models import Organization, Site, CostCenter, Account
 from app.schemas import (
     OrganizationSchema, SiteSchema, CostCenterSchema, AccountSchema
 )
 from flask_jwt_extended import jwt_required
+from app.db_routing import read_only
+from app.principal import get_current_user
+from app.services.spend_summary import get_spend_summary, parse_period
+from app.services.progress import register_job
+from app.services import hierarchy
+from app.tasks import export_columnar
 
 bp = Blueprint('organization', __name__)
 
@@ -18,6 +26,11 @@ cost_centers_schema = CostCenterSchema(many=True)
 account_schema = AccountSchema()
 accounts_schema = AccountSchema(many=True)
 
+# Same names as app.services.columnar_export, which web processes do not
+# import so they never load pyarrow
+EXPORT_DATASETS = ('interval_data', 'bills')
+EXPORT_FORMATS = ('parquet', 'arrow')
+
 # Organization endpoints
 @bp.route('/organizations', methods=['POST'])
 @jwt_required()
@@ -34,6 +47,7 @@ def create_organization():
     return jsonify(org_schema.dump(org)), 201
 
 @bp.route('/organizations', methods=['GET'])
+@read_only
 @jwt_required()
 def get_organizations():
     """Get all organizations"""
@@ -41,12 +55,124 @@ def get_organizations():
     return jsonify(orgs_schema.dump(orgs)), 200
 
 @bp.route('/organizations/<int:id>', methods=['GET'])
+@read_only
 @jwt_required()
 def get_organization(id):
     """Get a specific organization"""
     org = Organization.query.get_or_404(id)
     return jsonify(org_schema.dump(org)), 200
 
+@bp.route('/organizations/<int:id>/spend-summary', methods=['GET'])
+@read_only
+@jwt_required()
+def get_spend_summary_view(id):
+    """
+    Get spend and usage by site, utility type and meter for a period.
+
+    ``period`` is ``2024``, ``2024-Q1`` or ``2024-03``; alternatively pass
+    ``start`` and ``end`` as ISO dates.
+    """
+    user = get_current_user()
+    if user['role'] != 'admin' and user['organization_id'] != id:
+        return jsonify({'error': 'Organization not found'}), 404
+    Organization.query.get_or_404(id)
+
+    try:
+        if request.args.get('period'):
+            start, end = parse_period(request.args['period'])
+        elif request.args.get('start') and request.args.get('end'):
+            start = date.fromisoformat(request.args['start'])
+            end = date.fromisoformat(request.args['end'])
+        else:
+            return jsonify({'error': 'period or start and end are required'}), 400
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if start > end:
+        return jsonify({'error': 'start must not be after end'}), 400
+
+    return jsonify(get_spend_summary(id, start, end)), 200
+
+@bp.route('/organizations/<int:id>/tree', methods=['GET'])
+@read_only
+@jwt_required()
+def get_organization_tree(id):
+    """
+    Get the organization's sites, meters and linked accounts as one tree.
+
+    ``depth`` limits how many levels below the organization are returned
+    (1 = sites, 2 = meters, 3 = linked accounts). Responses carry an ETag
+    that changes whenever the tree does.
+    """
+    user = get_current_user()
+    if user['role'] != 'admin' and user['organization_id'] != id:
+        return jsonify({'error': 'Organization not found'}), 404
+    depth = request.args.get('depth', hierarchy.MAX_DEPTH, type=int)
+    if not 0 <= depth <= hierarchy.MAX_DEPTH:
+        return jsonify({'error': f'depth must be between 0 and {hierarchy.MAX_DEPTH}'}), 400
+
+    # Read before the tree, so a tree newer than its ETag is only ever
+    # refetched, never served as unchanged
+    version = hierarchy.tree_version(id)
+    if version is None:
+        return jsonify({'error': 'Organization not found'}), 404
+    etag = f'{id}-{version[0]}.{version[1]}-{depth}'
+    if request.if_none_match.contains_weak(etag):
+        response = make_response('', 304)
+        response.set_etag(etag, weak=True)
+        return response
+
+    tree = hierarchy.get_tree(id, depth)
+    if tree is None:
+        return jsonify({'error': 'Organization not found'}), 404
+    response = jsonify(tree)
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response, 200
+
+@bp.route('/organizations/<int:id>/exports', methods=['POST'])
+@jwt_required()
+def start_columnar_export(id):
+    """
+    Export the organization's interval data and/or bills for analysis.
+
+    The body may give ``datasets`` (default both), ``format`` (parquet or
+    arrow) and a ``start``/``end`` date range (end exclusive). Files land in
+    storage under ``exports/<task_id>/``, partitioned by meter and month.
+    """
+    user = get_current_user()
+    if user['role'] != 'admin' and user['organization_id'] != id:
+        return jsonify({'error': 'Organization not found'}), 404
+    Organization.query.get_or_404(id)
+
+    data = request.get_json(silent=True) or {}
+    datasets = data.get('datasets') or list(EXPORT_DATASETS)
+    if not isinstance(datasets, list) or not set(datasets) <= set(EXPORT_DATASETS):
+        return jsonify({'error': f"datasets must be a list of {', '.join(EXPORT_DATASETS)}"}), 400
+    fmt = data.get('format', 'parquet')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'error': f"format must be one of {', '.join(EXPORT_FORMATS)}"}), 400
+    try:
+        start = date.fromisoformat(data['start']) if data.get('start') else None
+        end = date.fromisoformat(data['end']) if data.get('end') else None
+    except (TypeError, ValueError):
+        return jsonify({'error': 'start and end must be ISO dates'}), 400
+    if start and end and start >= end:
+        return jsonify({'error': 'start must be before end'}), 400
+
+    task_id = str(uuid.uuid4())
+    register_job(task_id, user['id'], 'columnar_export')
+    export_columnar.apply_async(
+        (datasets, fmt, id, start.isoformat() if start else None, end.isoformat() if end else None),
+        task_id=task_id
+    )
+    return jsonify({
+        'message': 'Export started',
+        'task_id': task_id,
+        'prefix': f'exports/{task_id}',
+        'status_url': f'/api/jobs/{task_id}',
+        'events_url': f'/api/jobs/{task_id}/events'
+    }), 202
+
 # Site endpoints
 @bp.route('/organizations/<int:org_id>/sites', methods=['POST'])
 @jwt_required()
@@ -66,6 +192,7 @@ def create_site(org_id):
     return jsonify(site_schema.dump(site)), 201
 
 @bp.route('/organizations/<int:org_id>/sites', methods=['GET'])
+@read_only
 @jwt_required()
 def get_sites(org_id):
     """Get all sites for an organization"""
@@ -89,6 +216,7 @@ def create_cost_center():
     return jsonify(cost_center_schema.dump(cost_center)), 201
 
 @bp.route('/cost-centers', methods=['GET'])
+@read_only
 @jwt_required()
 def get_cost_centers():
     """Get all cost centers"""
@@ -114,6 +242,7 @@ def create_account(cost_center_id):
     return jsonify(account_schema.dump(account)), 201
 
 @bp.route('/cost-centers/<int:cost_center_id>/accounts', methods=['GET'])
+@read_only
 @jwt_required()
 def get_accounts(cost_center_id):
     """Get all accounts for a cost center"""
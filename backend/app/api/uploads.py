@@ -0,0 +1,118 @@
+import uuid
+from flask import Blueprint, current_app, request, jsonify
+from flask_jwt_extended import jwt_required
+from app.models import LinkedAccountMeter
+from app.principal import get_current_user
+from app.services import chunked_uploads
+from app.services.bill_processor import BillProcessor
+from app.services.chunked_uploads import UploadError
+from app.services.file_inspection import SNIFF_BYTES, sniff_mime
+from app.services.progress import register_job
+from app.tasks import enqueue_bill_file
+
+bp = Blueprint('uploads', __name__)
+
+
+@bp.errorhandler(UploadError)
+def handle_upload_error(error):
+    return jsonify({'error': str(error)}), error.status_code
+
+
+def _session_status(session, parts):
+    return {
+        'upload_id': session['upload_id'],
+        'filename': session['filename'],
+        'size': session['size'],
+        'part_size': session['part_size'],
+        'part_count': session['part_count'],
+        'received_parts': [
+            {'part_number': n, 'size': p['size'], 'sha256': p['sha256']}
+            for n, p in sorted(parts.items())
+        ],
+        'missing_parts': chunked_uploads.missing_parts(session, parts)
+    }
+
+
+@bp.route('/uploads', methods=['POST'])
+@jwt_required()
+def initiate_upload():
+    """Start a resumable upload of a large bill file"""
+    data = request.get_json()
+    filename = data.get('filename')
+    size = data.get('size')
+    linked_account_meter_id = data.get('linked_account_meter_id')
+    if not filename or not isinstance(size, int):
+        return jsonify({'error': 'filename and size are required'}), 400
+    # Optional: without it the bill is classified by the worker
+    if linked_account_meter_id and not LinkedAccountMeter.query.get(linked_account_meter_id):
+        return jsonify({'error': 'Invalid linked_account_meter_id'}), 404
+
+    session = chunked_uploads.create_session(
+        get_current_user()['id'], filename, size, data.get('content_type'),
+        linked_account_meter_id=linked_account_meter_id
+    )
+    return jsonify(_session_status(session, {})), 201
+
+
+@bp.route('/uploads/<upload_id>', methods=['GET'])
+@jwt_required()
+def get_upload(upload_id):
+    """Get the parts received so far, to resume an interrupted upload"""
+    session = chunked_uploads.get_session(upload_id, get_current_user()['id'])
+    return jsonify(_session_status(session, chunked_uploads.get_parts(upload_id))), 200
+
+
+@bp.route('/uploads/<upload_id>/parts/<int:part_number>', methods=['PUT'])
+@jwt_required()
+def upload_part(upload_id, part_number):
+    """Upload one part as the raw request body; X-Part-SHA256 is verified if sent"""
+    session = chunked_uploads.get_session(upload_id, get_current_user()['id'])
+    part = chunked_uploads.upload_part(
+        session, part_number, request.stream, request.headers.get('X-Part-SHA256')
+    )
+    return jsonify({
+        'part_number': part['part_number'],
+        'size': part['size'],
+        'sha256': part['sha256']
+    }), 200
+
+
+@bp.route('/uploads/<upload_id>/complete', methods=['POST'])
+@jwt_required()
+def complete_upload(upload_id):
+    """Assemble the parts and queue the file for processing"""
+    user = get_current_user()
+    session = chunked_uploads.get_session(upload_id, user['id'])
+    result = chunked_uploads.complete_session(session)
+
+    # Parts are stored unread, so the assembled file is typed here; the
+    # head is enough and avoids reading a large object back in full
+    with current_app.storage.open(result['storage_key']) as stored:
+        mime_type = sniff_mime(stored.read(SNIFF_BYTES))
+    if mime_type not in BillProcessor.ALLOWED_EXTENSIONS:
+        current_app.storage.delete(result['storage_key'])
+        return jsonify({'error': f'Unsupported file type: {mime_type}'}), 415
+
+    # Large archives go to the bulk lane so they cannot delay interactive uploads
+    task_id = str(uuid.uuid4())
+    register_job(task_id, user['id'], 'bill_upload')
+    enqueue_bill_file(result['storage_key'], session['metadata']['linked_account_meter_id'],
+                      bulk=True, task_id=task_id, mime_type=mime_type, uploaded_by=user['id'])
+
+    return jsonify({
+        'message': 'Bill processing started',
+        'size': result['size'],
+        'sha256': result['sha256'],
+        'task_id': task_id,
+        'status_url': f'/api/jobs/{task_id}',
+        'events_url': f'/api/jobs/{task_id}/events'
+    }), 202
+
+
+@bp.route('/uploads/<upload_id>', methods=['DELETE'])
+@jwt_required()
+def abort_upload(upload_id):
+    """Abandon an upload and discard its parts"""
+    session = chunked_uploads.get_session(upload_id, get_current_user()['id'])
+    chunked_uploads.abort_session(session)
+    return '', 204
@@ -3,6 +3,7 @@ from app import db
 from app.models import Vendor, RateSchedule
 from app.schemas import VendorSchema, RateScheduleSchema
 from flask_jwt_extended import jwt_required
+from app.db_routing import read_only
 
 bp = Blueprint('vendors', __name__)
 
@@ -27,6 +28,7 @@ def create_vendor():
     return jsonify(vendor_schema.dump(vendor)), 201
 
 @bp.route('/vendors', methods=['GET'])
+@read_only
 @jwt_required()
 def get_vendors():
     """Get all vendors"""
@@ -34,6 +36,7 @@ def get_vendors():
     return jsonify(vendors_schema.dump(vendors)), 200
 
 @bp.route('/vendors/<int:id>', methods=['GET'])
+@read_only
 @jwt_required()
 def get_vendor(id):
     """Get a specific vendor"""
@@ -75,6 +78,7 @@ def create_rate_schedule(vendor_id):
     return jsonify(rate_schedule_schema.dump(rate_schedule)), 201
 
 @bp.route('/vendors/<int:vendor_id>/rate-schedules', methods=['GET'])
+@read_only
 @jwt_required()
 def get_rate_schedules(vendor_id):
     """Get all rate schedules for a vendor"""
@@ -83,6 +87,7 @@ def get_rate_schedules(vendor_id):
     return jsonify(rate_schedules_schema.dump(rate_schedules)), 200
 
 @bp.route('/rate-schedules/<int:id>', methods=['GET'])
+@read_only
 @jwt_required()
 def get_rate_schedule(id):
     """Get a specific rate schedule"""
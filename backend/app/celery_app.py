@@ -1,5 +1,78 @@
 from celery import Celery
 from flask import Flask
+from kombu import Queue
+
+# Queues. Parsing is CPU-bound (prefork pool); exports and small writes are
+# I/O-bound (threads pool); interval ingest runs on its own workers so a
+# backfill cannot starve bill uploads.
+DEFAULT_QUEUE = 'celery'
+PARSE_QUEUE = 'parse'
+PARSE_BULK_QUEUE = 'parse_bulk'
+EXPORT_QUEUE = 'export'
+INGEST_QUEUE = 'ingest'
+
+# Seconds Redis waits for an unacknowledged message before redelivering it;
+# must exceed the longest task (a full columnar export)
+VISIBILITY_TIMEOUT = 6 * 60 * 60
+
+# With the Redis broker, priority 0 is consumed first
+INTERACTIVE_PRIORITY = 0
+DEFAULT_PRIORITY = 5
+BULK_PRIORITY = 9
+
+TASK_ROUTES = {
+    'app.tasks.process_bill_file': {'queue': PARSE_QUEUE},
+    'app.tasks.export_bills_to_accounting': {'queue': EXPORT_QUEUE},
+    'app.tasks.export_columnar': {'queue': EXPORT_QUEUE, 'priority': BULK_PRIORITY},
+    'app.tasks.process_interval_data': {'queue': INGEST_QUEUE, 'priority': BULK_PRIORITY},
+    'app.tasks.persist_login_attempt': {'queue': DEFAULT_QUEUE},
+    'app.tasks.send_due_date_reminders': {'queue': DEFAULT_QUEUE},
+}
+
+
+def beat_schedule(check_interval: float) -> dict:
+    """Periodic tasks for `celery beat` (run exactly one beat process)."""
+    return {
+        # Cheap until the persisted fire time passes, so it can run often
+        'due-date-reminders': {
+            'task': 'app.tasks.send_due_date_reminders',
+            'schedule': check_interval,
+            # A missed check is covered by the next one
+            'options': {'expires': check_interval},
+        },
+    }
+
+
+def configure_task_routing(celery: Celery, visibility_timeout: int = VISIBILITY_TIMEOUT) -> None:
+    """
+    Apply queue, priority and prefetch settings shared by all workers.
+
+    Tasks are acknowledged on receipt by default. Only tasks that can
+    safely run twice opt into acks_late, as a crash after their commit
+    redelivers them.
+    """
+    celery.conf.update(
+        task_queues=[
+            Queue(DEFAULT_QUEUE),
+            Queue(PARSE_QUEUE),
+            Queue(PARSE_BULK_QUEUE),
+            Queue(EXPORT_QUEUE),
+            Queue(INGEST_QUEUE),
+        ],
+        task_default_queue=DEFAULT_QUEUE,
+        task_default_priority=DEFAULT_PRIORITY,
+        task_routes=TASK_ROUTES,
+        broker_transport_options={
+            'priority_steps': list(range(10)),
+            'sep': ':',
+            'queue_order_strategy': 'priority',
+            'visibility_timeout': visibility_timeout,
+        },
+        # Long tasks: reserve one message at a time so queued work is not
+        # hoarded by a busy worker
+        worker_prefetch_multiplier=1,
+    )
+
 
 def create_celery_app(app: Flask) -> Celery:
     celery = Celery(
@@ -7,7 +80,11 @@ def create_celery_app(app: Flask) -> Celery:
         broker=app.config['CELERY_BROKER_URL'],
         backend=app.config['CELERY_RESULT_BACKEND']
     )
-    celery.conf.update(app.config)
+    # The CELERY_* keys use Celery's old setting names, which cannot be mixed
+    # with the new ones set below; the broker and backend are passed above
+    celery.conf.update({key: value for key, value in app.config.items() if not key.startswith('CELERY_')})
+    configure_task_routing(celery, app.config.get('CELERY_VISIBILITY_TIMEOUT', VISIBILITY_TIMEOUT))
+    celery.conf.beat_schedule = beat_schedule(app.config.get('REMINDER_CHECK_INTERVAL', 60))
 
     class ContextTask(celery.Task):
         def __call__(self, *args, **kwargs):
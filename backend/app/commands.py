@@ -0,0 +1,25 @@
+"""Maintenance commands for the ``flask`` CLI."""
+import click
+
+
+def register_commands(app) -> None:
+    """Attach the maintenance commands to ``app.cli``."""
+
+    @app.cli.command('rebuild-search-documents')
+    @click.option('--batch-size', default=10000, show_default=True,
+                  help='Bills rewritten per transaction.')
+    def rebuild_search_documents_command(batch_size):
+        """Regenerate the bill search documents from the bills."""
+        from app.services.bill_search import rebuild_search_documents
+
+        written = rebuild_search_documents(batch_size)
+        click.echo(f'Wrote {written} search documents')
+
+    @app.cli.command('rebuild-hierarchy')
+    @click.option('--organization-id', type=int, help='Only rebuild this organization.')
+    def rebuild_hierarchy_command(organization_id):
+        """Regenerate the organization tree path rows."""
+        from app.services.hierarchy import rebuild_hierarchy
+
+        written = rebuild_hierarchy(organization_id)
+        click.echo(f'Wrote {written} hierarchy nodes')
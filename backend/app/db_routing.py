@@ -0,0 +1,197 @@
+"""Read-replica routing for the shared SQLAlchemy session."""
+import threading
+import time
+from typing import Callable, Optional
+from flask import current_app, request, g, has_request_context
+from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+from flask_jwt_extended.exceptions import JWTExtendedException
+from flask_sqlalchemy.session import Session
+from jwt import PyJWTError
+from sqlalchemy import text
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import SQLAlchemyError
+import redis
+
+REPLICA_BIND_KEY = 'replica'
+STICKY_COOKIE_NAME = 'db_primary_until'
+# Per-identity pin for API clients that only send an Authorization header
+STICKY_KEY = 'db:primary:{}'
+SAFE_METHODS = {'GET', 'HEAD', 'OPTIONS'}
+# Sizing options only accepted by QueuePool; SQLite in-memory engines use
+# SingletonThreadPool or StaticPool
+QUEUE_POOL_OPTIONS = ('pool_size', 'max_overflow', 'pool_timeout')
+
+_lag_lock = threading.Lock()
+_lag_state = {'checked_at': 0.0, 'healthy': False}
+
+
+def read_only(f: Callable) -> Callable:
+    """Mark a view as safe to serve from the read replica."""
+    f._db_read_only = True
+    return f
+
+
+class RoutingSession(Session):
+    """Session that sends reads from read-only views to the replica engine.
+
+    Flushes and anything running outside a replica-routed request always use
+    the primary, so writes can never land on the replica.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and _use_replica():
+            engine = self._db.engines.get(REPLICA_BIND_KEY)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def _use_replica() -> bool:
+    return has_request_context() and g.get('db_target') == REPLICA_BIND_KEY
+
+
+def _replica_is_healthy(app) -> bool:
+    """Return whether the replica is reachable and within the allowed lag.
+
+    The result is cached per process for REPLICA_LAG_CHECK_INTERVAL seconds
+    so the check costs at most one query per interval.
+    """
+    interval = app.config['REPLICA_LAG_CHECK_INTERVAL']
+    now = time.monotonic()
+    if now - _lag_state['checked_at'] < interval:
+        return _lag_state['healthy']
+
+    with _lag_lock:
+        if now - _lag_state['checked_at'] < interval:
+            return _lag_state['healthy']
+        healthy = _measure_replica_lag(app) <= app.config['REPLICA_MAX_LAG_SECONDS']
+        _lag_state.update(checked_at=now, healthy=healthy)
+    return healthy
+
+
+def _measure_replica_lag(app) -> float:
+    """Return the replica replay lag in seconds, or infinity if unavailable."""
+    from app import db
+
+    engine = db.engines.get(REPLICA_BIND_KEY)
+    if engine is None:
+        return float('inf')
+    try:
+        with engine.connect() as conn:
+            if engine.dialect.name != 'postgresql':
+                conn.execute(text('SELECT 1'))
+                return 0.0
+            lag = conn.execute(text(
+                'SELECT COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)'
+            )).scalar()
+            return float(lag or 0.0)
+    except SQLAlchemyError as e:
+        app.logger.warning(f"Replica unavailable, routing reads to primary: {str(e)}")
+        return float('inf')
+
+
+def _is_read_only_view() -> bool:
+    if request.method not in SAFE_METHODS or request.endpoint is None:
+        return False
+    view = current_app.view_functions.get(request.endpoint)
+    return bool(getattr(view, '_db_read_only', False))
+
+
+def _request_identity() -> Optional[str]:
+    """JWT identity of the current request, or None if it carries no valid token."""
+    try:
+        verify_jwt_in_request(optional=True)
+    except (JWTExtendedException, PyJWTError):
+        return None
+    identity = get_jwt_identity()
+    return None if identity is None else str(identity)
+
+
+def _pinned_to_primary(app) -> bool:
+    try:
+        if float(request.cookies.get(STICKY_COOKIE_NAME, 0)) > time.time():
+            return True
+    except ValueError:
+        pass
+
+    identity = _request_identity()
+    if identity is None:
+        return False
+    try:
+        return bool(app.redis.exists(STICKY_KEY.format(identity)))
+    except redis.RedisError as e:
+        # Without the pin we cannot tell whether the client just wrote
+        app.logger.warning(f"Error reading primary pin, routing reads to primary: {str(e)}")
+        return True
+
+
+def _pin_identity(app, sticky: float) -> None:
+    identity = _request_identity()
+    if identity is None:
+        return
+    try:
+        app.redis.set(STICKY_KEY.format(identity), 1, px=int(sticky * 1000))
+    except redis.RedisError as e:
+        app.logger.error(f"Error pinning client to primary: {str(e)}")
+
+
+def engine_options(uri: str, options: dict) -> dict:
+    """Return ``options`` without the QueuePool sizing SQLite engines reject."""
+    if make_url(uri).get_backend_name() != 'sqlite':
+        return dict(options)
+    return {k: v for k, v in options.items() if k not in QUEUE_POOL_OPTIONS}
+
+
+def init_db_routing(app) -> None:
+    """Configure the replica bind and register per-request routing hooks.
+
+    Must be called before ``db.init_app`` so the replica engine is created
+    alongside the primary.
+    """
+    app.config.setdefault('SQLALCHEMY_REPLICA_URI', None)
+    app.config.setdefault('SQLALCHEMY_REPLICA_ENGINE_OPTIONS', {})
+    app.config.setdefault('REPLICA_STICKY_SECONDS', 5)
+    app.config.setdefault('REPLICA_MAX_LAG_SECONDS', 2.0)
+    app.config.setdefault('REPLICA_LAG_CHECK_INTERVAL', 1.0)
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(
+        app.config['SQLALCHEMY_DATABASE_URI'], app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+
+    replica_uri = app.config['SQLALCHEMY_REPLICA_URI']
+    if not replica_uri:
+        return
+
+    binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+    binds[REPLICA_BIND_KEY] = {
+        'url': replica_uri,
+        **engine_options(replica_uri, app.config['SQLALCHEMY_REPLICA_ENGINE_OPTIONS'])
+    }
+    app.config['SQLALCHEMY_BINDS'] = binds
+
+    @app.before_request
+    def route_database_session():
+        """Pick the replica for read-only views unless pinned to the primary."""
+        if _is_read_only_view() and not _pinned_to_primary(app) and _replica_is_healthy(app):
+            g.db_target = REPLICA_BIND_KEY
+        else:
+            g.db_target = None
+
+    @app.after_request
+    def pin_writes_to_primary(response):
+        """Keep the client on the primary for a while after a successful write.
+
+        Browsers are pinned with a cookie; API clients that only send a JWT
+        are pinned by identity in Redis.
+        """
+        sticky = app.config['REPLICA_STICKY_SECONDS']
+        if request.method not in SAFE_METHODS and response.status_code < 400 and sticky:
+            _pin_identity(app, sticky)
+            response.set_cookie(
+                STICKY_COOKIE_NAME,
+                str(time.time() + sticky),
+                max_age=sticky,
+                secure=True,
+                httponly=True,
+                samesite='Strict'
+            )
+        return response
+
@@ -0,0 +1,42 @@
+"""Lazily constructed service singletons."""
+import threading
+from typing import Any, Callable
+
+
+class LazyService:
+    """
+    Proxy that builds the wrapped service on first use.
+
+    Lets ``create_app`` attach expensive services (cloud clients, parsers)
+    without paying their import and construction cost in processes that
+    never use them. ``reset()`` drops the instance, e.g. after a fork, so
+    the next access builds a fresh one.
+    """
+
+    def __init__(self, factory: Callable[[], Any]):
+        object.__setattr__(self, '_factory', factory)
+        object.__setattr__(self, '_instance', None)
+        object.__setattr__(self, '_lock', threading.Lock())
+
+    def get(self) -> Any:
+        instance = self._instance
+        if instance is None:
+            with self._lock:
+                instance = self._instance
+                if instance is None:
+                    instance = self._factory()
+                    object.__setattr__(self, '_instance', instance)
+        return instance
+
+    def reset(self) -> None:
+        object.__setattr__(self, '_instance', None)
+
+    @property
+    def initialized(self) -> bool:
+        return self._instance is not None
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.get(), name)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        setattr(self.get(), name, value)
@@ -1,12 +1,17 @@
 from datetime import datetime, timedelta
 from typing import Optional
+from sqlalchemy import DDL, event
 from sqlalchemy.ext.declarative import declared_attr
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
-from werkzeug.security import generate_password_hash, check_password_hash
+from flask import current_app
+from werkzeug.security import generate_password_hash
 import secrets
 from app import db
 from app.security import validate_password, audit_log
+from app.security.api_keys import generate_api_key, hash_api_key, split_api_key, revoke_on_commit
+from app.security import login_guard
+from app.security.login_guard import password_hasher
 
 class SecurityMixin:
     """Mixin for security-related fields and methods."""
@@ -30,7 +35,7 @@ class Organization(db.Model, SecurityMixin):
 class Site(db.Model, SecurityMixin):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(120), nullable=False)
-    organization_id = db.Column(db.Integer, db.ForeignKey('organization.id'), nullable=False)
+    organization_id = db.Column(db.Integer, db.ForeignKey('organization.id'), nullable=False, index=True)
     address = db.Column(db.String(200))
     meters = db.relationship('Meter', backref='site', lazy='dynamic')
 
@@ -60,10 +65,14 @@ class RateSchedule(db.Model, SecurityMixin):
     rate_type = db.Column(db.String(50))  # fixed, variable, tiered, etc.
     rate_details = db.Column(db.JSON)
 
+    __table_args__ = (
+        db.Index('ix_rate_schedule_vendor_effective', 'vendor_id', 'effective_date'),
+    )
+
 class Meter(db.Model, SecurityMixin):
     id = db.Column(db.Integer, primary_key=True)
     number = db.Column(db.String(50), nullable=False)
-    site_id = db.Column(db.Integer, db.ForeignKey('site.id'), nullable=False)
+    site_id = db.Column(db.Integer, db.ForeignKey('site.id'), nullable=False, index=True)
     utility_type = db.Column(db.String(50), nullable=False)  # electricity, water, gas, etc.
     interval_data = db.relationship('IntervalData', backref='meter', lazy='dynamic')
     linked_accounts = db.relationship('LinkedAccountMeter', backref='meter', lazy='dynamic')
@@ -76,12 +85,68 @@ class LinkedAccountMeter(db.Model, SecurityMixin):
     start_date = db.Column(db.Date, nullable=False)
     end_date = db.Column(db.Date)
 
+    __table_args__ = (
+        # Also serves lookups by meter_id alone
+        db.Index('ix_linked_account_meter_meter_start', 'meter_id', 'start_date'),
+    )
+
+class HierarchyNode(db.Model):
+    """Materialized path of one node of an organization's tree.
+
+    Organizations, sites, meters and linked account meters each have a row
+    whose ``path`` lists its ancestors (``/o1/s4/m17/l30/``), so a whole
+    tree or subtree is one indexed range read. Maintained by
+    app.services.hierarchy.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    organization_id = db.Column(db.Integer, nullable=False)
+    node_type = db.Column(db.String(20), nullable=False)  # organization, site, meter, linked_account
+    node_id = db.Column(db.Integer, nullable=False)
+    depth = db.Column(db.SmallInteger, nullable=False)
+    path = db.Column(db.String(255), nullable=False)
+    label = db.Column(db.String(200))
+    # Organization rows only: bumped in the same transaction as any change
+    # to the tree, so it can serve as the tree's ETag
+    version = db.Column(db.Integer, default=0, nullable=False)
+
+    __table_args__ = (
+        db.UniqueConstraint('node_type', 'node_id', name='uq_hierarchy_node'),
+        db.Index('ix_hierarchy_org_depth', 'organization_id', 'depth'),
+        db.Index('ix_hierarchy_path', 'path', postgresql_ops={'path': 'text_pattern_ops'}),
+    )
+
 class IntervalData(db.Model, SecurityMixin):
     id = db.Column(db.Integer, primary_key=True)
     meter_id = db.Column(db.Integer, db.ForeignKey('meter.id'), nullable=False)
     timestamp = db.Column(db.DateTime, nullable=False)
     value = db.Column(db.Float, nullable=False)
     unit = db.Column(db.String(20), nullable=False)
+    quality_flag = db.Column(db.String(20), nullable=False, default='actual')  # actual, estimated, suspect
+
+    __table_args__ = (
+        # Range reads for one meter; value is included for index-only scans
+        db.Index('ix_interval_data_meter_time', 'meter_id', 'timestamp',
+                 postgresql_include=['value']),
+    )
+
+class UsageAlert(db.Model):
+    """Unusual interval usage or bill found by app.services.anomaly."""
+    id = db.Column(db.Integer, primary_key=True)
+    meter_id = db.Column(db.Integer, db.ForeignKey('meter.id'))
+    linked_account_meter_id = db.Column(db.Integer, db.ForeignKey('linked_account_meter.id'))
+    bill_id = db.Column(db.Integer, db.ForeignKey('bill.id'))
+    kind = db.Column(db.String(20), nullable=False)  # interval_usage, bill_amount, bill_usage
+    observed_at = db.Column(db.DateTime, nullable=False)
+    value = db.Column(db.Float, nullable=False)
+    expected = db.Column(db.Float, nullable=False)
+    zscore = db.Column(db.Float, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='open')  # open, acknowledged
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_usage_alert_meter_observed', 'meter_id', 'observed_at'),
+        db.Index('ix_usage_alert_link_observed', 'linked_account_meter_id', 'observed_at'),
+    )
 
 class Bill(db.Model, SecurityMixin):
     id = db.Column(db.Integer, primary_key=True)
@@ -96,6 +161,14 @@ class Bill(db.Model, SecurityMixin):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     audits = db.relationship('BillAudit', backref='bill', lazy='dynamic')
 
+    __table_args__ = (
+        # Spend summaries read amount and usage straight from the index
+        db.Index('ix_bill_lam_date', 'linked_account_meter_id', 'bill_date',
+                 postgresql_include=['amount', 'usage_amount']),
+        # Due-date reminders page through one status's due-date range by id
+        db.Index('ix_bill_status_due', 'status', 'due_date', 'id'),
+    )
+
 class BillAudit(db.Model, SecurityMixin):
     id = db.Column(db.Integer, primary_key=True)
     bill_id = db.Column(db.Integer, db.ForeignKey('bill.id'), nullable=False)
@@ -104,6 +177,74 @@ class BillAudit(db.Model, SecurityMixin):
     message = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+class BillReview(db.Model):
+    """A bill file the classifier could not match confidently to an account.
+
+    The file stays in storage until a user picks the linked account meter
+    (the job is then queued again) or discards it.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    storage_key = db.Column(db.String(300), nullable=False)
+    mime_type = db.Column(db.String(100))
+    organization_id = db.Column(db.Integer, db.ForeignKey('organization.id'))
+    uploaded_by = db.Column(db.Integer, db.ForeignKey('user.id'))
+    task_id = db.Column(db.String(36))
+    status = db.Column(db.String(20), default='pending', nullable=False)  # pending, resolved, discarded
+    confidence = db.Column(db.Float)
+    vendor_code = db.Column(db.String(50))
+    account_id = db.Column(db.Integer, db.ForeignKey('account.id'))
+    candidates = db.Column(db.JSON)  # candidate linked account meter ids
+    linked_account_meter_id = db.Column(db.Integer, db.ForeignKey('linked_account_meter.id'))
+    resolved_by = db.Column(db.Integer, db.ForeignKey('user.id'))
+    resolved_task_id = db.Column(db.String(36))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    resolved_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        # The review queue pages through one organization's pending files by id
+        db.Index('ix_bill_review_org_status', 'organization_id', 'status', 'id'),
+    )
+
+def _trigram_index(name: str, column: str) -> db.Index:
+    """GIN trigram index for substring search (PostgreSQL, needs pg_trgm)."""
+    return db.Index(name, column, postgresql_using='gin',
+                    postgresql_ops={column: 'gin_trgm_ops'})
+
+class BillSearchDocument(db.Model):
+    """Denormalized copy of the names a bill can be found by.
+
+    Maintained by app.services.bill_search whenever a bill or one of the
+    rows it names changes, so search never joins across the hierarchy.
+    """
+    bill_id = db.Column(db.Integer, db.ForeignKey('bill.id'), primary_key=True)
+    organization_id = db.Column(db.Integer, nullable=False)
+    site_id = db.Column(db.Integer, nullable=False, index=True)
+    meter_id = db.Column(db.Integer, nullable=False, index=True)
+    account_id = db.Column(db.Integer, nullable=False, index=True)
+    vendor_id = db.Column(db.Integer, index=True)
+    account_number = db.Column(db.String(50), nullable=False)
+    meter_number = db.Column(db.String(50), nullable=False)
+    site_name = db.Column(db.String(120), nullable=False)
+    site_address = db.Column(db.String(200))
+    vendor_name = db.Column(db.String(120))
+    bill_date = db.Column(db.Date, nullable=False)
+    amount = db.Column(db.Float, nullable=False)
+    status = db.Column(db.String(20))
+
+    __table_args__ = (
+        db.Index('ix_bill_search_org_date', 'organization_id', 'bill_date', 'bill_id'),
+        _trigram_index('ix_bill_search_account_trgm', 'account_number'),
+        _trigram_index('ix_bill_search_meter_trgm', 'meter_number'),
+        _trigram_index('ix_bill_search_site_name_trgm', 'site_name'),
+        _trigram_index('ix_bill_search_site_address_trgm', 'site_address'),
+        _trigram_index('ix_bill_search_vendor_trgm', 'vendor_name'),
+    )
+
+event.listen(
+    BillSearchDocument.__table__, 'before_create',
+    DDL('CREATE EXTENSION IF NOT EXISTS pg_trgm').execute_if(dialect='postgresql')
+)
+
 class User(db.Model, SecurityMixin):
     """User model with enhanced security features."""
     id = db.Column(db.Integer, primary_key=True)
@@ -119,7 +260,8 @@ class User(db.Model, SecurityMixin):
     password_changed_at = db.Column(db.DateTime, default=func.now())
     mfa_secret = db.Column(db.String(32))
     mfa_enabled = db.Column(db.Boolean, default=False)
-    api_key = db.Column(db.String(64), unique=True, index=True)
+    api_key_prefix = db.Column(db.String(16), unique=True, index=True)
+    api_key_hash = db.Column(db.String(64))
     api_key_expires_at = db.Column(db.DateTime)
 
     def set_password(self, password: str) -> tuple[bool, str]:
@@ -133,47 +275,54 @@ class User(db.Model, SecurityMixin):
         return True, "Password set successfully"
 
     def check_password(self, password: str) -> bool:
-        """Check password with rate limiting."""
+        """
+        Check password with rate limiting.
+
+        Lockout and throttling state lives in Redis and is written back to
+        this row asynchronously, so a login attempt never commits inline.
+        Raises LoginOverloaded when the hashing pool is saturated.
+        """
         if self.account_locked_until and self.account_locked_until > datetime.utcnow():
             return False
-            
-        if self.last_login_attempt:
-            time_diff = datetime.utcnow() - self.last_login_attempt
-            if time_diff < timedelta(seconds=2):  # Rate limiting
-                return False
-        
-        self.last_login_attempt = datetime.utcnow()
+
+        if not login_guard.begin_attempt(self.id):
+            return False
         
-        if not check_password_hash(self.password_hash, password):
-            self.failed_login_attempts += 1
-            if self.failed_login_attempts >= 5:
-                self.account_locked_until = datetime.utcnow() + timedelta(minutes=15)
-            db.session.commit()
+        if not password_hasher.verify(self.password_hash, password,
+                                      current_app.config.get('LOGIN_HASH_TIMEOUT', 5.0)):
+            login_guard.record_failure(self.id)
             return False
         
-        self.failed_login_attempts = 0
-        db.session.commit()
+        login_guard.record_success(self.id)
         return True
 
     def generate_api_key(self, expires_in_days: int = 30) -> str:
-        """Generate a secure API key."""
-        self.api_key = secrets.token_urlsafe(48)
+        """Generate a secure API key, storing only its prefix and keyed hash."""
+        if self.api_key_prefix:
+            revoke_on_commit(self, self.api_key_prefix)
+        api_key, self.api_key_prefix, self.api_key_hash = generate_api_key()
         self.api_key_expires_at = datetime.utcnow() + timedelta(days=expires_in_days)
-        return self.api_key
+        return api_key
 
     def verify_api_key(self, api_key: str) -> bool:
         """Verify API key."""
-        if not self.api_key or not self.api_key_expires_at:
+        if not self.api_key_hash or not self.api_key_expires_at:
             return False
         
         if datetime.utcnow() > self.api_key_expires_at:
             return False
+
+        if split_api_key(api_key) != self.api_key_prefix:
+            return False
             
-        return secrets.compare_digest(self.api_key, api_key)
+        return secrets.compare_digest(self.api_key_hash, hash_api_key(api_key))
 
     def revoke_api_key(self) -> None:
-        """Revoke API key."""
-        self.api_key = None
+        """Revoke API key; every worker's principal cache drops it on commit."""
+        if self.api_key_prefix:
+            revoke_on_commit(self, self.api_key_prefix)
+        self.api_key_prefix = None
+        self.api_key_hash = None
         self.api_key_expires_at = None
 
     def to_dict(self) -> dict:
@@ -190,6 +339,17 @@ class User(db.Model, SecurityMixin):
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
 
+@event.listens_for(User.is_active, 'set')
+def _revoke_key_on_deactivate(target, value, oldvalue, initiator) -> None:
+    # Cached API principals are not re-checked against is_active
+    if not value and target.api_key_prefix:
+        revoke_on_commit(target, target.api_key_prefix)
+
+@event.listens_for(User, 'after_delete')
+def _revoke_key_on_delete(mapper, connection, target) -> None:
+    if target.api_key_prefix:
+        revoke_on_commit(target, target.api_key_prefix)
+
 class AuditLog(db.Model):
     """Audit log for security events."""
     id = db.Column(db.Integer, primary_key=True)
@@ -228,3 +388,25 @@ class ExportLog(db.Model):
     status = db.Column(db.String(20))  # success, failed
     file_path = db.Column(db.String(200))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class ReminderState(db.Model):
+    """Progress of a scheduled reminder job (see app.services.reminders)."""
+    name = db.Column(db.String(50), primary_key=True)
+    # Reminder windows opening on or before this day have been sent
+    processed_through = db.Column(db.Date, nullable=False)
+    next_fire_at = db.Column(db.DateTime, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class Notification(db.Model):
+    """In-app message for a user, e.g. a digest of bills coming due."""
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    kind = db.Column(db.String(30), nullable=False)  # bill_due_digest
+    title = db.Column(db.String(200), nullable=False)
+    payload = db.Column(db.JSON)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    read_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('ix_notification_user_created', 'user_id', 'created_at'),
+    )
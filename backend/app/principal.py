@@ -0,0 +1,118 @@
+"""Per-request loader for the authenticated user, backed by a shared cache."""
+import json
+from typing import Optional
+from flask import abort, current_app, g, has_app_context
+from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+from flask_jwt_extended.exceptions import JWTExtendedException
+from jwt import PyJWTError
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+import redis
+from app.models import User
+
+# Non-sensitive fields safe to share between workers through Redis
+PROFILE_FIELDS = ('id', 'email', 'name', 'organization_id', 'role', 'language',
+                  'mfa_enabled', 'is_active')
+PROFILE_KEY = 'user:profile:{}'
+_CHANGED = 'user_profiles_changed'
+
+_MISSING = object()
+
+
+def get_current_user(optional: bool = False) -> Optional[dict]:
+    """
+    Return the profile of the user identified by the request's JWT.
+
+    The identity is resolved at most once per request and stored in ``g``;
+    across requests the profile is served from a short-TTL Redis cache so
+    most requests never touch the users table.
+
+    A token whose user has since been deleted or deactivated is treated
+    like a missing token.
+
+    Args:
+        optional: Return None instead of aborting with 401 when there is no
+            valid JWT or no active user behind it
+
+    Returns:
+        Profile dictionary, or None if optional and there is no such user
+    """
+    profile = g.get('current_user_profile', _MISSING)
+    if profile is _MISSING:
+        profile = _resolve(optional)
+        g.current_user_profile = profile
+        if profile is not None and not g.get('current_user'):
+            g.current_user = profile
+    if profile is None and not optional:
+        abort(401, description='User not found or inactive')
+    return profile
+
+
+def _resolve(optional: bool) -> Optional[dict]:
+    if optional:
+        try:
+            verify_jwt_in_request(optional=True)
+        except (JWTExtendedException, PyJWTError):
+            return None
+    user_id = get_jwt_identity()
+    profile = _load_profile(user_id) if user_id is not None else None
+    if profile is not None and not profile['is_active']:
+        return None
+    return profile
+
+
+def invalidate_user(user_id: int) -> None:
+    """Drop a user's cached profile, e.g. after the row has been updated."""
+    profile = g.get('current_user_profile')
+    if profile and profile['id'] == user_id:
+        g.pop('current_user_profile')
+    try:
+        current_app.redis.delete(PROFILE_KEY.format(user_id))
+    except redis.RedisError as e:
+        current_app.logger.error(f"Error invalidating user profile cache: {str(e)}")
+
+
+def _load_profile(user_id: int) -> Optional[dict]:
+    key = PROFILE_KEY.format(user_id)
+    try:
+        cached = current_app.redis.get(key)
+        if cached is not None:
+            return json.loads(cached)
+    except redis.RedisError as e:
+        current_app.logger.error(f"Error reading user profile cache: {str(e)}")
+
+    user = User.query.get(user_id)
+    if user is None:
+        return None
+
+    profile = {field: getattr(user, field) for field in PROFILE_FIELDS}
+    try:
+        current_app.redis.setex(key, current_app.config.get('USER_PROFILE_CACHE_TTL', 30),
+                                json.dumps(profile))
+    except redis.RedisError as e:
+        current_app.logger.error(f"Error writing user profile cache: {str(e)}")
+    return profile
+
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _invalidate_on_change(mapper, connection, target) -> None:
+    # Invalidating during the flush would let a concurrent request cache the
+    # pre-commit row again, so wait for the commit
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault(_CHANGED, set()).add(target.id)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_committed(session) -> None:
+    changed = session.info.pop(_CHANGED, None)
+    if not changed or not has_app_context():
+        return
+    for user_id in changed:
+        invalidate_user(user_id)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_changed(session) -> None:
+    session.info.pop(_CHANGED, None)
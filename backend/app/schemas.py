@@ -54,28 +54,92 @@ class IntervalDataSchema(Schema):
     timestamp = fields.DateTime(required=True)
     value = fields.Float(required=True)
     unit = fields.Str(required=True)
+    quality_flag = fields.Str(dump_only=True, validate=validate.OneOf(['actual', 'estimated', 'suspect']),
+                              metadata={'safe': True})
 
 class BillAuditSchema(Schema):
     id = fields.Int(dump_only=True)
     bill_id = fields.Int(dump_only=True)
     audit_type = fields.Str(required=True)
-    status = fields.Str(required=True, validate=validate.OneOf(['passed', 'failed']))
+    status = fields.Str(required=True, validate=validate.OneOf(['passed', 'failed']),
+                        metadata={'safe': True})
     message = fields.Str()
-    created_at = fields.DateTime(dump_only=True)
+    created_at = fields.DateTime(dump_only=True, metadata={'safe': True})
 
 class BillSchema(Schema):
+    # Fields marked safe are skipped by sanitize_response; only typed or
+    # OneOf-validated fields can be, as any free text may hold markup
     id = fields.Int(dump_only=True)
     linked_account_meter_id = fields.Int(required=True)
-    bill_date = fields.Date(required=True)
-    due_date = fields.Date(required=True)
+    bill_date = fields.Date(required=True, metadata={'safe': True})
+    due_date = fields.Date(required=True, metadata={'safe': True})
     amount = fields.Float(required=True)
-    status = fields.Str()
+    status = fields.Str(validate=validate.OneOf(['pending', 'approved', 'rejected']),
+                        metadata={'safe': True})
     source_type = fields.Str()
     file_path = fields.Str()
     usage_amount = fields.Float()
-    created_at = fields.DateTime(dump_only=True)
+    created_at = fields.DateTime(dump_only=True, metadata={'safe': True})
     audits = fields.Nested(BillAuditSchema, many=True, dump_only=True)
 
+class BillSearchResultSchema(Schema):
+    bill_id = fields.Int(dump_only=True, metadata={'safe': True})
+    bill_date = fields.Date(dump_only=True, metadata={'safe': True})
+    amount = fields.Float(dump_only=True)
+    status = fields.Str(dump_only=True, validate=validate.OneOf(['pending', 'approved', 'rejected']),
+                        metadata={'safe': True})
+    account_id = fields.Int(dump_only=True, metadata={'safe': True})
+    account_number = fields.Str(dump_only=True)
+    meter_id = fields.Int(dump_only=True, metadata={'safe': True})
+    meter_number = fields.Str(dump_only=True)
+    site_id = fields.Int(dump_only=True, metadata={'safe': True})
+    site_name = fields.Str(dump_only=True)
+    site_address = fields.Str(dump_only=True)
+    vendor_id = fields.Int(dump_only=True, metadata={'safe': True})
+    vendor_name = fields.Str(dump_only=True)
+
+class BillReviewSchema(Schema):
+    id = fields.Int(dump_only=True)
+    storage_key = fields.Str(dump_only=True)
+    mime_type = fields.Str(dump_only=True)
+    organization_id = fields.Int(dump_only=True, metadata={'safe': True})
+    uploaded_by = fields.Int(dump_only=True, metadata={'safe': True})
+    task_id = fields.Str(dump_only=True)
+    status = fields.Str(dump_only=True, validate=validate.OneOf(['pending', 'resolved', 'discarded']),
+                        metadata={'safe': True})
+    confidence = fields.Float(dump_only=True, metadata={'safe': True})
+    vendor_code = fields.Str(dump_only=True)
+    account_id = fields.Int(dump_only=True, metadata={'safe': True})
+    candidates = fields.List(fields.Int(), dump_only=True)
+    linked_account_meter_id = fields.Int(dump_only=True, metadata={'safe': True})
+    resolved_by = fields.Int(dump_only=True, metadata={'safe': True})
+    resolved_task_id = fields.Str(dump_only=True)
+    created_at = fields.DateTime(dump_only=True, metadata={'safe': True})
+    resolved_at = fields.DateTime(dump_only=True, metadata={'safe': True})
+
+class UsageAlertSchema(Schema):
+    id = fields.Int(dump_only=True)
+    meter_id = fields.Int(dump_only=True)
+    linked_account_meter_id = fields.Int(dump_only=True)
+    bill_id = fields.Int(dump_only=True)
+    kind = fields.Str(dump_only=True, validate=validate.OneOf(['interval_usage', 'bill_amount', 'bill_usage']),
+                      metadata={'safe': True})
+    observed_at = fields.DateTime(dump_only=True, metadata={'safe': True})
+    value = fields.Float(dump_only=True)
+    expected = fields.Float(dump_only=True)
+    zscore = fields.Float(dump_only=True)
+    status = fields.Str(dump_only=True, validate=validate.OneOf(['open', 'acknowledged']),
+                        metadata={'safe': True})
+    created_at = fields.DateTime(dump_only=True, metadata={'safe': True})
+
+class NotificationSchema(Schema):
+    id = fields.Int(dump_only=True)
+    kind = fields.Str(dump_only=True, validate=validate.OneOf(['bill_due_digest']), metadata={'safe': True})
+    title = fields.Str(dump_only=True)
+    payload = fields.Dict(dump_only=True)
+    created_at = fields.DateTime(dump_only=True, metadata={'safe': True})
+    read_at = fields.DateTime(dump_only=True, metadata={'safe': True})
+
 class ExportLogSchema(Schema):
     id = fields.Int(dump_only=True)
     bill_id = fields.Int(required=True)
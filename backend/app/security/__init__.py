@@ -1,29 +1,23 @@
 """Security configuration and utilities for the application."""
 from functools import wraps
-from flask import current_app, request, jsonify, g
+from flask import Request, current_app, request, jsonify, g
 from flask_jwt_extended import get_jwt, verify_jwt_in_request
+import hmac
 import re
-from werkzeug.security import safe_str_cmp
 import secrets
 import logging
 from typing import Optional, Callable, Any
 from datetime import datetime, timezone
 import bleach
 from urllib.parse import urlparse
-from .security.encryption import DataEncryption, FieldEncryption, SecureTokenGenerator
-from .security.file_handler import SecureFileHandler
-from .models import AuditLog
+from .encryption import DataEncryption, FieldEncryption, SecureTokenGenerator
+from .api_keys import init_api_key_cache
+from .login_guard import init_login_guard
+from .audit_logging import build_redaction_pattern, init_audit_logging, redact
+from ..lazy import LazyService
+from ..services.chunked_uploads import part_size
 
-# Configure logging with secure settings
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    datefmt='%Y-%m-%d %H:%M:%S',
-    handlers=[
-        logging.StreamHandler(),
-        logging.FileHandler('security.log', encoding='utf-8')
-    ]
-)
+# Audit records are routed through a queue by init_audit_logging
 logger = logging.getLogger(__name__)
 
 class SecurityConfig:
@@ -48,6 +42,10 @@ class SecurityConfig:
     # File upload settings
     ALLOWED_EXTENSIONS = {'pdf', 'xlsx', 'xls', 'csv', 'xml'}
     MAX_CONTENT_LENGTH = 10 * 1024 * 1024  # 10MB
+    # Endpoints that take a file body instead of JSON
+    STREAMING_UPLOAD_ENDPOINTS = {'bills.create_bill', 'uploads.upload_part', 'meters.upload_interval_data'}
+    # Endpoints whose body limit is the upload part size instead
+    CHUNKED_UPLOAD_ENDPOINTS = {'uploads.upload_part'}
     
     # Rate limiting
     RATELIMIT_DEFAULT = "100/hour"
@@ -75,6 +73,17 @@ class SecurityConfig:
     AUDIT_LOG_RETENTION = 365  # days
     AUDIT_SENSITIVE_FIELDS = {'password', 'token', 'key', 'secret'}
 
+_SENSITIVE_PATTERN = build_redaction_pattern(SecurityConfig.AUDIT_SENSITIVE_FIELDS)
+
+class SecureRequest(Request):
+    """Request that allows upload parts to exceed MAX_CONTENT_LENGTH."""
+
+    @property
+    def max_content_length(self) -> Optional[int]:
+        if self.endpoint in SecurityConfig.CHUNKED_UPLOAD_ENDPOINTS:
+            return part_size()
+        return super().max_content_length
+
 def init_security(app):
     """Initialize security configurations."""
     # Set security-related configurations
@@ -83,12 +92,18 @@ def init_security(app):
     app.config['JWT_COOKIE_SECURE'] = SecurityConfig.JWT_COOKIE_SECURE
     app.config['JWT_COOKIE_SAMESITE'] = SecurityConfig.JWT_COOKIE_SAMESITE
     app.config['MAX_CONTENT_LENGTH'] = SecurityConfig.MAX_CONTENT_LENGTH
-    
-    # Initialize encryption services
-    app.data_encryption = DataEncryption()
-    app.field_encryption = FieldEncryption()
-    app.secure_file_handler = SecureFileHandler()
+    app.request_class = SecureRequest
+    
+    # Encryption services create KMS/S3 clients, so build them on first use
+    app.data_encryption = LazyService(DataEncryption)
+    app.field_encryption = LazyService(lambda: FieldEncryption(app.data_encryption.get()))
+    # Imported here: the file handler uses the models, which import this package
+    from .file_handler import SecureFileHandler
+    app.secure_file_handler = LazyService(SecureFileHandler)
     app.token_generator = SecureTokenGenerator()
+    init_api_key_cache(app)
+    init_login_guard(app)
+    init_audit_logging(app, logger)
     
     # Register security middleware
     @app.after_request
@@ -102,51 +117,48 @@ def init_security(app):
     @app.before_request
     def validate_content_type():
         """Validate Content-Type header for requests with body."""
-        if request.method in ['POST', 'PUT'] and not request.is_json:
+        if request.endpoint in SecurityConfig.STREAMING_UPLOAD_ENDPOINTS:
+            return None
+        # Action POSTs such as completing an upload may carry no body at all
+        has_body = request.content_length or 'chunked' in request.headers.get('Transfer-Encoding', '')
+        if request.method in ['POST', 'PUT'] and has_body and not request.is_json:
             return jsonify({'error': 'Content-Type must be application/json'}), 415
     
     @app.before_request
     def check_file_size():
         """Check file size before processing."""
-        if request.content_length and request.content_length > SecurityConfig.MAX_CONTENT_LENGTH:
+        if request.content_length and request.content_length > request.max_content_length:
             return jsonify({'error': 'File too large'}), 413
 
 def audit_log(action: str, resource: str, status: str, details: Optional[str] = None) -> None:
-    """Log security-relevant actions."""
+    """Log security-relevant actions.
+
+    Only builds the record and enqueues it; the background listener writes
+    it to the log files and the AuditLog table.
+    """
     user_id = getattr(g, 'current_user', {}).get('id', 'anonymous')
-    timestamp = datetime.now(timezone.utc).isoformat()
-    ip_address = request.remote_addr
-    
-    # Mask sensitive data in details
-    if details and isinstance(details, str):
-        for field in SecurityConfig.AUDIT_SENSITIVE_FIELDS:
-            pattern = rf'{field}["\']?\s*[:=]\s*["\']?([^"\'\s]+)["\']?'
-            details = re.sub(pattern, f'{field}=*****', details)
     
     log_data = {
-        'timestamp': timestamp,
+        'timestamp': datetime.now(timezone.utc).isoformat(),
         'user_id': user_id,
-        'ip_address': ip_address,
+        'ip_address': request.remote_addr,
         'action': action,
         'resource': resource,
         'status': status,
-        'details': details,
+        'details': redact(details, _SENSITIVE_PATTERN),
         'user_agent': request.user_agent.string if request.user_agent else None
     }
     
-    logger.info('Security Audit: %s', log_data)
-    
-    # Store in database
-    AuditLog.log(
-        user_id=user_id,
-        action=action,
-        resource=resource,
-        resource_id=None,
-        ip_address=ip_address,
-        user_agent=request.user_agent.string if request.user_agent else None,
-        status=status,
-        details=details
-    )
+    logger.info('Security Audit', extra={'audit': log_data})
+
+def validate_password(password: str) -> tuple[bool, str]:
+    """Check a password against the password policy."""
+    if len(password) < SecurityConfig.MIN_PASSWORD_LENGTH:
+        return False, f"Password must be at least {SecurityConfig.MIN_PASSWORD_LENGTH} characters long"
+    if not re.match(SecurityConfig.PASSWORD_PATTERN, password):
+        return False, ("Password must contain upper and lower case letters, a digit "
+                       "and one of @$!%*?&")
+    return True, "Password is valid"
 
 def validate_url(url: str) -> bool:
     """Validate URL to prevent SSRF attacks."""
@@ -178,4 +190,4 @@ def sanitize_input(text: str) -> str:
 
 def compare_secure_strings(a: str, b: str) -> bool:
     """Compare strings in constant time to prevent timing attacks."""
-    return safe_str_cmp(a.encode('utf-8'), b.encode('utf-8'))
+    return hmac.compare_digest(a.encode('utf-8'), b.encode('utf-8'))
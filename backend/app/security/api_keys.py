@@ -0,0 +1,173 @@
+"""API key hashing and a bounded cache of validated API principals."""
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Optional, Tuple
+from flask import current_app, has_app_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+import redis
+
+API_KEY_PREFIX_LENGTH = 12
+REVOCATION_CHANNEL = 'api_keys:revoked'
+_REVOKED = 'api_keys_revoked'
+
+
+def generate_api_key() -> Tuple[str, str, str]:
+    """
+    Generate a new API key.
+
+    Returns:
+        Tuple of (plaintext_key, prefix, key_hash). Only the prefix and hash
+        are persisted; the plaintext key is shown to the user once.
+    """
+    prefix = secrets.token_hex(API_KEY_PREFIX_LENGTH // 2)
+    api_key = f"{prefix}.{secrets.token_urlsafe(48)}"
+    return api_key, prefix, hash_api_key(api_key)
+
+
+def split_api_key(api_key: str) -> Optional[str]:
+    """Return the lookup prefix of an API key, or None if malformed."""
+    prefix, sep, secret = api_key.partition('.')
+    if not sep or not secret or len(prefix) != API_KEY_PREFIX_LENGTH:
+        return None
+    return prefix
+
+
+def hash_api_key(api_key: str) -> str:
+    """Return the keyed HMAC-SHA256 digest stored for an API key."""
+    secret = current_app.config.get('API_KEY_HASH_SECRET') or current_app.config['SECRET_KEY']
+    return hmac.new(secret.encode(), api_key.encode(), hashlib.sha256).hexdigest()
+
+
+class ApiKeyCache:
+    """
+    Bounded, TTL-based LRU cache of validated API principals.
+
+    Entries are keyed by the key hash, never the plaintext key. Revocations
+    are broadcast over Redis pub/sub so every worker evicts the prefix
+    immediately; the TTL bounds staleness if a message is missed.
+    """
+
+    def __init__(self, max_size: int = 10000, ttl: float = 60.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self._listener_pid: Optional[int] = None
+
+    def get(self, key_hash: str) -> Optional[dict]:
+        """Return the cached principal for a key hash if still valid."""
+        self._ensure_listener()
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key_hash)
+            if entry is None:
+                return None
+            principal, cached_until, key_expires_at = entry
+            if now > cached_until or now > key_expires_at:
+                del self._entries[key_hash]
+                return None
+            self._entries.move_to_end(key_hash)
+            return principal
+
+    def put(self, key_hash: str, principal: dict, key_expires_at: datetime) -> None:
+        """Cache a validated principal until the TTL or the key expiry."""
+        expires_ts = (key_expires_at - datetime.utcnow()).total_seconds() + time.time()
+        with self._lock:
+            self._entries[key_hash] = (principal, time.time() + self.ttl, expires_ts)
+            self._entries.move_to_end(key_hash)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def evict_prefix(self, prefix: str) -> None:
+        """Drop any cached principal whose key has the given prefix."""
+        with self._lock:
+            stale = [k for k, (p, _, _) in self._entries.items() if p['key_prefix'] == prefix]
+            for key_hash in stale:
+                del self._entries[key_hash]
+
+    def revoke(self, prefix: str) -> None:
+        """Evict a prefix locally and broadcast the revocation to other workers."""
+        self.evict_prefix(prefix)
+        try:
+            current_app.redis.publish(REVOCATION_CHANNEL, prefix)
+        except redis.RedisError as e:
+            current_app.logger.error(f"Error broadcasting API key revocation: {str(e)}")
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def _ensure_listener(self) -> None:
+        """Start the revocation subscriber once per process (fork-safe)."""
+        pid = os.getpid()
+        if self._listener_pid == pid:
+            return
+        with self._lock:
+            if self._listener_pid == pid:
+                return
+            self._entries.clear()
+            self._listener_pid = pid
+        try:
+            pubsub = current_app.redis.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(**{REVOCATION_CHANNEL: self._on_revocation})
+            pubsub.run_in_thread(sleep_time=0.5, daemon=True,
+                                 exception_handler=self._on_listener_error)
+        except redis.RedisError as e:
+            current_app.logger.error(f"Error subscribing to API key revocations: {str(e)}")
+            self._listener_pid = None
+
+    def _on_revocation(self, message: dict) -> None:
+        prefix = message['data']
+        if isinstance(prefix, bytes):
+            prefix = prefix.decode()
+        self.evict_prefix(prefix)
+
+    def _on_listener_error(self, error, pubsub, thread) -> None:
+        # Without the subscriber we can no longer trust cached entries
+        self.clear()
+        thread.stop()
+        self._listener_pid = None
+
+
+api_key_cache = ApiKeyCache()
+
+
+def revoke_on_commit(target, prefix: str) -> None:
+    """
+    Revoke ``prefix`` once the session holding ``target`` commits.
+
+    Evicting earlier would let another worker load the still-committed key
+    and cache it again for the whole TTL.
+    """
+    session = object_session(target)
+    if session is None:
+        api_key_cache.revoke(prefix)
+        return
+    session.info.setdefault(_REVOKED, set()).add(prefix)
+
+
+@event.listens_for(Session, 'after_commit')
+def _broadcast_revocations(session) -> None:
+    revoked = session.info.pop(_REVOKED, None)
+    if not revoked or not has_app_context():
+        return
+    for prefix in revoked:
+        api_key_cache.revoke(prefix)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_revocations(session) -> None:
+    session.info.pop(_REVOKED, None)
+
+
+def init_api_key_cache(app) -> None:
+    """Size the shared API key cache from configuration."""
+    api_key_cache.max_size = app.config.get('API_KEY_CACHE_SIZE', 10000)
+    api_key_cache.ttl = app.config.get('API_KEY_CACHE_TTL', 60)
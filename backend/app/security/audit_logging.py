@@ -0,0 +1,224 @@
+"""Non-blocking structured audit logging."""
+import atexit
+import json
+import logging
+import queue
+import re
+import threading
+import time
+from collections import deque
+from logging.handlers import QueueHandler, QueueListener
+from typing import Iterable, Optional
+
+# Outside the 'app.security' tree, so overflow warnings never re-enter the queue
+overflow_logger = logging.getLogger('app.audit_overflow')
+# Minimum seconds between two overflow warnings
+OVERFLOW_WARNING_INTERVAL = 60.0
+
+
+def build_redaction_pattern(fields: Iterable[str]) -> re.Pattern:
+    """Compile one alternation pattern matching `field=value` pairs for all fields."""
+    alternation = '|'.join(re.escape(f) for f in sorted(fields, key=len, reverse=True))
+    return re.compile(rf'({alternation})["\']?\s*[:=]\s*["\']?([^"\'\s]+)["\']?')
+
+
+def redact(details: Optional[str], pattern: re.Pattern) -> Optional[str]:
+    """Mask the values of sensitive fields in a single pass."""
+    if not details or not isinstance(details, str):
+        return details
+    return pattern.sub(r'\1=*****', details)
+
+
+class JsonFormatter(logging.Formatter):
+    """Format records as one JSON object per line."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            'timestamp': self.formatTime(record, '%Y-%m-%dT%H:%M:%S'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage()
+        }
+        audit = getattr(record, 'audit', None)
+        if audit:
+            payload.update(audit)
+        if record.exc_info:
+            payload['exception'] = self.formatException(record.exc_info)
+        return json.dumps(payload, default=str)
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    Enqueue records without formatting or blocking on the calling thread.
+
+    The queue is in-process, so records do not need to be made picklable;
+    formatting happens on the listener thread. When the queue is full the
+    record goes to a bounded overflow buffer that a background thread
+    appends to `spill_path`; a record is dropped when the buffer is full or
+    the write fails. Spills and drops are counted and reported by that
+    thread at most once per OVERFLOW_WARNING_INTERVAL.
+    """
+
+    def __init__(self, log_queue: queue.Queue, spill_path: Optional[str] = None,
+                 overflow_size: int = 1000):
+        super().__init__(log_queue)
+        self.spill_path = spill_path
+        self.overflow_size = overflow_size
+        self.spilled = 0
+        self.dropped = 0
+        self._overflow: deque = deque()
+        self._overflow_ready = threading.Event()
+        self._spill_formatter = JsonFormatter()
+        self._spill_thread: Optional[threading.Thread] = None
+        self._closing = False
+        self._lock = threading.Lock()
+        self._reported = (0, 0)
+        self._next_warning = 0.0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+            return
+        except queue.Full:
+            pass
+        with self._lock:
+            if self.spill_path and not self._closing and len(self._overflow) < self.overflow_size:
+                self._overflow.append(record)
+            else:
+                self.dropped += 1
+            if self._spill_thread is None and not self._closing:
+                self._spill_thread = threading.Thread(target=self._drain_overflow,
+                                                      name='audit-log-spill', daemon=True)
+                self._spill_thread.start()
+        self._overflow_ready.set()
+
+    def close(self) -> None:
+        """Write out the overflow buffer and stop the spill thread."""
+        with self._lock:
+            self._closing = True
+            thread = self._spill_thread
+        self._overflow_ready.set()
+        if thread is not None:
+            thread.join()
+        super().close()
+
+    def _drain_overflow(self) -> None:
+        spill_file = None
+        while True:
+            self._overflow_ready.wait(OVERFLOW_WARNING_INTERVAL)
+            self._overflow_ready.clear()
+            with self._lock:
+                records = list(self._overflow)
+                self._overflow.clear()
+                closing = self._closing
+            if records:
+                spill_file = self._spill(records, spill_file)
+            self._warn_overflow()
+            if closing:
+                break
+        if spill_file is not None:
+            spill_file.close()
+
+    def _spill(self, records: list, spill_file):
+        written = 0
+        try:
+            if spill_file is None:
+                spill_file = open(self.spill_path, 'a', encoding='utf-8')
+            for record in records:
+                spill_file.write(self._spill_formatter.format(record) + '\n')
+                written += 1
+            spill_file.flush()
+        except (OSError, ValueError):
+            pass
+        with self._lock:
+            self.spilled += written
+            self.dropped += len(records) - written
+        return spill_file
+
+    def _warn_overflow(self) -> None:
+        now = time.monotonic()
+        with self._lock:
+            spilled, dropped = self.spilled - self._reported[0], self.dropped - self._reported[1]
+            if not (spilled or dropped) or now < self._next_warning:
+                return
+            self._next_warning = now + OVERFLOW_WARNING_INTERVAL
+            self._reported = (self.spilled, self.dropped)
+        overflow_logger.warning(
+            f"Audit log queue full: {spilled} records spilled to {self.spill_path}, "
+            f"{dropped} dropped (totals {self._reported[0]} spilled, {self._reported[1]} dropped)"
+        )
+
+
+class AuditDatabaseHandler(logging.Handler):
+    """Persist audit records to the AuditLog table from the listener thread."""
+
+    def __init__(self, app):
+        super().__init__()
+        self.app = app
+
+    def emit(self, record: logging.LogRecord) -> None:
+        audit = getattr(record, 'audit', None)
+        if not audit:
+            return
+        from app.models import AuditLog
+
+        user_id = audit.get('user_id')
+        try:
+            with self.app.app_context():
+                AuditLog.log(
+                    user_id=user_id if isinstance(user_id, int) else None,
+                    action=audit['action'],
+                    resource=audit['resource'],
+                    resource_id=None,
+                    ip_address=audit.get('ip_address'),
+                    user_agent=audit.get('user_agent'),
+                    status=audit['status'],
+                    details=audit.get('details')
+                )
+        except Exception:
+            self.handleError(record)
+
+
+def init_audit_logging(app, logger: logging.Logger) -> QueueListener:
+    """
+    Route `logger` through a bounded queue to a background listener.
+
+    The listener writes JSON lines to stderr and SECURITY_LOG_FILE and
+    stores audit records in the database, so request threads only enqueue.
+    Records that do not fit in the queue go to SECURITY_LOG_SPILL_FILE.
+    """
+    log_queue: queue.Queue = queue.Queue(maxsize=app.config.get('AUDIT_LOG_QUEUE_SIZE', 10000))
+    formatter = JsonFormatter()
+
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(formatter)
+    file_handler = logging.FileHandler(app.config.get('SECURITY_LOG_FILE', 'security.log'),
+                                       encoding='utf-8')
+    file_handler.setFormatter(formatter)
+
+    previous = getattr(app, 'audit_log_listener', None)
+    if previous is not None:
+        # After a fork the previous listener's thread no longer exists
+        atexit.unregister(previous.stop)
+
+    listener = QueueListener(log_queue, stream_handler, file_handler, AuditDatabaseHandler(app),
+                             respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+
+    for handler in list(logger.handlers):
+        if isinstance(handler, NonBlockingQueueHandler):
+            logger.removeHandler(handler)
+    logger.addHandler(NonBlockingQueueHandler(
+        log_queue,
+        spill_path=app.config.get('SECURITY_LOG_SPILL_FILE', 'security-spill.log'),
+        overflow_size=app.config.get('AUDIT_LOG_OVERFLOW_SIZE', 1000)
+    ))
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+    app.audit_log_listener = listener
+    return listener
@@ -8,8 +8,6 @@ from cryptography.hazmat.backends import default_backend
 import base64
 import os
 from typing import Tuple, Optional
-import boto3
-from botocore.exceptions import ClientError
 from flask import current_app
 import json
 
@@ -17,9 +15,17 @@ class KeyManagement:
     """Secure key management using AWS KMS."""
     
     def __init__(self):
-        """Initialize KMS client."""
-        self.kms_client = boto3.client('kms')
+        """Initialize KMS settings; the client is created on first use."""
+        self._kms_client = None
         self.key_id = current_app.config['KMS_KEY_ID']
+
+    @property
+    def kms_client(self):
+        """KMS client, imported and constructed lazily to keep startup cheap."""
+        if self._kms_client is None:
+            import boto3
+            self._kms_client = boto3.client('kms')
+        return self._kms_client
     
     def generate_data_key(self) -> Tuple[bytes, bytes]:
         """
@@ -28,6 +34,8 @@ class KeyManagement:
         Returns:
             Tuple of (plaintext_key, encrypted_key)
         """
+        from botocore.exceptions import ClientError
+
         try:
             response = self.kms_client.generate_data_key(
                 KeyId=self.key_id,
@@ -48,6 +56,8 @@ class KeyManagement:
         Returns:
             Decrypted data key
         """
+        from botocore.exceptions import ClientError
+
         try:
             response = self.kms_client.decrypt(
                 KeyId=self.key_id,
@@ -138,9 +148,9 @@ class DataEncryption:
 class FieldEncryption:
     """Handle database field encryption."""
     
-    def __init__(self):
-        """Initialize field encryption."""
-        self.data_encryption = DataEncryption()
+    def __init__(self, data_encryption: Optional[DataEncryption] = None):
+        """Initialize field encryption, sharing a DataEncryption if given."""
+        self.data_encryption = data_encryption or DataEncryption()
     
     def encrypt_field(self, value: str) -> dict:
         """
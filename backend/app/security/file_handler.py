@@ -1,16 +1,10 @@
 """Secure file handling operations."""
-import os
-import hashlib
-import magic
-import shutil
 from typing import Optional, Tuple
 from werkzeug.utils import secure_filename
 from flask import current_app
-import boto3
-from botocore.exceptions import ClientError
 from cryptography.fernet import Fernet
-import tempfile
 from ..models import AuditLog
+from ..services.file_inspection import inspect_buffer
 
 class SecureFileHandler:
     """Handle file operations securely."""
@@ -25,9 +19,17 @@ class SecureFileHandler:
     }
     
     def __init__(self):
-        """Initialize secure file handler."""
-        self.s3_client = boto3.client('s3')
+        """Initialize secure file handler; the S3 client is created on first use."""
+        self._s3_client = None
         self.fernet = Fernet(current_app.config['FILE_ENCRYPTION_KEY'].encode())
+
+    @property
+    def s3_client(self):
+        """S3 client, imported and constructed lazily to keep startup cheap."""
+        if self._s3_client is None:
+            import boto3
+            self._s3_client = boto3.client('s3')
+        return self._s3_client
     
     def secure_save_file(self, file, user_id: int) -> Tuple[bool, str]:
         """
@@ -41,49 +43,45 @@ class SecureFileHandler:
             Tuple of (success, message)
         """
         try:
-            # Create temp file for processing
-            with tempfile.NamedTemporaryFile(delete=False) as temp_file:
-                file.save(temp_file.name)
-                
-                # Verify file type
-                mime_type = magic.from_file(temp_file.name, mime=True)
-                if mime_type not in self.ALLOWED_MIME_TYPES:
-                    os.unlink(temp_file.name)
-                    return False, "Invalid file type"
-                
-                # Verify file extension matches content
-                filename = secure_filename(file.filename)
-                if not filename.endswith(self.ALLOWED_MIME_TYPES[mime_type]):
-                    os.unlink(temp_file.name)
-                    return False, "File extension doesn't match content"
-                
-                # Calculate file hash
-                file_hash = self._calculate_file_hash(temp_file.name)
-                
-                # Encrypt file
-                encrypted_data = self._encrypt_file(temp_file.name)
-                
-                # Generate secure filename
-                secure_name = f"{file_hash}{self.ALLOWED_MIME_TYPES[mime_type]}"
-                
-                # Save to S3
-                self._upload_to_s3(encrypted_data, secure_name)
-                
-                # Log file upload
-                AuditLog.log(
-                    user_id=user_id,
-                    action='file_upload',
-                    resource='file',
-                    resource_id=None,
-                    ip_address=None,
-                    user_agent=None,
-                    status='success',
-                    details=f"File uploaded: {filename} (hash: {file_hash})"
-                )
-                
-                os.unlink(temp_file.name)
-                return True, secure_name
-                
+            # Uploads are bounded by MAX_CONTENT_LENGTH, so inspect and
+            # encrypt them in memory instead of through a temp file
+            data = file.read()
+            filename = secure_filename(file.filename)
+            inspection = inspect_buffer(data, filename, self.ALLOWED_MIME_TYPES)
+
+            # Verify file type
+            if inspection.mime_type not in self.ALLOWED_MIME_TYPES:
+                return False, "Invalid file type"
+
+            # Verify file extension matches content
+            if not inspection.extension_ok:
+                return False, "File extension doesn't match content"
+
+            file_hash = inspection.sha256
+
+            # Encrypt file
+            encrypted_data = self.fernet.encrypt(data)
+
+            # Generate secure filename
+            secure_name = f"{file_hash}{self.ALLOWED_MIME_TYPES[inspection.mime_type]}"
+
+            # Save to S3
+            self._upload_to_s3(encrypted_data, secure_name)
+
+            # Log file upload
+            AuditLog.log(
+                user_id=user_id,
+                action='file_upload',
+                resource='file',
+                resource_id=None,
+                ip_address=None,
+                user_agent=None,
+                status='success',
+                details=f"File uploaded: {filename} (hash: {file_hash})"
+            )
+
+            return True, secure_name
+
         except Exception as e:
             # Log error
             AuditLog.log(
@@ -114,38 +112,27 @@ class SecureFileHandler:
             encrypted_data = self._download_from_s3(filename)
             if not encrypted_data:
                 return None, "File not found"
-            
-            # Create temp file for processing
-            with tempfile.NamedTemporaryFile(delete=False) as temp_file:
-                # Decrypt file
-                decrypted_data = self._decrypt_data(encrypted_data)
-                temp_file.write(decrypted_data)
-                temp_file.flush()
-                
-                # Verify file type
-                mime_type = magic.from_file(temp_file.name, mime=True)
-                if mime_type not in self.ALLOWED_MIME_TYPES:
-                    os.unlink(temp_file.name)
-                    return None, "Invalid file type"
-                
-                # Log file access
-                AuditLog.log(
-                    user_id=user_id,
-                    action='file_read',
-                    resource='file',
-                    resource_id=None,
-                    ip_address=None,
-                    user_agent=None,
-                    status='success',
-                    details=f"File accessed: {filename}"
-                )
-                
-                with open(temp_file.name, 'rb') as f:
-                    content = f.read()
-                
-                os.unlink(temp_file.name)
-                return content, "Success"
-                
+
+            # Decrypt and verify file type in memory
+            content = self._decrypt_data(encrypted_data)
+            inspection = inspect_buffer(content)
+            if inspection.mime_type not in self.ALLOWED_MIME_TYPES:
+                return None, "Invalid file type"
+
+            # Log file access
+            AuditLog.log(
+                user_id=user_id,
+                action='file_read',
+                resource='file',
+                resource_id=None,
+                ip_address=None,
+                user_agent=None,
+                status='success',
+                details=f"File accessed: {filename}"
+            )
+
+            return content, "Success"
+
         except Exception as e:
             # Log error
             AuditLog.log(
@@ -206,20 +193,6 @@ class SecureFileHandler:
             )
             return False, str(e)
     
-    def _calculate_file_hash(self, filepath: str) -> str:
-        """Calculate SHA-256 hash of file."""
-        sha256_hash = hashlib.sha256()
-        with open(filepath, "rb") as f:
-            for byte_block in iter(lambda: f.read(4096), b""):
-                sha256_hash.update(byte_block)
-        return sha256_hash.hexdigest()
-    
-    def _encrypt_file(self, filepath: str) -> bytes:
-        """Encrypt file using Fernet."""
-        with open(filepath, 'rb') as f:
-            data = f.read()
-        return self.fernet.encrypt(data)
-    
     def _decrypt_data(self, data: bytes) -> bytes:
         """Decrypt data using Fernet."""
         return self.fernet.decrypt(data)
@@ -235,6 +208,8 @@ class SecureFileHandler:
     
     def _download_from_s3(self, filename: str) -> Optional[bytes]:
         """Download encrypted data from S3."""
+        from botocore.exceptions import ClientError
+
         try:
             response = self.s3_client.get_object(
                 Bucket=current_app.config['S3_BUCKET'],
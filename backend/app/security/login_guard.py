@@ -0,0 +1,168 @@
+"""Login throttling and lockout in Redis, and a bounded password hashing pool."""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from datetime import datetime, timedelta
+from typing import Optional
+from flask import current_app
+from werkzeug.security import check_password_hash
+import redis
+
+LOCK_KEY = 'login:lock:{}'
+FAIL_KEY = 'login:fail:{}'
+THROTTLE_KEY = 'login:throttle:{}'
+
+# Count a failure and lock the account once the threshold is reached, in one
+# atomic step. Returns {failed_attempts, lockout_seconds}.
+RECORD_FAILURE_SCRIPT = """
+local failures = redis.call('INCR', KEYS[1])
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+if failures >= tonumber(ARGV[2]) then
+    redis.call('SET', KEYS[2], 1, 'EX', ARGV[3])
+    redis.call('DEL', KEYS[1])
+    return {failures, tonumber(ARGV[3])}
+end
+return {failures, 0}
+"""
+
+
+class LoginOverloaded(Exception):
+    """Raised when the password hashing pool is saturated."""
+
+
+class PasswordHasherPool:
+    """
+    Run password hash checks on a fixed-size thread pool.
+
+    Hash functions release the GIL, so a small pool keeps CPU use bounded
+    while request threads wait. Once `max_queue` checks are waiting, new
+    attempts are shed with LoginOverloaded instead of queueing without limit.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, max_queue: Optional[int] = None):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_queue = max_queue if max_queue is not None else self.max_workers * 4
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._slots: Optional[threading.BoundedSemaphore] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def configure(self, max_workers: Optional[int], max_queue: Optional[int]) -> None:
+        """Resize the pool; takes effect the next time the executor is built."""
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_queue = max_queue if max_queue is not None else self.max_workers * 4
+        self._pid = None
+
+    def verify(self, password_hash: str, password: str, timeout: float = 5.0) -> bool:
+        """Check a password on the pool, raising LoginOverloaded when saturated."""
+        executor, slots = self._ensure_executor()
+        if not slots.acquire(blocking=False):
+            raise LoginOverloaded()
+        try:
+            future = executor.submit(check_password_hash, password_hash, password)
+        except RuntimeError:
+            slots.release()
+            raise
+        future.add_done_callback(lambda _: slots.release())
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise LoginOverloaded()
+
+    def _ensure_executor(self):
+        # Executors do not survive fork, so each process builds its own
+        pid = os.getpid()
+        if self._pid != pid:
+            with self._lock:
+                if self._pid != pid:
+                    self._executor = _native_executor(self.max_workers)
+                    self._slots = threading.BoundedSemaphore(self.max_workers + self.max_queue)
+                    self._pid = pid
+        return self._executor, self._slots
+
+
+def _native_executor(max_workers: int):
+    """
+    Return an executor on OS threads. Under gevent, threading is patched
+    and a plain ThreadPoolExecutor would hash on greenlets, blocking the
+    event loop; gevent's executor keeps real threads.
+    """
+    try:
+        from gevent import monkey
+    except ImportError:
+        monkey = None
+    if monkey is not None and monkey.is_module_patched('threading'):
+        from gevent.threadpool import ThreadPoolExecutor as NativeThreadPoolExecutor
+        return NativeThreadPoolExecutor(max_workers=max_workers)
+    return ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='password-hash')
+
+
+password_hasher = PasswordHasherPool()
+
+
+def init_login_guard(app) -> None:
+    """Size the password hashing pool and register the lockout script."""
+    password_hasher.configure(app.config.get('LOGIN_HASH_WORKERS'),
+                              app.config.get('LOGIN_HASH_QUEUE_DEPTH'))
+    app.login_failure_script = app.redis.register_script(RECORD_FAILURE_SCRIPT)
+
+
+def begin_attempt(user_id: int) -> bool:
+    """
+    Check lockout and per-account throttling before verifying a password.
+
+    Returns:
+        False if the account is locked or attempted too recently
+    """
+    config = current_app.config
+    try:
+        pipe = current_app.redis.pipeline()
+        pipe.exists(LOCK_KEY.format(user_id))
+        pipe.set(THROTTLE_KEY.format(user_id), 1, nx=True,
+                 px=int(config.get('LOGIN_THROTTLE_SECONDS', 2) * 1000))
+        locked, throttle_acquired = pipe.execute()
+    except redis.RedisError as e:
+        current_app.logger.error(f"Error checking login lockout: {str(e)}")
+        return True
+    return not locked and bool(throttle_acquired)
+
+
+def record_failure(user_id: int) -> None:
+    """Count a failed attempt and persist the new state asynchronously."""
+    config = current_app.config
+    attempted_at = datetime.utcnow()
+    try:
+        failures, lockout_seconds = current_app.login_failure_script(
+            keys=[FAIL_KEY.format(user_id), LOCK_KEY.format(user_id)],
+            args=[config.get('LOGIN_FAILURE_WINDOW', 900),
+                  config.get('LOGIN_MAX_FAILED_ATTEMPTS', 5),
+                  config.get('LOGIN_LOCKOUT_SECONDS', 900)]
+        )
+    except redis.RedisError as e:
+        current_app.logger.error(f"Error recording failed login: {str(e)}")
+        return
+    locked_until = attempted_at + timedelta(seconds=lockout_seconds) if lockout_seconds else None
+    _persist(user_id, False, attempted_at, failures, locked_until)
+
+
+def record_success(user_id: int) -> None:
+    """Reset the failure counter and persist the attempt asynchronously."""
+    try:
+        current_app.redis.delete(FAIL_KEY.format(user_id))
+    except redis.RedisError as e:
+        current_app.logger.error(f"Error resetting failed logins: {str(e)}")
+    _persist(user_id, True, datetime.utcnow(), 0, None)
+
+
+def _persist(user_id: int, succeeded: bool, attempted_at: datetime,
+             failed_attempts: int, locked_until: Optional[datetime]) -> None:
+    from app.tasks import persist_login_attempt
+
+    try:
+        persist_login_attempt.delay(
+            user_id, succeeded, attempted_at.isoformat(), failed_attempts,
+            locked_until.isoformat() if locked_until else None
+        )
+    except Exception as e:
+        current_app.logger.error(f"Error queueing login attempt persistence: {str(e)}")
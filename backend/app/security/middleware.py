@@ -4,10 +4,12 @@ from flask import request, g, jsonify, current_app
 from werkzeug.utils import secure_filename
 import hashlib
 import hmac
-import time
 import re
 from typing import Callable, Any, Optional
-from .utils import validate_url, sanitize_input
+from . import validate_url, sanitize_input
+from .api_keys import api_key_cache, hash_api_key, split_api_key
+from .rate_limiter import RateLimiter, retry_after_header
+from .sanitizer import get_sanitizer
 from ..models import User, AuditLog
 
 def require_api_key(f: Callable) -> Callable:
@@ -20,13 +22,25 @@ def require_api_key(f: Callable) -> Callable:
                         request.user_agent.string, 'failed', 'Missing API key')
             return jsonify({'error': 'API key is required'}), 401
 
-        user = User.query.filter_by(api_key=api_key).first()
-        if not user or not user.verify_api_key(api_key):
-            AuditLog.log(None, 'api_access', 'api', None, request.remote_addr,
-                        request.user_agent.string, 'failed', 'Invalid API key')
-            return jsonify({'error': 'Invalid API key'}), 401
+        key_hash = hash_api_key(api_key)
+        principal = api_key_cache.get(key_hash)
+        if principal is None:
+            prefix = split_api_key(api_key)
+            user = User.query.filter_by(api_key_prefix=prefix).first() if prefix else None
+            if not user or not user.is_active or not user.verify_api_key(api_key):
+                AuditLog.log(None, 'api_access', 'api', None, request.remote_addr,
+                            request.user_agent.string, 'failed', 'Invalid API key')
+                return jsonify({'error': 'Invalid API key'}), 401
+
+            principal = {
+                'id': user.id,
+                'role': user.role,
+                'organization_id': user.organization_id,
+                'key_prefix': prefix
+            }
+            api_key_cache.put(key_hash, principal, user.api_key_expires_at)
 
-        g.current_user = user
+        g.current_user = principal
         return f(*args, **kwargs)
     return decorated
 
@@ -74,29 +88,31 @@ def validate_file_upload(allowed_extensions: set[str], max_size_mb: int = 10) ->
         return decorated
     return decorator
 
-def rate_limit(requests: int, window: int) -> Callable:
+def rate_limit(requests: int, window: int, prefilter: bool = True) -> Callable:
     """Decorator for rate limiting based on IP address."""
     def decorator(f: Callable) -> Callable:
+        name = f'{f.__module__}.{f.__name__}'
+
         @wraps(f)
         def decorated(*args: Any, **kwargs: Any) -> Any:
+            # One limiter per app, as it holds the app's Redis script
+            limiters = current_app.extensions.setdefault('rate_limiters', {})
+            limiter = limiters.get(name)
+            if limiter is None:
+                limiter = limiters[name] = RateLimiter(current_app.redis, requests, window,
+                                                       prefilter=prefilter)
+
             ip = request.remote_addr
-            current = time.time()
-            key = f'rate_limit:{ip}:{f.__name__}'
-            
-            # Use Redis for rate limiting
-            pipe = current_app.redis.pipeline()
-            pipe.zremrangebyscore(key, 0, current - window)
-            pipe.zcard(key)
-            pipe.zadd(key, {str(current): current})
-            pipe.expire(key, window)
-            results = pipe.execute()
+            allowed, retry_after = limiter.hit(f'{ip}:{f.__name__}')
             
-            if results[1] >= requests:
+            if not allowed:
                 AuditLog.log(getattr(g, 'current_user', {}).get('id'), 
                            'rate_limit', 'api', None, ip,
                            request.user_agent.string, 'blocked',
                            f'Rate limit exceeded: {requests} requests per {window}s')
-                return jsonify({'error': 'Rate limit exceeded'}), 429
+                response = jsonify({'error': 'Rate limit exceeded'})
+                response.headers['Retry-After'] = retry_after_header(retry_after)
+                return response, 429
                 
             return f(*args, **kwargs)
         return decorated
@@ -157,35 +173,33 @@ def verify_webhook_signature(f: Callable) -> Callable:
         return f(*args, **kwargs)
     return decorated
 
-def sanitize_response(f: Callable) -> Callable:
-    """Decorator to sanitize response data."""
-    @wraps(f)
-    def decorated(*args: Any, **kwargs: Any) -> Any:
-        response = f(*args, **kwargs)
-        
-        if isinstance(response, tuple):
-            data, code = response
-        else:
-            data, code = response, 200
-            
-        # Recursively sanitize response data
-        def sanitize_dict(d: dict) -> dict:
-            for key, value in d.items():
-                if isinstance(value, str):
-                    d[key] = sanitize_input(value)
-                elif isinstance(value, dict):
-                    d[key] = sanitize_dict(value)
-                elif isinstance(value, list):
-                    d[key] = [sanitize_dict(i) if isinstance(i, dict)
-                             else sanitize_input(i) if isinstance(i, str)
-                             else i for i in value]
-            return d
-            
-        if isinstance(data, dict):
-            data = sanitize_dict(data)
+def sanitize_response(f: Optional[Callable] = None, *,
+                      safe_fields: Optional[set[str]] = None, schema=None) -> Callable:
+    """
+    Decorator to sanitize response data.
+
+    Usable bare or as ``@sanitize_response(schema=BillSchema())`` to skip
+    fields the schema declares safe.
+    """
+    sanitizer = get_sanitizer(safe_fields, schema)
+
+    def decorator(f: Callable) -> Callable:
+        @wraps(f)
+        def decorated(*args: Any, **kwargs: Any) -> Any:
+            response = f(*args, **kwargs)
             
-        return (data, code) if isinstance(response, tuple) else data
-    return decorated
+            if isinstance(response, tuple):
+                data, code = response
+            else:
+                data, code = response, 200
+                
+            if isinstance(data, (dict, list)):
+                data = sanitizer.sanitize(data)
+                
+            return (data, code) if isinstance(response, tuple) else data
+        return decorated
+
+    return decorator(f) if f is not None else decorator
 
 def validate_url_parameters(*allowed_params: str) -> Callable:
     """Decorator to validate URL parameters."""
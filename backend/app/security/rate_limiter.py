@@ -0,0 +1,111 @@
+"""Atomic GCRA rate limiting in Redis with an optional in-process pre-filter."""
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional, Tuple
+
+# Generic cell rate algorithm: one key per client holding the theoretical
+# arrival time (TAT) in microseconds, so memory is O(1) per key and a check
+# is a single EVALSHA round trip. Denied requests do not modify state.
+GCRA_SCRIPT = """
+local emission = tonumber(ARGV[1])
+local tolerance = tonumber(ARGV[2])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000000 + tonumber(t[2])
+local tat = tonumber(redis.call('GET', KEYS[1]))
+if not tat or tat < now then
+    tat = now
+end
+local new_tat = tat + emission
+local allow_at = new_tat - tolerance
+if now < allow_at then
+    return {0, allow_at - now}
+end
+redis.call('SET', KEYS[1], string.format('%.0f', new_tat),
+           'PX', math.ceil((new_tat - now) / 1000))
+return {1, 0}
+"""
+
+
+class LocalTokenBucket:
+    """
+    In-process token buckets used to reject obvious bursts without Redis.
+
+    Each bucket has the same capacity and refill rate as the global limit.
+    A process only sees a subset of a client's traffic, so an empty local
+    bucket means the global limit is exceeded as well; the pre-filter can
+    therefore only ever reject requests Redis would also have rejected.
+    """
+
+    def __init__(self, capacity: int, window: float, max_keys: int = 10000,
+                 clock: Callable[[], float] = time.monotonic):
+        self.capacity = float(capacity)
+        self.rate = capacity / window
+        self.max_keys = max_keys
+        self.clock = clock
+        self._buckets: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key: str) -> bool:
+        """Consume a token for key, returning False if the bucket is empty."""
+        now = self.clock()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (self.capacity, now))
+            tokens = min(self.capacity, tokens + (now - updated) * self.rate)
+            allowed = tokens >= 1.0
+            if allowed:
+                tokens -= 1.0
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+            return allowed
+
+    def refund(self, key: str) -> None:
+        """Return a token taken for a request that Redis then rejected."""
+        with self._lock:
+            if key in self._buckets:
+                tokens, updated = self._buckets[key]
+                self._buckets[key] = (min(self.capacity, tokens + 1.0), updated)
+
+
+class RateLimiter:
+    """Allow `requests` per `window` seconds per key using GCRA in Redis."""
+
+    def __init__(self, redis_client, requests: int, window: int,
+                 prefilter: bool = True, prefix: str = 'rate_limit'):
+        self.requests = requests
+        self.window = window
+        self.prefix = prefix
+        self.emission_us = int(round(window * 1_000_000 / requests))
+        self.tolerance_us = int(window * 1_000_000)
+        self._script = redis_client.register_script(GCRA_SCRIPT)
+        self._local: Optional[LocalTokenBucket] = (
+            LocalTokenBucket(requests, window) if prefilter else None
+        )
+
+    def hit(self, key: str) -> Tuple[bool, float]:
+        """
+        Record a request for key if it is within the limit.
+
+        Returns:
+            Tuple of (allowed, retry_after_seconds)
+        """
+        if self._local is not None and not self._local.take(key):
+            return False, self.window / self.requests
+
+        allowed, retry_us = self._script(
+            keys=[f'{self.prefix}:{key}'],
+            args=[self.emission_us, self.tolerance_us]
+        )
+        if not allowed:
+            if self._local is not None:
+                self._local.refund(key)
+            return False, retry_us / 1_000_000
+        return True, 0.0
+
+
+def retry_after_header(seconds: float) -> str:
+    """Format a Retry-After value in whole seconds."""
+    return str(max(1, math.ceil(seconds)))
@@ -0,0 +1,138 @@
+"""Response sanitization with a markup-free fast path."""
+import re
+from typing import Any, Callable, Dict, Iterable, Optional
+import bleach
+from marshmallow import fields, validate
+
+# Strings without these characters pass through bleach unchanged, so they
+# can skip it: numbers, ISO dates, enum values and most free text.
+_MARKUP_CHARS = re.compile(r'[<>&]')
+
+# Field types whose serialized form is built from a typed value and so
+# cannot carry markup
+_TYPED_FIELDS = (fields.Number, fields.Boolean, fields.Date, fields.DateTime, fields.Time, fields.TimeDelta)
+
+
+def clean_markup(text: str) -> str:
+    """Strip all tags and comments (the same policy as security.sanitize_input)."""
+    return bleach.clean(
+        text,
+        tags=[],
+        attributes={},
+        protocols=['http', 'https', 'mailto'],
+        strip=True,
+        strip_comments=True
+    )
+
+
+class SafeFields(frozenset):
+    """
+    Keys skipped in one record, plus the safe fields of nested records keyed
+    by the field holding them. Dicts at any other depth get no safe keys.
+    """
+
+    def __new__(cls, names: Iterable[str] = (), nested: Optional[Dict[str, 'SafeFields']] = None):
+        self = super().__new__(cls, names)
+        self.nested = dict(nested or {})
+        return self
+
+
+NO_SAFE_FIELDS = SafeFields()
+
+
+def _can_be_safe(field) -> bool:
+    # Free text may hold markup however it is labelled, including dump-only
+    # fields copied from client-written rows (a site or account name)
+    return isinstance(field, _TYPED_FIELDS) or any(isinstance(v, validate.OneOf) for v in field.validators)
+
+
+def safe_fields_from_schema(schema) -> SafeFields:
+    """
+    Return the fields of a marshmallow schema declared with
+    metadata={'safe': True}, recursing into nested schemas.
+
+    The mark is only honoured on typed or OneOf-validated fields.
+    """
+    names, nested = set(), {}
+    for name, field in schema.fields.items():
+        key = field.data_key or name
+        if field.metadata.get('safe') and _can_be_safe(field):
+            names.add(key)
+        inner = field.inner if isinstance(field, fields.List) else field
+        if isinstance(inner, fields.Nested):
+            nested[key] = safe_fields_from_schema(inner.schema)
+    return SafeFields(names, nested)
+
+
+class ResponseSanitizer:
+    """
+    Recursively sanitize strings in response data.
+
+    Strings that cannot contain markup are returned untouched, repeated
+    values are cleaned once per response, and values under keys listed in
+    `safe_fields` are not inspected at all. Safe keys apply to the top-level
+    record (or each record of a top-level list) and, through
+    SafeFields.nested, to the records of nested schemas.
+    """
+
+    def __init__(self, safe_fields: Iterable[str] = (),
+                 clean: Callable[[str], str] = clean_markup):
+        self.safe_fields = safe_fields if isinstance(safe_fields, SafeFields) else SafeFields(safe_fields)
+        self.clean = clean
+
+    def sanitize(self, data: Any) -> Any:
+        """Sanitize a dict or list in place and return it."""
+        memo: Dict[str, str] = {}
+        if isinstance(data, dict):
+            return self._sanitize_dict(data, memo, self.safe_fields)
+        if isinstance(data, list):
+            return self._sanitize_list(data, memo, self.safe_fields)
+        if isinstance(data, str):
+            return self._sanitize_str(data, memo)
+        return data
+
+    def _sanitize_dict(self, d: dict, memo: Dict[str, str], safe: SafeFields) -> dict:
+        for key, value in d.items():
+            if key in safe:
+                continue
+            if isinstance(value, str):
+                d[key] = self._sanitize_str(value, memo)
+            elif isinstance(value, dict):
+                self._sanitize_dict(value, memo, safe.nested.get(key, NO_SAFE_FIELDS))
+            elif isinstance(value, list):
+                self._sanitize_list(value, memo, safe.nested.get(key, NO_SAFE_FIELDS))
+        return d
+
+    def _sanitize_list(self, items: list, memo: Dict[str, str], safe: SafeFields) -> list:
+        for i, value in enumerate(items):
+            if isinstance(value, str):
+                items[i] = self._sanitize_str(value, memo)
+            elif isinstance(value, dict):
+                self._sanitize_dict(value, memo, safe)
+            elif isinstance(value, list):
+                self._sanitize_list(value, memo, safe)
+        return items
+
+    def _sanitize_str(self, value: str, memo: Dict[str, str]) -> str:
+        if _MARKUP_CHARS.search(value) is None:
+            return value
+        cleaned = memo.get(value)
+        if cleaned is None:
+            cleaned = memo[value] = self.clean(value)
+        return cleaned
+
+
+default_sanitizer = ResponseSanitizer()
+
+
+def get_sanitizer(safe_fields: Optional[Iterable[str]] = None, schema=None) -> ResponseSanitizer:
+    """
+    Build a sanitizer for explicit safe fields and/or a schema's safe fields.
+    ``safe_fields`` may be a SafeFields to cover records under an envelope key.
+    """
+    names, nested = set(safe_fields or ()), dict(getattr(safe_fields, 'nested', {}))
+    if schema is not None:
+        schema_fields = safe_fields_from_schema(schema)
+        names |= schema_fields
+        nested.update(schema_fields.nested)
+    return ResponseSanitizer(SafeFields(names, nested)) if names or nested else default_sanitizer
@@ -0,0 +1,296 @@
+"""
+Incremental unusual-usage detection for interval readings and bills.
+
+Each meter keeps a seasonal profile: an exponentially weighted mean and
+variance of hourly usage for each of the 168 hours of the week. Each
+linked account meter keeps the same statistics for bill amounts and
+usage. The state is a small float64 array stored as raw bytes in Redis,
+so an update costs one read and one write per meter per batch,
+whatever the meter's history. The write waits for the database commit
+that stores the batch and its alerts, and readings or bills already
+folded in are skipped, so retried or re-ingested batches do not count
+twice.
+
+A value further than ANOMALY_Z_THRESHOLD standard deviations from its
+slot's mean, once the slot has ANOMALY_WARMUP observations, is recorded
+as a UsageAlert.
+"""
+from datetime import datetime, timezone
+from typing import Callable, List, NamedTuple, Optional
+import numpy as np
+import redis
+from flask import current_app, has_app_context
+from sqlalchemy import event, func
+from sqlalchemy.orm import Session
+from .. import db
+from ..models import Bill, UsageAlert
+from .interval_series import bucket
+
+METER_STATE_KEY = 'anomaly:meter:{}'
+BILL_STATE_KEY = 'anomaly:link:{}'
+# Bill state: [mean, variance, count] for amount, then for usage, then the
+# id of the last bill folded in
+BILL_FOLDED_THROUGH = 6
+_STAGED = 'anomaly_state_staged'
+
+# Write a state only if nobody else has since the value it was computed from
+# (ARGV[1], empty if the key did not exist)
+COMPARE_AND_SET_SCRIPT = """
+local current = redis.call('GET', KEYS[1])
+if (current or '') ~= ARGV[1] then
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[2])
+return 1
+"""
+
+HOUR = 3600
+SLOTS = 168
+# 1970-01-01 was a Thursday; shift so slot 0 is Monday 00:00 UTC
+_WEEK_OFFSET = 72
+
+
+class Anomaly(NamedTuple):
+    observed_at: int  # epoch seconds
+    value: float
+    expected: float
+    zscore: float
+
+
+class SeasonalState:
+    """
+    View over a per-meter state array: mean, variance and count per
+    hour-of-week slot, then the hour being accumulated across batches, its
+    partial total, and the timestamp of the last reading folded in.
+    """
+    SIZE = 3 * SLOTS + 3
+
+    def __init__(self, data: np.ndarray):
+        self.data = data
+        self.mean = data[:SLOTS]
+        self.var = data[SLOTS:2 * SLOTS]
+        self.count = data[2 * SLOTS:3 * SLOTS]
+
+    @classmethod
+    def initial(cls) -> np.ndarray:
+        data = np.zeros(cls.SIZE)
+        data[3 * SLOTS] = -1  # no pending hour
+        data[3 * SLOTS + 2] = -1  # nothing folded in
+        return data
+
+    @property
+    def pending_hour(self) -> int:
+        return int(self.data[3 * SLOTS])
+
+    @property
+    def pending_total(self) -> float:
+        return float(self.data[3 * SLOTS + 1])
+
+    @property
+    def folded_through(self) -> int:
+        return int(self.data[3 * SLOTS + 2])
+
+    def set_pending(self, hour: int, total: float) -> None:
+        self.data[3 * SLOTS] = hour
+        self.data[3 * SLOTS + 1] = total
+
+
+def _scale(mean: np.ndarray, var: np.ndarray) -> np.ndarray:
+    # A floor keeps near-constant series from alerting on tiny changes
+    return np.maximum(np.sqrt(var), np.maximum(np.abs(mean) * 0.05, 1e-9))
+
+
+def _score_and_update(mean, var, count, slots, values, alpha, threshold, warmup):
+    """Score values against their slots, then fold them in. Slots must be unique."""
+    m, v, n = mean[slots], var[slots], count[slots]
+    z = (values - m) / _scale(m, v)
+    flagged = (n >= warmup) & (np.abs(z) > threshold)
+    diff = values - m
+    # Until a slot has 1/alpha observations this is the plain running mean
+    # and variance; a fixed alpha would underestimate the early variance
+    weight = np.maximum(alpha, 1.0 / (n + 1))
+    mean[slots] = m + weight * diff
+    var[slots] = (1 - weight) * (v + weight * diff ** 2)
+    count[slots] = n + 1
+    return flagged, z, m
+
+
+def update_seasonal(state: SeasonalState, timestamps: np.ndarray, values: np.ndarray,
+                    alpha: float = 0.1, threshold: float = 5.0, warmup: int = 8) -> List[Anomaly]:
+    """
+    Fold a batch of readings into the state and return the anomalous hours.
+
+    Readings are summed per hour. The batch's last hour may be incomplete,
+    so it is held in the state and completed by the next batch. Readings at
+    or before the last one already folded in are ignored, so folding the
+    same or an older batch again changes nothing.
+    """
+    # Hours before the pending one were folded in too, also in states saved
+    # before folded_through was kept
+    newer = (timestamps > state.folded_through) & (timestamps // HOUR >= state.pending_hour)
+    if not newer.all():
+        timestamps, values = timestamps[newer], values[newer]
+    if timestamps.size == 0:
+        return []
+    hours, totals = bucket(timestamps, values, HOUR, 'sum')
+    hours = hours // HOUR
+    if hours[0] == state.pending_hour:
+        totals[0] += state.pending_total
+    elif state.pending_hour >= 0:
+        hours, totals = np.r_[state.pending_hour, hours], np.r_[state.pending_total, totals]
+    state.set_pending(int(hours[-1]), float(totals[-1]))
+    state.data[3 * SLOTS + 2] = timestamps[-1]
+    hours, totals = hours[:-1], totals[:-1]
+    if hours.size == 0:
+        return []
+
+    anomalies = []
+    # Within one calendar week every hour maps to a distinct slot, so each
+    # week is scored and folded in as a single vector update
+    weeks = (hours + _WEEK_OFFSET) // SLOTS
+    bounds = np.flatnonzero(np.r_[True, weeks[1:] != weeks[:-1], True])
+    for lo, hi in zip(bounds[:-1], bounds[1:]):
+        slots = (hours[lo:hi] + _WEEK_OFFSET) % SLOTS
+        flagged, z, expected = _score_and_update(
+            state.mean, state.var, state.count, slots, totals[lo:hi], alpha, threshold, warmup)
+        for i in np.flatnonzero(flagged):
+            anomalies.append(Anomaly(int(hours[lo + i]) * HOUR, float(totals[lo + i]),
+                                     float(expected[i]), float(z[i])))
+    return anomalies
+
+
+def update_scalar(state: np.ndarray, value: float, alpha: float = 0.3, threshold: float = 3.0,
+                  warmup: int = 3) -> Optional[Anomaly]:
+    """Fold one value into a [mean, variance, count] state; return it if anomalous."""
+    mean, var, count = state[0:1], state[1:2], state[2:3]
+    flagged, z, expected = _score_and_update(mean, var, count, np.array([0]), np.array([value]),
+                                             alpha, threshold, warmup)
+    if flagged[0]:
+        return Anomaly(0, value, float(expected[0]), float(z[0]))
+    return None
+
+
+def _with_state(key: str, initial: np.ndarray, update: Callable[[np.ndarray], list]) -> list:
+    """
+    Run ``update`` on a copy of a state array and stage the result, to be
+    written when the session commits. Several updates of one key in a
+    transaction build on each other.
+    """
+    staged = db.session.info.setdefault(_STAGED, {})
+    if key in staged:
+        original, raw = staged[key]
+    else:
+        original = raw = current_app.redis.get(key)
+    data = initial.copy()
+    if raw:
+        stored = np.frombuffer(raw, dtype=np.float64)
+        if stored.size <= initial.size:
+            # States saved before fields were appended keep their leading part
+            data[:stored.size] = stored
+    result = update(data)
+    staged[key] = (original, data.tobytes())
+    return result
+
+
+@event.listens_for(Session, 'after_commit')
+def _write_states(session) -> None:
+    staged = session.info.pop(_STAGED, None)
+    if not staged or not has_app_context():
+        return
+    try:
+        compare_and_set = current_app.redis.register_script(COMPARE_AND_SET_SCRIPT)
+        for key, (original, data) in staged.items():
+            if not compare_and_set(keys=[key], args=[original or b'', data]):
+                current_app.logger.warning(f"Anomaly state {key} changed concurrently; update skipped")
+    except redis.RedisError as e:
+        current_app.logger.error(f"Error writing anomaly state: {str(e)}")
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_states(session) -> None:
+    session.info.pop(_STAGED, None)
+
+
+def detect_interval_anomalies(meter_id: int, timestamps: np.ndarray, values: np.ndarray) -> List[UsageAlert]:
+    """
+    Update the meter's profile with a batch of actual readings and add an
+    alert per anomalous hour to the session. The caller commits; the
+    profile is saved only then.
+    """
+    config = current_app.config
+
+    def update(data):
+        return update_seasonal(SeasonalState(data), timestamps, values, config.get('ANOMALY_ALPHA', 0.1),
+                               config.get('ANOMALY_Z_THRESHOLD', 5.0), config.get('ANOMALY_WARMUP', 8))
+
+    try:
+        anomalies = _with_state(METER_STATE_KEY.format(meter_id), SeasonalState.initial(), update)
+    except redis.RedisError as e:
+        current_app.logger.error(f"Error updating anomaly state: {str(e)}")
+        return []
+    alerts = [
+        UsageAlert(meter_id=meter_id, kind='interval_usage',
+                   observed_at=datetime.fromtimestamp(a.observed_at, timezone.utc).replace(tzinfo=None),
+                   value=a.value, expected=a.expected, zscore=a.zscore)
+        for a in anomalies
+    ]
+    db.session.add_all(alerts)
+    return alerts
+
+
+def _initial_bill_state() -> np.ndarray:
+    data = np.zeros(7)
+    data[BILL_FOLDED_THROUGH] = -1  # no bill folded in
+    return data
+
+
+def detect_bill_anomalies(bill) -> List[UsageAlert]:
+    """
+    Compare a new bill's amount and usage with its account meter's
+    history and add alerts to the session. The caller commits; the
+    history is saved only then.
+
+    The history records the last bill folded in. A bill is identified by
+    the first bill stored from its file, so a redelivered parse of the
+    same file is not counted twice.
+    """
+    config = current_app.config
+    observations = [('bill_amount', bill.amount)]
+    if bill.usage_amount is not None:
+        observations.append(('bill_usage', bill.usage_amount))
+    bill_id = bill.id
+    if bill.file_path:
+        bill_id = db.session.query(func.min(Bill.id)).filter(
+            Bill.linked_account_meter_id == bill.linked_account_meter_id,
+            Bill.file_path == bill.file_path
+        ).scalar() or bill.id
+
+    def update(data):
+        if bill_id <= data[BILL_FOLDED_THROUGH]:
+            return []
+        data[BILL_FOLDED_THROUGH] = bill_id
+        found = []
+        for i, (kind, value) in enumerate(observations):
+            anomaly = update_scalar(data[3 * i:3 * i + 3], float(value),
+                                    config.get('ANOMALY_BILL_ALPHA', 0.3),
+                                    config.get('ANOMALY_BILL_Z_THRESHOLD', 3.0),
+                                    config.get('ANOMALY_BILL_WARMUP', 3))
+            if anomaly is not None:
+                found.append((kind, anomaly))
+        return found
+
+    try:
+        anomalies = _with_state(BILL_STATE_KEY.format(bill.linked_account_meter_id), _initial_bill_state(), update)
+    except redis.RedisError as e:
+        current_app.logger.error(f"Error updating anomaly state: {str(e)}")
+        return []
+    observed_at = bill.bill_date
+    if not isinstance(observed_at, datetime):
+        observed_at = datetime.combine(observed_at, datetime.min.time())
+    alerts = [
+        UsageAlert(linked_account_meter_id=bill.linked_account_meter_id, bill_id=bill.id, kind=kind,
+                   observed_at=observed_at, value=a.value, expected=a.expected, zscore=a.zscore)
+        for kind, a in anomalies
+    ]
+    db.session.add_all(alerts)
+    return alerts
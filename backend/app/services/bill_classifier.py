@@ -0,0 +1,259 @@
+"""
+Identify the vendor and account of an incoming bill from its first page.
+
+An in-memory index is built from Vendor, Account and LinkedAccountMeter rows.
+It maps normalized account numbers to accounts, per organization, and vendor
+name tokens and template anchors to vendors. Classifying a page is then a few
+dictionary lookups over its tokens, with no database access. A bill is only
+matched against the accounts of the uploader's organization, so it can never
+be linked to, or offer as a candidate, another organization's meter.
+"""
+import re
+import threading
+import time
+from datetime import date
+from typing import BinaryIO, Dict, List, NamedTuple, Optional, Set, Tuple
+from flask import current_app
+from sqlalchemy import event, or_
+from sqlalchemy.orm import Session, object_session
+from .. import db
+from ..models import Account, LinkedAccountMeter, Meter, RateSchedule, Site, Vendor
+from .vendor_templates import get_template_registry
+
+_WORD = re.compile(r'[a-z0-9]+')
+# Account numbers as printed: digits and letters, optionally split by - . / or spaces
+_ACCOUNT_TOKEN = re.compile(r'[A-Za-z0-9][A-Za-z0-9\-./]*')
+_NON_ALNUM = re.compile(r'[^A-Z0-9]')
+_DROP_SEPARATORS = str.maketrans('', '', '-./')
+_STOPWORDS = {'the', 'and', 'inc', 'llc', 'ltd', 'co', 'corp', 'company', 'of', 'services'}
+
+FIRST_PAGE_BYTES = 64 * 1024
+
+
+def normalize_account_number(number: str) -> str:
+    return _NON_ALNUM.sub('', number.upper())
+
+
+class Classification(NamedTuple):
+    confidence: float
+    vendor_id: Optional[int] = None
+    vendor_code: Optional[str] = None
+    account_id: Optional[int] = None
+    linked_account_meter_id: Optional[int] = None
+    # Candidate linked account meter ids when the match is ambiguous
+    candidates: Tuple[int, ...] = ()
+
+
+class ClassifierIndex:
+    """Precomputed lookup tables; immutable once built."""
+
+    def __init__(self):
+        # organization id -> normalized number -> (account id, [(linked account meter id, vendor id)])
+        self.accounts: Dict[int, Dict[str, Tuple[int, List[Tuple[int, Optional[int]]]]]] = {}
+        self.vendor_tokens: Dict[str, Set[int]] = {}
+        self.vendor_token_counts: Dict[int, int] = {}
+        # first word of a phrase -> [(phrase, vendor id)]
+        self.vendor_phrases: Dict[str, List[Tuple[str, int]]] = {}
+        self.vendor_codes: Dict[int, Optional[str]] = {}
+        self.min_number_length = 5
+        self.built_at = time.monotonic()
+
+    @classmethod
+    def build(cls, template_dir: Optional[str] = None) -> 'ClassifierIndex':
+        index = cls()
+        templates = get_template_registry(template_dir) if template_dir else None
+        for vendor_id, code, name in db.session.query(Vendor.id, Vendor.code, Vendor.name).filter(
+                Vendor.is_active.is_(True)):
+            index.vendor_codes[vendor_id] = code
+            tokens = {t for t in _WORD.findall(name.lower()) if len(t) > 2 and t not in _STOPWORDS}
+            if code:
+                tokens.add(code.lower())
+            for token in tokens:
+                index.vendor_tokens.setdefault(token, set()).add(vendor_id)
+            # Template anchors are layout text that only this vendor prints
+            template = templates.get(code) if templates else None
+            phrases = {spec.anchor.lower() for spec in template.fields if spec.anchor} if template else set()
+            for phrase in phrases:
+                first_word = _WORD.search(phrase)
+                if first_word:
+                    index.vendor_phrases.setdefault(first_word.group(), []).append((phrase, vendor_id))
+            index.vendor_token_counts[vendor_id] = len(tokens) + len(phrases)
+
+        # Accounts belong to an organization through their meters' sites;
+        # one without a current link has no meter to offer and is left out
+        today = date.today()
+        rows = db.session.query(
+            Site.organization_id, Account.id, Account.number, LinkedAccountMeter.id, RateSchedule.vendor_id
+        ).join(
+            LinkedAccountMeter, (LinkedAccountMeter.account_id == Account.id) & or_(
+                LinkedAccountMeter.end_date.is_(None), LinkedAccountMeter.end_date >= today)
+        ).join(
+            Meter, Meter.id == LinkedAccountMeter.meter_id
+        ).join(
+            Site, Site.id == Meter.site_id
+        ).outerjoin(
+            RateSchedule, RateSchedule.id == LinkedAccountMeter.rate_schedule_id
+        ).filter(Account.is_active.is_(True))
+        for organization_id, account_id, number, lam_id, vendor_id in rows:
+            accounts = index.accounts.setdefault(organization_id, {})
+            accounts.setdefault(normalize_account_number(number), (account_id, []))[1].append((lam_id, vendor_id))
+        numbers = [key for accounts in index.accounts.values() for key in accounts]
+        if numbers:
+            # Very short numbers would match dates and amounts on every page
+            index.min_number_length = max(4, min(len(k) for k in numbers))
+        return index
+
+    def _account_matches(self, text: str, accounts: Dict[str, tuple]) -> Set[str]:
+        tokens = [t.translate(_DROP_SEPARATORS) for t in _ACCOUNT_TOKEN.findall(text.upper())]
+        matches = set()
+        # Try each token and runs of up to four adjacent tokens, which covers
+        # numbers printed in space-separated groups
+        for i, token in enumerate(tokens):
+            if token.isalpha():
+                continue
+            candidate = ''
+            for part in tokens[i:i + 4]:
+                candidate += part
+                if len(candidate) >= self.min_number_length and candidate in accounts:
+                    matches.add(candidate)
+        return matches
+
+    def _vendor_scores(self, text: str) -> Dict[int, float]:
+        lowered = text.lower()
+        hits: Dict[int, int] = {}
+        for word in set(_WORD.findall(lowered)):
+            for vendor_id in self.vendor_tokens.get(word, ()):
+                hits[vendor_id] = hits.get(vendor_id, 0) + 1
+            # Only phrases whose first word is on the page are searched for
+            for phrase, vendor_id in self.vendor_phrases.get(word, ()):
+                if phrase in lowered:
+                    hits[vendor_id] = hits.get(vendor_id, 0) + 1
+        return {v: n / self.vendor_token_counts[v] for v, n in hits.items() if self.vendor_token_counts[v]}
+
+    def classify(self, text: str, organization_id: Optional[int]) -> Classification:
+        """Classify a page against the vendors and ``organization_id``'s accounts."""
+        scores = self._vendor_scores(text)
+        best_vendor = max(scores, key=scores.get) if scores else None
+        best_score = scores.get(best_vendor, 0.0)
+
+        organization_accounts = self.accounts.get(organization_id, {})
+        accounts = self._account_matches(text, organization_accounts)
+        if len(accounts) != 1:
+            # No account, or several: the vendor alone cannot pick a meter
+            return Classification(
+                confidence=min(best_score, 0.5), vendor_id=best_vendor,
+                vendor_code=self.vendor_codes.get(best_vendor)
+            )
+
+        account_id, lams = organization_accounts[accounts.pop()]
+        if best_vendor is not None:
+            agreeing = [(lam, v) for lam, v in lams if v == best_vendor]
+            lams = agreeing or lams
+        if len(lams) != 1:
+            return Classification(
+                confidence=0.5, vendor_id=best_vendor, vendor_code=self.vendor_codes.get(best_vendor),
+                account_id=account_id, candidates=tuple(lam for lam, _ in lams)
+            )
+
+        lam_id, vendor_id = lams[0]
+        if vendor_id is not None and best_vendor is not None and vendor_id != best_vendor:
+            # The page looks like another vendor's bill
+            confidence = 0.5
+        elif vendor_id is not None and vendor_id == best_vendor:
+            confidence = 0.9 + 0.1 * best_score
+        else:
+            confidence = 0.85
+        vendor_id = vendor_id if vendor_id is not None else best_vendor
+        return Classification(
+            confidence=confidence, vendor_id=vendor_id, vendor_code=self.vendor_codes.get(vendor_id),
+            account_id=account_id, linked_account_meter_id=lam_id
+        )
+
+
+_index: Optional[ClassifierIndex] = None
+_index_lock = threading.Lock()
+# Bumped by every invalidation, so a build that overlapped one is not kept
+_generation = 0
+_CHANGED = 'classifier_index_changed'
+
+
+def get_classifier_index() -> ClassifierIndex:
+    """Return this process's index, rebuilding it when stale or invalidated."""
+    global _index
+    index = _index
+    ttl = current_app.config.get('CLASSIFIER_INDEX_TTL', 300)
+    if index is None or time.monotonic() - index.built_at > ttl:
+        with _index_lock:
+            index = _index
+            if index is None or time.monotonic() - index.built_at > ttl:
+                generation = _generation
+                index = ClassifierIndex.build(current_app.config.get('VENDOR_TEMPLATE_DIR'))
+                if generation == _generation:
+                    _index = index
+    return index
+
+
+def invalidate_classifier_index() -> None:
+    global _index, _generation
+    _generation += 1
+    _index = None
+
+
+def first_pages_text(file: BinaryIO, mime_type: str, pages: int = 1) -> str:
+    """Return the text of the first page(s) and rewind ``file``."""
+    try:
+        if mime_type == 'application/pdf':
+            import pdfplumber
+            with pdfplumber.open(file) as pdf:
+                return '\n'.join(page.extract_text() or '' for page in pdf.pages[:pages])
+        if mime_type in ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+                         'application/vnd.ms-excel'):
+            import pandas as pd
+            return pd.read_excel(file, nrows=50, header=None).to_string()
+        return file.read(FIRST_PAGE_BYTES).decode('utf-8', errors='ignore')
+    finally:
+        file.seek(0)
+
+
+def classify_bill(file: BinaryIO, mime_type: str, organization_id: Optional[int]) -> Classification:
+    """
+    Classify a bill uploaded by a member of ``organization_id``; callers
+    compare ``confidence`` to CLASSIFIER_MIN_CONFIDENCE.
+    """
+    text = first_pages_text(file, mime_type, current_app.config.get('CLASSIFIER_PAGES', 1))
+    return get_classifier_index().classify(text, organization_id)
+
+
+@event.listens_for(Vendor, 'after_insert')
+@event.listens_for(Vendor, 'after_update')
+@event.listens_for(Vendor, 'after_delete')
+@event.listens_for(Account, 'after_insert')
+@event.listens_for(Account, 'after_update')
+@event.listens_for(Account, 'after_delete')
+@event.listens_for(LinkedAccountMeter, 'after_insert')
+@event.listens_for(LinkedAccountMeter, 'after_update')
+@event.listens_for(LinkedAccountMeter, 'after_delete')
+@event.listens_for(RateSchedule, 'after_insert')
+@event.listens_for(RateSchedule, 'after_update')
+@event.listens_for(RateSchedule, 'after_delete')
+# Moving a meter or site can move an account to another organization
+@event.listens_for(Meter, 'after_update')
+@event.listens_for(Site, 'after_update')
+def _mark_changed(mapper, connection, target) -> None:
+    session = object_session(target)
+    if session is not None:
+        session.info[_CHANGED] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_committed(session) -> None:
+    # Dropping the index during the flush would let a concurrent rebuild
+    # read the pre-commit rows and keep them for the whole TTL. Other
+    # processes pick the change up within CLASSIFIER_INDEX_TTL.
+    if session.info.pop(_CHANGED, False):
+        invalidate_classifier_index()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_changed(session) -> None:
+    session.info.pop(_CHANGED, None)
@@ -1,12 +1,16 @@
 import os
-import magic
-import pandas as pd
-import pdfplumber
-import xmltodict
-from typing import Dict, Any, List, Tuple
+from typing import Dict, Any, List, Tuple, Callable, Optional
 from datetime import datetime
+from flask import current_app
 from werkzeug.datastructures import FileStorage
-from ..models import Bill, BillAudit, LinkedAccountMeter
+from .. import db
+from ..models import Bill, BillAudit, LinkedAccountMeter, RateSchedule, Vendor
+from .file_inspection import SNIFF_BYTES, sniff_mime
+from .vendor_templates import VendorTemplate, get_template_registry
+
+# Parsing libraries (magic, pdfplumber, pandas, xmltodict) are imported
+# inside the methods that use them so that web processes, which only
+# enqueue work, never load them.
 
 class BillProcessor:
     ALLOWED_EXTENSIONS = {
@@ -17,20 +21,32 @@ class BillProcessor:
         'application/xml': '.xml',
         'text/plain': '.txt'
     }
+    REQUIRED_FIELDS = ('bill_date', 'due_date', 'amount')
 
-    def __init__(self, file: FileStorage, linked_account_meter_id: int):
+    def __init__(self, file: FileStorage, linked_account_meter_id: int,
+                 on_stage: Optional[Callable[..., None]] = None,
+                 storage_key: Optional[str] = None, mime_type: Optional[str] = None,
+                 vendor_code: Optional[str] = None):
         self.file = file
         self.linked_account_meter_id = linked_account_meter_id
-        self.mime_type = magic.from_buffer(file.read(2048), mime=True)
-        file.seek(0)  # Reset file pointer after reading
+        self.storage_key = storage_key
+        self.vendor_code = vendor_code
+        self.on_stage = on_stage or (lambda stage, **data: None)
+        # The upload path already inspected the file; only sniff when it didn't
+        if mime_type is None:
+            mime_type = sniff_mime(file.read(SNIFF_BYTES))
+            file.seek(0)  # Reset file pointer after reading
+        self.mime_type = mime_type
 
     def process(self) -> Tuple[Bill, List[BillAudit]]:
         """Process the bill file and return the created bill and its audits"""
         if self.mime_type not in self.ALLOWED_EXTENSIONS:
             raise ValueError(f"Unsupported file type: {self.mime_type}")
+        self.on_stage('sniffed', mime_type=self.mime_type)
 
         # Extract bill data based on file type
         bill_data = self._extract_bill_data()
+        self.on_stage('extracted')
         
         # Create bill record
         bill = Bill(
@@ -45,6 +61,7 @@ class BillProcessor:
 
         # Perform audits
         audits = self._perform_audits(bill_data)
+        self.on_stage('audited', audit_count=len(audits))
 
         return bill, audits
 
@@ -61,7 +78,18 @@ class BillProcessor:
 
     def _extract_from_pdf(self) -> Dict[str, Any]:
         """Extract bill data from PDF using pdfplumber"""
+        import pdfplumber
+
         with pdfplumber.open(self.file) as pdf:
+            # Vendors with a template: read only the regions it declares
+            template = self._vendor_template()
+            if template is not None:
+                bill_data = template.extract(pdf)
+                missing = [f for f in self.REQUIRED_FIELDS if f not in bill_data]
+                if missing:
+                    raise ValueError(f"Template {template.vendor_code} does not define {', '.join(missing)}")
+                return bill_data
+
             # Implementation would depend on specific PDF layout
             # This is a simplified example
             text = ""
@@ -77,8 +105,22 @@ class BillProcessor:
                 'usage_amount': 0.0           # Placeholder
             }
 
+    def _vendor_template(self) -> Optional[VendorTemplate]:
+        """Return the compiled template for the bill's vendor, if there is one"""
+        if self.vendor_code is None:
+            # Linked account meter -> rate schedule -> vendor
+            self.vendor_code = db.session.query(Vendor.code).join(
+                RateSchedule, RateSchedule.vendor_id == Vendor.id
+            ).join(
+                LinkedAccountMeter, LinkedAccountMeter.rate_schedule_id == RateSchedule.id
+            ).filter(LinkedAccountMeter.id == self.linked_account_meter_id).scalar()
+        registry = get_template_registry(current_app.config['VENDOR_TEMPLATE_DIR'])
+        return registry.get(self.vendor_code)
+
     def _extract_from_excel(self) -> Dict[str, Any]:
         """Extract bill data from Excel file"""
+        import pandas as pd
+
         df = pd.read_excel(self.file)
         # Implementation would depend on specific Excel layout
         return {
@@ -90,6 +132,8 @@ class BillProcessor:
 
     def _extract_from_xml(self) -> Dict[str, Any]:
         """Extract bill data from XML file"""
+        import xmltodict
+
         xml_dict = xmltodict.parse(self.file.read())
         # Implementation would depend on specific XML schema
         return {
@@ -146,7 +190,9 @@ class BillProcessor:
             return 'Text'
 
     def _save_file(self) -> str:
-        """Save the file and return the file path"""
+        """Return the storage key of the processed file"""
+        if self.storage_key:
+            return self.storage_key
         # Implementation would depend on your file storage strategy
         # This is a placeholder
         return f"bills/{self.file.filename}"
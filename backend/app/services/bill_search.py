@@ -0,0 +1,210 @@
+"""
+Maintain the denormalized bill search documents.
+
+Each bill has one BillSearchDocument holding the account number, meter
+number, site and vendor names it can be found by. The document is written
+in the same flush as the bill, and renames of an account, meter, site or
+vendor are pushed to every affected document with a single UPDATE, so
+searches read one narrow table through its trigram indexes.
+"""
+from typing import Optional
+from sqlalchemy import delete, event, func, inspect, or_, select, tuple_, update
+from .. import db
+from ..models import (Account, Bill, BillSearchDocument, LinkedAccountMeter, Meter,
+                      RateSchedule, Site, Vendor)
+
+SEARCH_COLUMNS = ('account_number', 'meter_number', 'site_name', 'site_address', 'vendor_name')
+MIN_QUERY_LENGTH = 3
+
+_documents = BillSearchDocument.__table__
+_DOCUMENT_COLUMNS = [c.name for c in _documents.columns]
+# Bill attributes copied into or used to derive the document
+_BILL_FIELDS = ('linked_account_meter_id', 'bill_date', 'amount', 'status')
+
+
+def _document_select():
+    """Select the document columns for bills, in _DOCUMENT_COLUMNS order."""
+    return select(
+        Bill.id, Site.organization_id, Site.id, Meter.id, Account.id, Vendor.id,
+        Account.number, Meter.number, Site.name, Site.address, Vendor.name,
+        Bill.bill_date, Bill.amount, Bill.status
+    ).select_from(Bill).join(
+        LinkedAccountMeter, LinkedAccountMeter.id == Bill.linked_account_meter_id
+    ).join(
+        Account, Account.id == LinkedAccountMeter.account_id
+    ).join(
+        Meter, Meter.id == LinkedAccountMeter.meter_id
+    ).join(
+        Site, Site.id == Meter.site_id
+    ).outerjoin(
+        RateSchedule, RateSchedule.id == LinkedAccountMeter.rate_schedule_id
+    ).outerjoin(
+        Vendor, Vendor.id == RateSchedule.vendor_id
+    )
+
+
+def _refresh(connection, condition) -> None:
+    """Rewrite the documents of the bills matching ``condition``."""
+    bill_ids = select(Bill.id).where(condition)
+    connection.execute(delete(_documents).where(_documents.c.bill_id.in_(bill_ids)))
+    connection.execute(_documents.insert().from_select(
+        _DOCUMENT_COLUMNS, _document_select().where(condition)
+    ))
+
+
+def _changed(target, *fields) -> bool:
+    state = inspect(target)
+    return any(state.attrs[field].history.has_changes() for field in fields)
+
+
+@event.listens_for(Bill, 'after_insert')
+def _index_bill(mapper, connection, target) -> None:
+    connection.execute(_documents.insert().from_select(
+        _DOCUMENT_COLUMNS, _document_select().where(Bill.id == target.id)
+    ))
+
+
+@event.listens_for(Bill, 'after_update')
+def _reindex_bill(mapper, connection, target) -> None:
+    if _changed(target, *_BILL_FIELDS):
+        _refresh(connection, Bill.id == target.id)
+
+
+@event.listens_for(Bill, 'before_delete')
+def _unindex_bill(mapper, connection, target) -> None:
+    connection.execute(delete(_documents).where(_documents.c.bill_id == target.id))
+
+
+def _propagate(model, key_column, **fields):
+    """Copy renamed ``model`` attributes into the documents that name it."""
+    def listener(mapper, connection, target):
+        values = {column: getattr(target, attr) for column, attr in fields.items()
+                  if _changed(target, attr)}
+        if values:
+            connection.execute(
+                update(_documents).where(key_column == target.id).values(**values)
+            )
+    event.listen(model, 'after_update', listener)
+
+
+_propagate(Account, _documents.c.account_id, account_number='number')
+_propagate(Meter, _documents.c.meter_id, meter_number='number')
+_propagate(Site, _documents.c.site_id, site_name='name', site_address='address')
+_propagate(Vendor, _documents.c.vendor_id, vendor_name='name')
+
+
+@event.listens_for(LinkedAccountMeter, 'after_update')
+def _relink(mapper, connection, target) -> None:
+    # Rare: a link pointing at another account, meter or rate schedule
+    if _changed(target, 'account_id', 'meter_id', 'rate_schedule_id'):
+        _refresh(connection, Bill.linked_account_meter_id == target.id)
+
+
+@event.listens_for(Meter, 'after_update')
+def _move_meter(mapper, connection, target) -> None:
+    if _changed(target, 'site_id'):
+        lam_ids = select(LinkedAccountMeter.id).where(LinkedAccountMeter.meter_id == target.id)
+        _refresh(connection, Bill.linked_account_meter_id.in_(lam_ids))
+
+
+@event.listens_for(Site, 'after_update')
+def _move_site(mapper, connection, target) -> None:
+    if _changed(target, 'organization_id'):
+        connection.execute(update(_documents).where(
+            _documents.c.site_id == target.id
+        ).values(organization_id=target.organization_id))
+
+
+@event.listens_for(RateSchedule, 'after_update')
+def _change_schedule_vendor(mapper, connection, target) -> None:
+    if _changed(target, 'vendor_id'):
+        lam_ids = select(LinkedAccountMeter.id).where(LinkedAccountMeter.rate_schedule_id == target.id)
+        _refresh(connection, Bill.linked_account_meter_id.in_(lam_ids))
+
+
+def search_bills(q: Optional[str] = None, organization_id: Optional[int] = None,
+                 account: Optional[str] = None, meter: Optional[str] = None,
+                 site: Optional[str] = None, vendor: Optional[str] = None,
+                 status: Optional[str] = None, before: Optional[tuple] = None,
+                 limit: int = 50):
+    """
+    Find search documents, newest bill first.
+
+    Args:
+        q: Substring matched against every search column
+        organization_id: Restrict to one organization (None for all)
+        account, meter, site, vendor: Substrings matched against one column
+            each; ``site`` covers both the name and the address
+        status: Exact bill status
+        before: ``(bill_date, bill_id)`` of the last row of the previous page
+        limit: Maximum number of documents to return
+
+    Returns:
+        List of BillSearchDocument
+    """
+    query = BillSearchDocument.query
+    if organization_id is not None:
+        query = query.filter(BillSearchDocument.organization_id == organization_id)
+    if q:
+        pattern = f'%{_escape_like(q)}%'
+        query = query.filter(or_(*(
+            getattr(BillSearchDocument, column).ilike(pattern, escape='\\')
+            for column in SEARCH_COLUMNS
+        )))
+    for value, columns in ((account, ('account_number',)), (meter, ('meter_number',)),
+                           (site, ('site_name', 'site_address')), (vendor, ('vendor_name',))):
+        if value:
+            pattern = f'%{_escape_like(value)}%'
+            query = query.filter(or_(*(
+                getattr(BillSearchDocument, column).ilike(pattern, escape='\\')
+                for column in columns
+            )))
+    if status:
+        query = query.filter(BillSearchDocument.status == status)
+    if before:
+        # Row comparison matches the (organization_id, bill_date, bill_id) index
+        query = query.filter(
+            tuple_(BillSearchDocument.bill_date, BillSearchDocument.bill_id) < tuple_(*before)
+        )
+    return query.order_by(
+        BillSearchDocument.bill_date.desc(), BillSearchDocument.bill_id.desc()
+    ).limit(limit).all()
+
+
+def _escape_like(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def rebuild_search_documents(batch_size: int = 10000) -> int:
+    """
+    Regenerate every search document, e.g. after a bulk import that bypassed
+    the ORM. Each id-range batch deletes and rewrites its documents in one
+    transaction, so search never sees the range empty and documents written
+    meanwhile by the mapper events are replaced rather than duplicated.
+
+    Returns:
+        Number of documents written
+    """
+    written = 0
+    last_id = 0
+    while True:
+        upper = db.session.execute(
+            select(func.max(Bill.id)).where(
+                Bill.id.in_(select(Bill.id).where(Bill.id > last_id).order_by(Bill.id).limit(batch_size))
+            )
+        ).scalar()
+        if upper is None:
+            break
+        db.session.execute(delete(_documents).where(
+            _documents.c.bill_id > last_id, _documents.c.bill_id <= upper
+        ))
+        result = db.session.execute(_documents.insert().from_select(
+            _DOCUMENT_COLUMNS, _document_select().where(Bill.id > last_id, Bill.id <= upper)
+        ))
+        written += result.rowcount
+        db.session.commit()
+        last_id = upper
+    # Documents past the last bill belong to bills deleted outside the ORM
+    db.session.execute(delete(_documents).where(_documents.c.bill_id > last_id))
+    db.session.commit()
+    return written
@@ -0,0 +1,168 @@
+"""Resumable chunked uploads: session state in Redis, parts in object storage."""
+import hashlib
+import json
+import math
+import tempfile
+import uuid
+from typing import BinaryIO, Dict, List, Optional
+from flask import current_app
+from app.services.storage import CHUNK_SIZE, make_upload_key
+
+SESSION_KEY = 'upload:{}'
+PARTS_KEY = 'upload:{}:parts'
+COMPLETING_KEY = 'upload:{}:completing'
+
+# S3 rejects multipart parts (other than the last) below 5 MiB
+MIN_PART_SIZE = 5 * 1024 * 1024
+
+
+def part_size() -> int:
+    return max(current_app.config['UPLOAD_PART_SIZE'], MIN_PART_SIZE)
+
+
+class UploadError(Exception):
+    """Raised when a chunked upload request cannot be honoured."""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def create_session(owner_id: int, filename: str, size: int,
+                   content_type: Optional[str] = None, **metadata) -> dict:
+    """Start a multipart upload and return its session."""
+    max_size = current_app.config['UPLOAD_MAX_SIZE']
+    if size <= 0 or size > max_size:
+        raise UploadError(f'size must be between 1 and {max_size} bytes')
+
+    storage_key = make_upload_key(filename)
+    session = {
+        'upload_id': uuid.uuid4().hex,
+        'owner_id': owner_id,
+        'filename': filename,
+        'content_type': content_type or 'application/octet-stream',
+        'size': size,
+        'part_size': part_size(),
+        'part_count': math.ceil(size / part_size()),
+        'storage_key': storage_key,
+        'storage_upload_id': current_app.storage.create_multipart(storage_key, content_type),
+        'metadata': metadata
+    }
+    current_app.redis.set(SESSION_KEY.format(session['upload_id']), json.dumps(session),
+                          ex=current_app.config['UPLOAD_SESSION_TTL'])
+    return session
+
+
+def get_session(upload_id: str, owner_id: int) -> dict:
+    raw = current_app.redis.get(SESSION_KEY.format(upload_id))
+    if raw is None:
+        raise UploadError('Upload not found or expired', 404)
+    session = json.loads(raw)
+    if session['owner_id'] != owner_id:
+        raise UploadError('Upload not found or expired', 404)
+    return session
+
+
+def get_parts(upload_id: str) -> Dict[int, dict]:
+    """Return acknowledged parts keyed by part number."""
+    raw = current_app.redis.hgetall(PARTS_KEY.format(upload_id))
+    return {int(number): json.loads(part) for number, part in raw.items()}
+
+
+def expected_part_size(session: dict, part_number: int) -> int:
+    if part_number < session['part_count']:
+        return session['part_size']
+    return session['size'] - session['part_size'] * (session['part_count'] - 1)
+
+
+def upload_part(session: dict, part_number: int, stream: BinaryIO,
+                expected_sha256: Optional[str] = None) -> dict:
+    """
+    Spool one part from ``stream``, hashing it as it arrives, then store it.
+
+    Re-sending a part replaces it, so a client resumes by sending every part
+    missing from ``get_parts``.
+    """
+    if not 1 <= part_number <= session['part_count']:
+        raise UploadError(f"part_number must be between 1 and {session['part_count']}")
+    expected_size = expected_part_size(session, part_number)
+
+    digest = hashlib.sha256()
+    size = 0
+    with tempfile.SpooledTemporaryFile(max_size=session['part_size']) as spool:
+        while True:
+            chunk = stream.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > expected_size:
+                raise UploadError(f'Part {part_number} must be {expected_size} bytes', 413)
+            digest.update(chunk)
+            spool.write(chunk)
+        if size != expected_size:
+            raise UploadError(f'Part {part_number} must be {expected_size} bytes')
+        sha256 = digest.hexdigest()
+        if expected_sha256 and expected_sha256.lower() != sha256:
+            raise UploadError(f'Part {part_number} checksum mismatch')
+
+        spool.seek(0)
+        etag = current_app.storage.upload_part(
+            session['storage_key'], session['storage_upload_id'], part_number, spool
+        )
+
+    part = {'part_number': part_number, 'size': size, 'sha256': sha256, 'etag': etag}
+    ttl = current_app.config['UPLOAD_SESSION_TTL']
+    pipe = current_app.redis.pipeline()
+    pipe.hset(PARTS_KEY.format(session['upload_id']), part_number, json.dumps(part))
+    pipe.expire(PARTS_KEY.format(session['upload_id']), ttl)
+    pipe.expire(SESSION_KEY.format(session['upload_id']), ttl)
+    pipe.execute()
+    return part
+
+
+def missing_parts(session: dict, parts: Dict[int, dict]) -> List[int]:
+    return [n for n in range(1, session['part_count'] + 1) if n not in parts]
+
+
+def complete_session(session: dict) -> dict:
+    """
+    Assemble the uploaded parts and close the session.
+
+    The object's SHA-256 is not recomputed; the returned ``sha256`` is the
+    digest of the concatenated part digests, in part order.
+    """
+    upload_id = session['upload_id']
+    if not current_app.redis.set(COMPLETING_KEY.format(upload_id), 1, nx=True, ex=300):
+        raise UploadError('Upload is already being completed', 409)
+    try:
+        parts = get_parts(upload_id)
+        missing = missing_parts(session, parts)
+        if missing:
+            raise UploadError(f'Missing parts: {missing}', 409)
+
+        current_app.storage.complete_multipart(
+            session['storage_key'], session['storage_upload_id'],
+            [(number, part['etag']) for number, part in parts.items()]
+        )
+        composite = hashlib.sha256()
+        for number in sorted(parts):
+            composite.update(bytes.fromhex(parts[number]['sha256']))
+        _delete_session(upload_id)
+        return {
+            'storage_key': session['storage_key'],
+            'size': session['size'],
+            'sha256': f"{composite.hexdigest()}-{session['part_count']}"
+        }
+    except Exception:
+        current_app.redis.delete(COMPLETING_KEY.format(upload_id))
+        raise
+
+
+def abort_session(session: dict) -> None:
+    current_app.storage.abort_multipart(session['storage_key'], session['storage_upload_id'])
+    _delete_session(session['upload_id'])
+
+
+def _delete_session(upload_id: str) -> None:
+    current_app.redis.delete(SESSION_KEY.format(upload_id), PARTS_KEY.format(upload_id),
+                             COMPLETING_KEY.format(upload_id))
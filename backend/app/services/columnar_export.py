@@ -0,0 +1,411 @@
+"""
+Columnar (Parquet or Arrow IPC) export of interval data and bills.
+
+A dataset is read with one ordered query and converted to Arrow a chunk
+at a time. On PostgreSQL (psycopg2) the query is COPYed out as CSV and
+parsed by Arrow, so no Python object is built per row; other databases stream rows
+from a server-side cursor. Rows arrive sorted by meter and time, so each
+meter-month partition is contiguous: it is written to a spooled temporary
+file, one row group at a time, and handed to a bounded pool of uploads as
+soon as the next partition starts. Memory stays at one chunk plus one row
+group plus the files being uploaded, however large the export.
+
+Files use Hive-style paths that pyarrow.dataset, DuckDB and Spark read as
+partitions:
+
+    exports/<export id>/interval_data/meter_id=17/month=2024-03/part-0.parquet
+
+Each dataset also gets a _manifest.json listing its partitions.
+"""
+import json
+import os
+import tempfile
+import threading
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+from datetime import date, datetime
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+import numpy as np
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+from flask import current_app
+from sqlalchemy import BigInteger, cast, func, select
+from .. import db
+from ..db_routing import REPLICA_BIND_KEY
+from ..models import Bill, IntervalData, LinkedAccountMeter, Meter, Site
+
+FORMATS = {'parquet': '.parquet', 'arrow': '.arrow'}
+# Partitions up to this size never touch the disk before upload
+SPOOL_SIZE = 16 * 1024 * 1024
+# CSV bytes parsed per chunk on the COPY path
+COPY_BLOCK_SIZE = 4 * 1024 * 1024
+
+INTERVAL_SCHEMA = pa.schema([
+    ('meter_id', pa.int32()),
+    ('timestamp', pa.timestamp('s', tz='UTC')),
+    ('value', pa.float64()),
+    ('unit', pa.string()),
+    ('quality_flag', pa.string()),
+])
+
+BILL_SCHEMA = pa.schema([
+    ('id', pa.int64()),
+    ('meter_id', pa.int32()),
+    ('linked_account_meter_id', pa.int32()),
+    ('account_id', pa.int32()),
+    ('bill_date', pa.date32()),
+    ('due_date', pa.date32()),
+    ('amount', pa.float64()),
+    ('usage_amount', pa.float64()),
+    ('status', pa.string()),
+    ('source_type', pa.string()),
+    ('created_at', pa.timestamp('us')),
+])
+
+
+class Dataset(NamedTuple):
+    schema: pa.Schema
+    # Column whose month names the partition
+    time_column: str
+    # (organization_id, start, end, meter id range) -> select ordered by meter_id, then time
+    query: Callable
+
+
+def _interval_query(organization_id: Optional[int], start: Optional[date], end: Optional[date],
+                    meters: Optional[Tuple[int, int]] = None):
+    query = select(
+        IntervalData.meter_id,
+        # Epoch seconds are far cheaper for the driver than datetime objects
+        cast(func.extract('epoch', IntervalData.timestamp), BigInteger),
+        IntervalData.value, IntervalData.unit, IntervalData.quality_flag
+    )
+    if organization_id is not None:
+        organization_meters = select(Meter.id).join(Site, Site.id == Meter.site_id).where(
+            Site.organization_id == organization_id)
+        query = query.where(IntervalData.meter_id.in_(organization_meters.scalar_subquery()))
+    if meters:
+        query = query.where(IntervalData.meter_id.between(*meters))
+    if start:
+        query = query.where(IntervalData.timestamp >= start)
+    if end:
+        query = query.where(IntervalData.timestamp < end)
+    # Served by the (meter_id, timestamp) index
+    return query.order_by(IntervalData.meter_id, IntervalData.timestamp)
+
+
+def _bill_query(organization_id: Optional[int], start: Optional[date], end: Optional[date],
+                meters: Optional[Tuple[int, int]] = None):
+    query = select(
+        Bill.id, LinkedAccountMeter.meter_id, Bill.linked_account_meter_id, LinkedAccountMeter.account_id,
+        Bill.bill_date, Bill.due_date, Bill.amount, Bill.usage_amount, Bill.status, Bill.source_type,
+        Bill.created_at
+    ).join(LinkedAccountMeter, LinkedAccountMeter.id == Bill.linked_account_meter_id)
+    if organization_id is not None:
+        query = query.join(Meter, Meter.id == LinkedAccountMeter.meter_id).join(
+            Site, Site.id == Meter.site_id).where(Site.organization_id == organization_id)
+    if meters:
+        query = query.where(LinkedAccountMeter.meter_id.between(*meters))
+    if start:
+        query = query.where(Bill.bill_date >= start)
+    if end:
+        query = query.where(Bill.bill_date < end)
+    return query.order_by(LinkedAccountMeter.meter_id, Bill.bill_date, Bill.id)
+
+
+DATASETS: Dict[str, Dataset] = {
+    'interval_data': Dataset(INTERVAL_SCHEMA, 'timestamp', _interval_query),
+    'bills': Dataset(BILL_SCHEMA, 'bill_date', _bill_query),
+}
+
+
+def rows_to_table(rows: List[tuple], schema: pa.Schema) -> pa.Table:
+    """Build an Arrow table from rows in schema column order."""
+    columns = zip(*rows) if rows else [()] * len(schema)
+    return pa.Table.from_arrays([pa.array(column, type=field.type) for column, field in zip(columns, schema)],
+                                schema=schema)
+
+
+def stream_rows(connection, query, schema: pa.Schema, batch_size: int) -> Iterator[pa.Table]:
+    """Fetch ``batch_size`` rows at a time from a server-side cursor."""
+    result = connection.execution_options(stream_results=True, yield_per=batch_size).execute(query)
+    for chunk in result.partitions():
+        yield rows_to_table(chunk, schema)
+
+
+def _csv_type(data_type: pa.DataType) -> pa.DataType:
+    # Second timestamps are selected as epoch integers
+    if pa.types.is_timestamp(data_type) and data_type.unit == 's':
+        return pa.int64()
+    return data_type
+
+
+def stream_copy(connection, query, schema: pa.Schema) -> Iterator[pa.Table]:
+    """
+    PostgreSQL: COPY the query out as CSV on a background thread and parse
+    it with Arrow's streaming CSV reader.
+    """
+    dbapi_connection = connection.connection.dbapi_connection
+    compiled = query.compile(dialect=connection.dialect)
+    with dbapi_connection.cursor() as cursor:
+        sql = cursor.mogrify(str(compiled), compiled.params).decode()
+
+    read_fd, write_fd = os.pipe()
+    errors = []
+
+    def copy():
+        try:
+            with os.fdopen(write_fd, 'wb') as sink, dbapi_connection.cursor() as cursor:
+                cursor.copy_expert(f'COPY ({sql}) TO STDOUT WITH (FORMAT csv)', sink)
+        except Exception as e:
+            # Also reached when the reader stops early and cancels the COPY
+            errors.append(e)
+
+    thread = threading.Thread(target=copy, name='export-copy', daemon=True)
+    thread.start()
+    finished = False
+    try:
+        with os.fdopen(read_fd, 'rb') as source:
+            # The CSV reader rejects an empty stream: no rows, or a failed COPY
+            if source.peek(1):
+                reader = pa_csv.open_csv(
+                    source,
+                    read_options=pa_csv.ReadOptions(column_names=schema.names, block_size=COPY_BLOCK_SIZE),
+                    # COPY writes NULL unquoted and empty strings as ""
+                    convert_options=pa_csv.ConvertOptions(
+                        column_types={field.name: _csv_type(field.type) for field in schema},
+                        strings_can_be_null=True, quoted_strings_can_be_null=False
+                    )
+                )
+                for batch in reader:
+                    yield pa.Table.from_batches([batch]).cast(schema)
+        finished = True
+    finally:
+        if not finished:
+            # Abandoned early: cancel the COPY instead of letting it drain
+            dbapi_connection.cancel()
+        thread.join()
+    if errors:
+        raise errors[0]
+
+
+def partition_bounds(table: pa.Table, time_column: str):
+    """
+    Split a table sorted by meter and time into (start, stop, meter_id, month)
+    runs, month as YYYY-MM.
+    """
+    meters = table.column('meter_id').to_numpy()
+    months = table.column(time_column).to_numpy().astype('datetime64[M]')
+    starts = np.flatnonzero(np.r_[True, (meters[1:] != meters[:-1]) | (months[1:] != months[:-1])])
+    stops = np.r_[starts[1:], table.num_rows]
+    return [(int(lo), int(hi), int(meters[lo]), str(months[lo])) for lo, hi in zip(starts, stops)]
+
+
+class PartitionWriter:
+    """Writes one partition file in full row groups, holding at most one in memory."""
+
+    def __init__(self, schema: pa.Schema, fmt: str, row_group_size: int):
+        self.row_group_size = row_group_size
+        self.file = tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE)
+        if fmt == 'parquet':
+            self.writer = pq.ParquetWriter(self.file, schema, compression='zstd')
+        else:
+            self.writer = pa.ipc.new_file(self.file, schema,
+                                          options=pa.ipc.IpcWriteOptions(compression='zstd'))
+        self.pending: List[pa.Table] = []
+        self.pending_rows = 0
+        self.rows = 0
+
+    def write(self, table: pa.Table) -> None:
+        self.pending.append(table)
+        self.pending_rows += table.num_rows
+        self.rows += table.num_rows
+        if self.pending_rows >= self.row_group_size:
+            self._flush(final=False)
+
+    def _flush(self, final: bool) -> None:
+        table = pa.concat_tables(self.pending)
+        full = table.num_rows if final else table.num_rows // self.row_group_size * self.row_group_size
+        if full:
+            self._write(table.slice(0, full))
+        rest = table.slice(full)
+        self.pending, self.pending_rows = ([rest], rest.num_rows) if rest.num_rows else ([], 0)
+
+    def _write(self, table: pa.Table) -> None:
+        if isinstance(self.writer, pq.ParquetWriter):
+            self.writer.write_table(table, row_group_size=self.row_group_size)
+        else:
+            self.writer.write_table(table, max_chunksize=self.row_group_size)
+
+    def close(self):
+        """Finish the file and return it, rewound for upload."""
+        if self.pending:
+            self._flush(final=True)
+        self.writer.close()
+        self.file.seek(0)
+        return self.file
+
+
+class _Uploader:
+    """
+    Uploads finished partition files on a few threads. Submitting blocks
+    while the backlog is full, so finished files cannot pile up in memory.
+    """
+
+    def __init__(self, storage, concurrency: int):
+        self.storage = storage
+        self.slots = threading.BoundedSemaphore(concurrency * 2)
+        self.pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='export-upload')
+        self.lock = threading.Lock()
+        self.bytes = 0
+        self.errors: List[Exception] = []
+
+    def _put(self, key: str, file) -> None:
+        try:
+            size = self.storage.put_stream(key, file, 'application/octet-stream')
+            with self.lock:
+                self.bytes += size
+        except Exception as e:
+            self.errors.append(e)
+        finally:
+            file.close()
+            self.slots.release()
+
+    def submit(self, key: str, file) -> None:
+        self.slots.acquire()
+        if self.errors:
+            self.slots.release()
+            file.close()
+            raise self.errors[0]
+        self.pool.submit(self._put, key, file)
+
+    def close(self) -> None:
+        self.pool.shutdown(wait=True)
+        if self.errors:
+            raise self.errors[0]
+
+
+def meter_ranges(organization_id: Optional[int], shards: int) -> List[Tuple[int, int]]:
+    """Split the meters to export into up to ``shards`` contiguous id ranges."""
+    query = select(Meter.id)
+    if organization_id is not None:
+        query = query.join(Site, Site.id == Meter.site_id).where(Site.organization_id == organization_id)
+    ids = np.fromiter(db.session.execute(query.order_by(Meter.id)).scalars(), dtype=np.int64)
+    return [(int(group[0]), int(group[-1])) for group in np.array_split(ids, min(shards, ids.size)) if group.size] \
+        if ids.size else []
+
+
+def _export_shard(app, engine, dataset: Dataset, query, fmt: str, row_group_size: int, uploader: _Uploader,
+                  prefix: str, on_rows: Callable[[int], None], stop: threading.Event) -> List[dict]:
+    """
+    Export one meter range; partitions are contiguous because rows come
+    sorted by meter and time. Runs on a pool thread, so it pushes its own
+    app context for progress callbacks that use current_app.
+    """
+    with app.app_context():
+        return _export_range(engine, dataset, query, fmt, row_group_size, uploader, prefix, on_rows, stop)
+
+
+def _export_range(engine, dataset: Dataset, query, fmt: str, row_group_size: int, uploader: _Uploader,
+                  prefix: str, on_rows: Callable[[int], None], stop: threading.Event) -> List[dict]:
+    partitions = []
+    writer, key = None, None
+
+    def finish():
+        partitions.append({'path': key, 'rows': writer.rows})
+        uploader.submit(f'{prefix}/{key}', writer.close())
+
+    with engine.connect() as connection:
+        if engine.dialect.name == 'postgresql' and engine.dialect.driver == 'psycopg2':
+            tables = stream_copy(connection, query, dataset.schema)
+        else:
+            tables = stream_rows(connection, query, dataset.schema, row_group_size)
+        for table in tables:
+            if stop.is_set():
+                # Another shard failed; closing the stream ends the query
+                tables.close()
+                return partitions
+            for lo, hi, meter_id, month in partition_bounds(table, dataset.time_column):
+                partition = f'meter_id={meter_id}/month={month}/part-0{FORMATS[fmt]}'
+                if partition != key:
+                    if writer is not None:
+                        finish()
+                    writer, key = PartitionWriter(dataset.schema, fmt, row_group_size), partition
+                writer.write(table.slice(lo, hi - lo))
+            on_rows(table.num_rows)
+        if writer is not None:
+            finish()
+    return partitions
+
+
+def export_dataset(name: str, prefix: str, fmt: str = 'parquet', organization_id: Optional[int] = None,
+                   start: Optional[date] = None, end: Optional[date] = None,
+                   on_progress: Optional[Callable[[int], None]] = None) -> dict:
+    """
+    Stream one dataset to ``<prefix>/<name>/`` in storage.
+
+    The meters are split into EXPORT_PARALLELISM id ranges, each read by
+    its own query on its own connection, so the database and the Parquet
+    encoder work on several ranges at once.
+
+    Returns:
+        Dict with the dataset's row, partition and byte counts
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f'Unknown export format: {fmt}')
+    dataset = DATASETS[name]
+    app = current_app._get_current_object()
+    config = app.config
+    row_group_size = config.get('EXPORT_ROW_GROUP_SIZE', 131072)
+    ranges = meter_ranges(organization_id, config.get('EXPORT_PARALLELISM', 4))
+    # Each range uses its own connection; don't hold the session's meanwhile
+    db.session.rollback()
+    # Long sequential reads: use the replica when there is one
+    engine = db.engines.get(REPLICA_BIND_KEY) or db.engine
+
+    lock = threading.Lock()
+    rows = 0
+
+    def on_rows(count):
+        nonlocal rows
+        with lock:
+            rows += count
+            total = rows
+        if on_progress:
+            on_progress(total)
+
+    uploader = _Uploader(app.storage, config.get('EXPORT_UPLOAD_CONCURRENCY', 8))
+    stop = threading.Event()
+    shards = []
+    try:
+        with ThreadPoolExecutor(max_workers=max(len(ranges), 1), thread_name_prefix='export-shard') as pool:
+            futures = [
+                pool.submit(_export_shard, app, engine, dataset, dataset.query(organization_id, start, end, meters),
+                            fmt, row_group_size, uploader, f'{prefix}/{name}', on_rows, stop)
+                for meters in ranges
+            ]
+            # Stop the other ranges as soon as one fails
+            if any(future.exception() for future in wait(futures, return_when=FIRST_EXCEPTION).done):
+                stop.set()
+            # Ranges are in meter order, so the manifest is too
+            shards = [future.result() for future in futures]
+    finally:
+        uploader.close()
+    partitions = [partition for shard in shards for partition in shard]
+
+    manifest = {
+        'dataset': name,
+        'format': fmt,
+        'schema': [{'name': field.name, 'type': str(field.type)} for field in dataset.schema],
+        'partitioning': ['meter_id', 'month'],
+        'organization_id': organization_id,
+        'start': start.isoformat() if start else None,
+        'end': end.isoformat() if end else None,
+        'created_at': datetime.utcnow().isoformat(),
+        'rows': rows,
+        'partitions': partitions,
+    }
+    with tempfile.TemporaryFile() as file:
+        file.write(json.dumps(manifest).encode())
+        file.seek(0)
+        current_app.storage.put_stream(f'{prefix}/{name}/_manifest.json', file, 'application/json')
+    return {'rows': rows, 'partitions': len(partitions), 'bytes': uploader.bytes}
@@ -0,0 +1,188 @@
+"""
+Resolve the rate schedule and linked account meter in effect on a date.
+
+Bulk jobs use an in-memory index: per vendor, rate schedules sorted by
+effective date; per meter, links sorted by start date. A lookup is a
+bisect over one key's dates. Single lookups go to the database through
+the (vendor_id, effective_date) and (meter_id, start_date) indexes.
+"""
+import threading
+import time
+from bisect import bisect_right
+from datetime import date
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+from flask import current_app
+from sqlalchemy import event, or_
+from sqlalchemy.orm import Session, object_session
+from .. import db
+from ..models import LinkedAccountMeter, RateSchedule
+
+
+class ScheduleEntry(NamedTuple):
+    id: int
+    vendor_id: int
+    effective_date: date
+    rate_type: Optional[str]
+    rate_details: Optional[dict]
+
+
+class LinkEntry(NamedTuple):
+    id: int
+    meter_id: int
+    account_id: int
+    rate_schedule_id: Optional[int]
+    start_date: date
+    end_date: Optional[date]
+
+
+class _Intervals:
+    """Entries of one key sorted by start date."""
+
+    __slots__ = ('starts', 'ends', 'max_ends', 'entries')
+
+    def __init__(self, entries: List[tuple], start_of, end_of):
+        entries.sort(key=lambda e: (start_of(e), e.id))
+        self.entries = entries
+        self.starts = [start_of(e) for e in entries]
+        # None is an open end; date.max keeps the comparisons simple
+        self.ends = [end_of(e) or date.max for e in entries]
+        # Running maximum of the ends, so a backwards scan can stop as soon
+        # as no earlier entry can still be open
+        self.max_ends = []
+        latest = date.min
+        for end in self.ends:
+            latest = max(latest, end)
+            self.max_ends.append(latest)
+
+    def at(self, when: date):
+        i = bisect_right(self.starts, when) - 1
+        while i >= 0 and self.max_ends[i] >= when:
+            if self.ends[i] >= when:
+                return self.entries[i]
+            i -= 1
+        return None
+
+
+class EffectiveDateIndex:
+    """Immutable once built; share one per process via get_effective_date_index()."""
+
+    def __init__(self, schedules: Iterable[ScheduleEntry] = (), links: Iterable[LinkEntry] = ()):
+        by_vendor: Dict[int, List[ScheduleEntry]] = {}
+        for schedule in schedules:
+            by_vendor.setdefault(schedule.vendor_id, []).append(schedule)
+        by_meter: Dict[int, List[LinkEntry]] = {}
+        for link in links:
+            by_meter.setdefault(link.meter_id, []).append(link)
+
+        # A schedule applies from its effective date until the next one
+        self._schedules = {
+            vendor_id: _Intervals(entries, lambda e: e.effective_date, lambda e: None)
+            for vendor_id, entries in by_vendor.items()
+        }
+        self._links = {
+            meter_id: _Intervals(entries, lambda e: e.start_date, lambda e: e.end_date)
+            for meter_id, entries in by_meter.items()
+        }
+        self.built_at = time.monotonic()
+
+    @classmethod
+    def build(cls) -> 'EffectiveDateIndex':
+        schedules = db.session.query(
+            RateSchedule.id, RateSchedule.vendor_id, RateSchedule.effective_date,
+            RateSchedule.rate_type, RateSchedule.rate_details
+        ).filter(RateSchedule.is_active.is_(True))
+        links = db.session.query(
+            LinkedAccountMeter.id, LinkedAccountMeter.meter_id, LinkedAccountMeter.account_id,
+            LinkedAccountMeter.rate_schedule_id, LinkedAccountMeter.start_date, LinkedAccountMeter.end_date
+        ).filter(LinkedAccountMeter.is_active.is_(True))
+        return cls((ScheduleEntry(*row) for row in schedules), (LinkEntry(*row) for row in links))
+
+    def rate_schedule_at(self, vendor_id: int, when: date) -> Optional[ScheduleEntry]:
+        """The vendor's latest schedule effective on or before ``when``."""
+        intervals = self._schedules.get(vendor_id)
+        return intervals.at(when) if intervals else None
+
+    def link_at(self, meter_id: int, when: date) -> Optional[LinkEntry]:
+        """The meter's link whose start/end dates cover ``when``."""
+        intervals = self._links.get(meter_id)
+        return intervals.at(when) if intervals else None
+
+    def rate_schedules_at(self, lookups: Iterable[Tuple[int, date]]) -> List[Optional[ScheduleEntry]]:
+        return [self.rate_schedule_at(vendor_id, when) for vendor_id, when in lookups]
+
+    def links_at(self, lookups: Iterable[Tuple[int, date]]) -> List[Optional[LinkEntry]]:
+        return [self.link_at(meter_id, when) for meter_id, when in lookups]
+
+
+_index: Optional[EffectiveDateIndex] = None
+_index_lock = threading.Lock()
+# Bumped by every invalidation, so a build that overlapped one is not kept
+_generation = 0
+_CHANGED = 'effective_dates_changed'
+
+
+def get_effective_date_index() -> EffectiveDateIndex:
+    """Return this process's index, rebuilding it when stale or invalidated."""
+    global _index
+    index = _index
+    ttl = current_app.config.get('EFFECTIVE_DATE_INDEX_TTL', 300)
+    if index is None or time.monotonic() - index.built_at > ttl:
+        with _index_lock:
+            index = _index
+            if index is None or time.monotonic() - index.built_at > ttl:
+                generation = _generation
+                index = EffectiveDateIndex.build()
+                if generation == _generation:
+                    _index = index
+    return index
+
+
+def invalidate_effective_date_index() -> None:
+    global _index, _generation
+    _generation += 1
+    _index = None
+
+
+def rate_schedule_on(vendor_id: int, when: date) -> Optional[RateSchedule]:
+    """Single lookup of the vendor's schedule in effect on ``when``."""
+    return RateSchedule.query.filter(
+        RateSchedule.vendor_id == vendor_id,
+        RateSchedule.effective_date <= when,
+        RateSchedule.is_active.is_(True)
+    ).order_by(RateSchedule.effective_date.desc(), RateSchedule.id.desc()).first()
+
+
+def linked_account_meter_on(meter_id: int, when: date) -> Optional[LinkedAccountMeter]:
+    """Single lookup of the meter's link active on ``when``."""
+    return LinkedAccountMeter.query.filter(
+        LinkedAccountMeter.meter_id == meter_id,
+        LinkedAccountMeter.start_date <= when,
+        or_(LinkedAccountMeter.end_date.is_(None), LinkedAccountMeter.end_date >= when),
+        LinkedAccountMeter.is_active.is_(True)
+    ).order_by(LinkedAccountMeter.start_date.desc(), LinkedAccountMeter.id.desc()).first()
+
+
+@event.listens_for(RateSchedule, 'after_insert')
+@event.listens_for(RateSchedule, 'after_update')
+@event.listens_for(RateSchedule, 'after_delete')
+@event.listens_for(LinkedAccountMeter, 'after_insert')
+@event.listens_for(LinkedAccountMeter, 'after_update')
+@event.listens_for(LinkedAccountMeter, 'after_delete')
+def _mark_changed(mapper, connection, target) -> None:
+    session = object_session(target)
+    if session is not None:
+        session.info[_CHANGED] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_committed(session) -> None:
+    # Dropping the index during the flush would let a concurrent rebuild
+    # read the pre-commit rows and keep them for the whole TTL. Other
+    # processes pick the change up within EFFECTIVE_DATE_INDEX_TTL.
+    if session.info.pop(_CHANGED, False):
+        invalidate_effective_date_index()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_changed(session) -> None:
+    session.info.pop(_CHANGED, None)
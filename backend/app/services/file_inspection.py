@@ -0,0 +1,90 @@
+"""Single-pass file inspection: MIME type, extension check, size and SHA-256."""
+import hashlib
+import mmap
+from typing import BinaryIO, Dict, NamedTuple, Optional, Union
+
+# Enough of the head for libmagic to tell OOXML spreadsheets from plain zips
+SNIFF_BYTES = 16 * 1024
+CHUNK_SIZE = 1024 * 1024
+
+
+class FileInspection(NamedTuple):
+    mime_type: str
+    size: int
+    sha256: str
+    # False when the filename's extension does not match the detected type
+    # (or the type is not allowed); None when no check was requested
+    extension_ok: Optional[bool] = None
+
+
+def sniff_mime(head: bytes) -> str:
+    import magic
+    return magic.from_buffer(bytes(head[:SNIFF_BYTES]), mime=True)
+
+
+def _check_extension(mime_type: str, filename: Optional[str],
+                     allowed_types: Optional[Dict[str, str]]) -> Optional[bool]:
+    if filename is None or allowed_types is None:
+        return None
+    extension = allowed_types.get(mime_type)
+    return extension is not None and filename.lower().endswith(extension)
+
+
+def inspect_buffer(data: Union[bytes, bytearray, memoryview, mmap.mmap],
+                   filename: Optional[str] = None,
+                   allowed_types: Optional[Dict[str, str]] = None) -> FileInspection:
+    """Inspect an in-memory (or memory-mapped) buffer without copying it."""
+    view = memoryview(data)
+    mime_type = sniff_mime(view[:SNIFF_BYTES])
+    return FileInspection(mime_type, len(view), hashlib.sha256(view).hexdigest(),
+                          _check_extension(mime_type, filename, allowed_types))
+
+
+def inspect_file(path: str, filename: Optional[str] = None,
+                 allowed_types: Optional[Dict[str, str]] = None) -> FileInspection:
+    """Inspect a local file through mmap, so it is read only once."""
+    with open(path, 'rb') as f:
+        if f.seek(0, 2) == 0:
+            return inspect_buffer(b'', filename, allowed_types)
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return inspect_buffer(mapped, filename, allowed_types)
+
+
+class InspectingReader:
+    """
+    File-like wrapper that inspects a stream while something else reads it.
+
+    Wrap an upload before handing it to storage; once the stream is
+    exhausted, ``result()`` returns the inspection without a second read.
+    """
+
+    def __init__(self, stream: BinaryIO, filename: Optional[str] = None,
+                 allowed_types: Optional[Dict[str, str]] = None):
+        self.stream = stream
+        self.filename = filename
+        self.allowed_types = allowed_types
+        self._digest = hashlib.sha256()
+        self._head = bytearray()
+        self._size = 0
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.stream.read(size)
+        self._digest.update(data)
+        self._size += len(data)
+        if len(self._head) < SNIFF_BYTES:
+            self._head += data[:SNIFF_BYTES - len(self._head)]
+        return data
+
+    def result(self) -> FileInspection:
+        mime_type = sniff_mime(self._head)
+        return FileInspection(mime_type, self._size, self._digest.hexdigest(),
+                              _check_extension(mime_type, self.filename, self.allowed_types))
+
+
+def inspect_stream(stream: BinaryIO, filename: Optional[str] = None,
+                   allowed_types: Optional[Dict[str, str]] = None) -> FileInspection:
+    """Inspect a stream by reading it once in chunks."""
+    reader = InspectingReader(stream, filename, allowed_types)
+    while reader.read(CHUNK_SIZE):
+        pass
+    return reader.result()
@@ -0,0 +1,294 @@
+"""
+Path table for the organization -> site -> meter -> linked account tree.
+
+Every node has a HierarchyNode row whose path lists its ancestors. Rows
+are written by mapper events in the same flush as the node itself; moving
+a site, meter or link rewrites the path prefix of its whole subtree with
+one UPDATE. Reading a tree is a single query on (organization_id, depth).
+
+The organization's own row also carries a version number, bumped at the
+end of every flush that changed its tree, which serves as the tree's ETag.
+Being part of the same transaction, it can neither be lost on its own nor
+get ahead of the tree on a replica.
+"""
+from typing import Dict, Optional, Set, Tuple
+from sqlalchemy import String, bindparam, cast, delete, event, func, insert, inspect, literal, select, update
+from sqlalchemy.orm import Session, object_session
+from .. import db
+from ..models import Account, HierarchyNode, LinkedAccountMeter, Meter, Organization, Site
+
+MAX_DEPTH = 3
+
+_nodes = HierarchyNode.__table__
+# node type -> (path segment prefix, depth)
+_LEVELS = {
+    'organization': ('o', 0),
+    'site': ('s', 1),
+    'meter': ('m', 2),
+    'linked_account': ('l', 3),
+}
+_TOUCHED = 'hierarchy_touched'
+
+
+def _touch(target, *organization_ids) -> None:
+    """Remember organizations whose tree changed, to bump them after the flush."""
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault(_TOUCHED, set()).update(i for i in organization_ids if i is not None)
+
+
+@event.listens_for(Session, 'after_flush')
+def _bump_versions(session, flush_context) -> None:
+    touched: Set[int] = session.info.pop(_TOUCHED, None)
+    if not touched:
+        return
+    session.connection().execute(update(_nodes).where(
+        _nodes.c.node_type == 'organization', _nodes.c.node_id.in_(touched)
+    ).values(version=_nodes.c.version + 1))
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_versions(session) -> None:
+    session.info.pop(_TOUCHED, None)
+
+
+def _node(connection, node_type: str, node_id: int):
+    return connection.execute(
+        select(_nodes.c.organization_id, _nodes.c.path).where(
+            _nodes.c.node_type == node_type, _nodes.c.node_id == node_id)
+    ).first()
+
+
+def _add_node(connection, target, node_type: str, parent, label: Optional[str]) -> None:
+    # parent is the (organization_id, path) of the parent node, or None for
+    # an organization. A missing parent means the tree predates this table
+    # and has not been rebuilt yet; rebuild_hierarchy() adds the node then.
+    prefix, depth = _LEVELS[node_type]
+    if node_type == 'organization':
+        organization_id, parent_path = target.id, '/'
+    elif parent is None:
+        return
+    else:
+        organization_id, parent_path = parent
+    connection.execute(insert(_nodes).values(
+        organization_id=organization_id, node_type=node_type, node_id=target.id,
+        depth=depth, path=f'{parent_path}{prefix}{target.id}/', label=label
+    ))
+    _touch(target, organization_id)
+
+
+def _move_node(connection, target, node_type: str, parent_type: str, parent_id: int) -> None:
+    """Re-root a node and its subtree under a new parent."""
+    node, parent = _node(connection, node_type, target.id), _node(connection, parent_type, parent_id)
+    if node is None or parent is None:
+        return
+    old_path = node.path
+    new_path = f'{parent.path}{_LEVELS[node_type][0]}{target.id}/'
+    connection.execute(update(_nodes).where(_nodes.c.path.startswith(old_path)).values(
+        path=literal(new_path) + func.substr(_nodes.c.path, len(old_path) + 1),
+        organization_id=parent.organization_id
+    ))
+    _touch(target, node.organization_id, parent.organization_id)
+
+
+def _relabel(connection, target, node_type: str, label: Optional[str]) -> None:
+    node = _node(connection, node_type, target.id)
+    if node is not None:
+        connection.execute(update(_nodes).where(
+            _nodes.c.node_type == node_type, _nodes.c.node_id == target.id
+        ).values(label=label))
+        _touch(target, node.organization_id)
+
+
+def _remove_node(connection, target, node_type: str) -> None:
+    node = _node(connection, node_type, target.id)
+    if node is not None:
+        connection.execute(delete(_nodes).where(_nodes.c.path.startswith(node.path)))
+        _touch(target, node.organization_id)
+
+
+def _changed(target, *fields) -> bool:
+    state = inspect(target)
+    return any(state.attrs[field].history.has_changes() for field in fields)
+
+
+def _account_number(connection, account_id: int) -> Optional[str]:
+    return connection.execute(select(Account.number).where(Account.id == account_id)).scalar()
+
+
+@event.listens_for(Organization, 'after_insert')
+def _organization_added(mapper, connection, target) -> None:
+    _add_node(connection, target, 'organization', None, target.name)
+
+
+@event.listens_for(Site, 'after_insert')
+def _site_added(mapper, connection, target) -> None:
+    _add_node(connection, target, 'site', _node(connection, 'organization', target.organization_id),
+              target.name)
+
+
+@event.listens_for(Meter, 'after_insert')
+def _meter_added(mapper, connection, target) -> None:
+    _add_node(connection, target, 'meter', _node(connection, 'site', target.site_id), target.number)
+
+
+@event.listens_for(LinkedAccountMeter, 'after_insert')
+def _link_added(mapper, connection, target) -> None:
+    _add_node(connection, target, 'linked_account', _node(connection, 'meter', target.meter_id),
+              _account_number(connection, target.account_id))
+
+
+@event.listens_for(Organization, 'after_update')
+def _organization_updated(mapper, connection, target) -> None:
+    if _changed(target, 'name'):
+        _relabel(connection, target, 'organization', target.name)
+
+
+@event.listens_for(Site, 'after_update')
+def _site_updated(mapper, connection, target) -> None:
+    if _changed(target, 'organization_id'):
+        _move_node(connection, target, 'site', 'organization', target.organization_id)
+    if _changed(target, 'name'):
+        _relabel(connection, target, 'site', target.name)
+
+
+@event.listens_for(Meter, 'after_update')
+def _meter_updated(mapper, connection, target) -> None:
+    if _changed(target, 'site_id'):
+        _move_node(connection, target, 'meter', 'site', target.site_id)
+    if _changed(target, 'number'):
+        _relabel(connection, target, 'meter', target.number)
+
+
+@event.listens_for(LinkedAccountMeter, 'after_update')
+def _link_updated(mapper, connection, target) -> None:
+    if _changed(target, 'meter_id'):
+        _move_node(connection, target, 'linked_account', 'meter', target.meter_id)
+    if _changed(target, 'account_id'):
+        _relabel(connection, target, 'linked_account', _account_number(connection, target.account_id))
+
+
+@event.listens_for(Account, 'after_update')
+def _account_updated(mapper, connection, target) -> None:
+    if not _changed(target, 'number'):
+        return
+    links = select(LinkedAccountMeter.id).where(LinkedAccountMeter.account_id == target.id)
+    condition = (_nodes.c.node_type == 'linked_account') & _nodes.c.node_id.in_(links)
+    organization_ids = connection.execute(
+        select(_nodes.c.organization_id).where(condition).distinct()
+    ).scalars().all()
+    if organization_ids:
+        connection.execute(update(_nodes).where(condition).values(label=target.number))
+        _touch(target, *organization_ids)
+
+
+@event.listens_for(Organization, 'after_delete')
+def _organization_removed(mapper, connection, target) -> None:
+    _remove_node(connection, target, 'organization')
+
+
+@event.listens_for(Site, 'after_delete')
+def _site_removed(mapper, connection, target) -> None:
+    _remove_node(connection, target, 'site')
+
+
+@event.listens_for(Meter, 'after_delete')
+def _meter_removed(mapper, connection, target) -> None:
+    _remove_node(connection, target, 'meter')
+
+
+@event.listens_for(LinkedAccountMeter, 'after_delete')
+def _link_removed(mapper, connection, target) -> None:
+    _remove_node(connection, target, 'linked_account')
+
+
+def get_tree(organization_id: int, depth: int = MAX_DEPTH) -> Optional[dict]:
+    """
+    Return the organization's nested tree down to ``depth`` levels below it.
+
+    Nodes at the depth limit have no ``children`` key, to tell them apart
+    from nodes that have no children.
+    """
+    rows = db.session.execute(
+        select(_nodes.c.node_type, _nodes.c.node_id, _nodes.c.depth, _nodes.c.path, _nodes.c.label).where(
+            _nodes.c.organization_id == organization_id, _nodes.c.depth <= depth
+        ).order_by(_nodes.c.depth, _nodes.c.node_id)
+    )
+    by_path: Dict[str, dict] = {}
+    root = None
+    for node_type, node_id, node_depth, path, label in rows:
+        node = {'type': node_type, 'id': node_id, 'name': label}
+        if node_depth < depth:
+            node['children'] = []
+        by_path[path] = node
+        if node_depth == 0:
+            root = node
+            continue
+        # Rows are ordered by depth, so the parent has already been seen
+        parent = by_path.get(path[:path.rindex('/', 0, -1) + 1])
+        if parent is not None:
+            parent['children'].append(node)
+    return root
+
+
+def tree_version(organization_id: int) -> Optional[Tuple[int, int]]:
+    """Return the (row id, version) of the organization's node, or None if it has none."""
+    row = db.session.execute(
+        select(_nodes.c.id, _nodes.c.version).where(
+            _nodes.c.node_type == 'organization', _nodes.c.node_id == organization_id)
+    ).first()
+    return tuple(row) if row is not None else None
+
+
+def _segment(prefix: str, column):
+    return literal(prefix) + cast(column, String)
+
+
+def rebuild_hierarchy(organization_id: Optional[int] = None) -> int:
+    """
+    Regenerate the path rows of one organization, or of all of them, with
+    one INSERT ... SELECT per level. Used to backfill existing data.
+
+    Returns:
+        Number of nodes written
+    """
+    columns = ['organization_id', 'node_type', 'node_id', 'depth', 'path', 'label']
+    org_path = _segment('/o', Organization.id) + '/'
+    site_path = org_path + _segment('s', Site.id) + '/'
+    meter_path = site_path + _segment('m', Meter.id) + '/'
+    link_path = meter_path + _segment('l', LinkedAccountMeter.id) + '/'
+    levels = [
+        select(Organization.id, literal('organization'), Organization.id, literal(0), org_path,
+               Organization.name),
+        select(Organization.id, literal('site'), Site.id, literal(1), site_path, Site.name).join(
+            Site, Site.organization_id == Organization.id),
+        select(Organization.id, literal('meter'), Meter.id, literal(2), meter_path, Meter.number).join(
+            Site, Site.organization_id == Organization.id).join(Meter, Meter.site_id == Site.id),
+        select(Organization.id, literal('linked_account'), LinkedAccountMeter.id, literal(3), link_path,
+               Account.number).join(
+            Site, Site.organization_id == Organization.id).join(Meter, Meter.site_id == Site.id).join(
+            LinkedAccountMeter, LinkedAccountMeter.meter_id == Meter.id).join(
+            Account, Account.id == LinkedAccountMeter.account_id),
+    ]
+
+    cleanup = delete(_nodes)
+    versions = select(_nodes.c.node_id, _nodes.c.version).where(_nodes.c.node_type == 'organization')
+    if organization_id is not None:
+        cleanup = cleanup.where(_nodes.c.organization_id == organization_id)
+        versions = versions.where(_nodes.c.node_id == organization_id)
+        levels = [level.where(Organization.id == organization_id) for level in levels]
+    # Carry the versions over, so ETags from before the rebuild cannot match
+    previous = db.session.execute(versions).all()
+    db.session.execute(cleanup)
+    written = 0
+    for level in levels:
+        written += db.session.execute(insert(_nodes).from_select(columns, level)).rowcount
+    if previous:
+        db.session.execute(
+            update(_nodes).where(
+                _nodes.c.node_type == 'organization', _nodes.c.node_id == bindparam('org_id')
+            ).values(version=bindparam('next_version')),
+            [{'org_id': org_id, 'next_version': version + 1} for org_id, version in previous]
+        )
+    db.session.commit()
+    return written
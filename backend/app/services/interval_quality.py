@@ -0,0 +1,172 @@
+"""
+Validation and estimation of interval readings, one ingested batch at a time.
+
+A batch is two arrays, epoch seconds and values. Checks run as whole-array
+operations:
+
+- duplicate timestamps: the last reading wins;
+- gaps against the expected cadence: short gaps are filled by linear
+  interpolation, longer ones from the batch's time-of-day profile;
+- negative values and spikes (e.g. meter rollover): kept but flagged;
+- readings at or before the previous batch's last one (an unsorted file):
+  returned separately as ``late``, to be written in place.
+
+The last good reading of a batch is passed to the next one, so gaps and
+spikes at batch boundaries are caught as well.
+"""
+from typing import Dict, NamedTuple, Optional, Tuple
+import numpy as np
+
+ACTUAL = 'actual'
+ESTIMATED = 'estimated'
+SUSPECT = 'suspect'
+
+DAY = 86400
+# Spike threshold in robust standard deviations (1.4826 * MAD)
+SPIKE_THRESHOLD = 10.0
+
+
+class QualityResult(NamedTuple):
+    timestamps: np.ndarray
+    values: np.ndarray
+    flags: np.ndarray
+    counts: Dict[str, int]
+    # Out-of-order readings, sorted and flagged but not gap-filled
+    late: Optional['QualityResult'] = None
+
+
+def infer_cadence(timestamps: np.ndarray, default: int = 900) -> int:
+    """The most common spacing between readings."""
+    diffs = np.diff(np.unique(timestamps))
+    if diffs.size == 0:
+        return default
+    spacings, counts = np.unique(diffs, return_counts=True)
+    return int(spacings[np.argmax(counts)])
+
+
+def _dedupe(timestamps: np.ndarray, values: np.ndarray) -> Tuple[np.ndarray, np.ndarray, int]:
+    order = np.argsort(timestamps, kind='stable')
+    timestamps, values = timestamps[order], values[order]
+    # The last of each run of equal timestamps is the newest reading
+    last = np.r_[timestamps[1:] != timestamps[:-1], True]
+    return timestamps[last], values[last], int(timestamps.size - last.sum())
+
+
+def _suspect(values: np.ndarray, threshold: float) -> Tuple[np.ndarray, np.ndarray]:
+    negative = values < 0
+    valid = values[~negative]
+    if valid.size == 0:
+        return negative, np.zeros_like(negative)
+    median = np.median(valid)
+    scale = 1.4826 * np.median(np.abs(valid - median))
+    if scale == 0:
+        # Flat series: fall back to a relative tolerance
+        scale = max(abs(median) * 0.1, 1e-9)
+    spikes = ~negative & (np.abs(values - median) > threshold * scale)
+    return negative, spikes
+
+
+def _profile(timestamps: np.ndarray, values: np.ndarray, cadence: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Mean value per time-of-day slot, and which slots had any reading."""
+    slots = DAY // cadence if DAY % cadence == 0 else 1
+    slot = (timestamps % DAY) // cadence % slots
+    counts = np.bincount(slot, minlength=slots)
+    sums = np.bincount(slot, weights=values, minlength=slots)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return sums / counts, counts > 0
+
+
+def check_batch(timestamps: np.ndarray, values: np.ndarray, cadence: Optional[int] = None,
+                previous: Optional[Tuple[int, float]] = None, max_fill: int = 96,
+                linear_fill: int = 4, spike_threshold: float = SPIKE_THRESHOLD) -> QualityResult:
+    """
+    Validate a batch and add estimated readings for its gaps.
+
+    Args:
+        timestamps: Epoch seconds, in any order
+        values: Reading per timestamp
+        cadence: Expected spacing in seconds; inferred from the batch if None
+        previous: (timestamp, value) of the last good reading of the previous batch
+        max_fill: Longest gap, in intervals, that is estimated; longer gaps
+            are only counted
+        linear_fill: Gaps up to this many intervals are interpolated
+            linearly; longer ones use the time-of-day profile
+        spike_threshold: Robust standard deviations from the median beyond
+            which a reading is a spike
+
+    Returns:
+        QualityResult with the batch sorted by time, estimated readings
+        merged in, a flag per reading, and counts per finding. Readings at
+        or before ``previous`` are left out of it and returned as ``late``.
+    """
+    timestamps = np.asarray(timestamps, dtype=np.int64)
+    values = np.asarray(values, dtype=np.float64)
+    timestamps, values, duplicates = _dedupe(timestamps, values)
+    counts = {'readings': int(timestamps.size), 'duplicates': duplicates, 'out_of_order': 0,
+              'negative': 0, 'spikes': 0, 'gaps': 0, 'missing': 0, 'estimated': 0}
+    if timestamps.size == 0:
+        return QualityResult(timestamps, values, np.empty(0, dtype=object), counts)
+
+    negative, spikes = _suspect(values, spike_threshold)
+    counts['negative'], counts['spikes'] = int(negative.sum()), int(spikes.sum())
+    good = ~(negative | spikes)
+
+    late = None
+    if previous is not None and timestamps[0] <= previous[0]:
+        # The file is not sorted: these belong to a range already written
+        newer = timestamps > previous[0]
+        late = QualityResult(timestamps[~newer], values[~newer],
+                             np.where(good[~newer], ACTUAL, SUSPECT).astype(object),
+                             {'readings': int((~newer).sum())})
+        counts['out_of_order'] = late.counts['readings']
+        timestamps, values, good = timestamps[newer], values[newer], good[newer]
+        if timestamps.size == 0:
+            return QualityResult(timestamps, values, np.empty(0, dtype=object), counts, late)
+    cadence = cadence or infer_cadence(timestamps)
+
+    # Gaps, including the one between the previous batch and this one
+    anchor_ts = np.r_[previous[0], timestamps] if previous is not None else timestamps
+    missing = np.diff(anchor_ts) // cadence - 1
+    gap_starts = np.flatnonzero(missing > 0)
+    counts['gaps'] = int(gap_starts.size)
+    counts['missing'] = int(missing[gap_starts].sum())
+
+    fillable = gap_starts[missing[gap_starts] <= max_fill]
+    lengths = missing[fillable]
+    total = int(lengths.sum())
+    if total:
+        # Expand each gap into its missing timestamps without a Python loop
+        offsets = np.arange(total) - np.repeat(np.cumsum(lengths) - lengths, lengths) + 1
+        fill_ts = np.repeat(anchor_ts[fillable], lengths) + offsets * cadence
+        gap_length = np.repeat(lengths, lengths)
+
+        known_ts, known_values = timestamps[good], values[good]
+        if previous is not None:
+            known_ts, known_values = np.r_[previous[0], known_ts], np.r_[previous[1], known_values]
+        fill_values = np.interp(fill_ts, known_ts, known_values) if known_ts.size else \
+            np.zeros(total)
+        long_gap = gap_length > linear_fill
+        if long_gap.any() and known_ts.size:
+            profile, has_slot = _profile(known_ts, known_values, cadence)
+            slot = (fill_ts % DAY) // cadence % profile.size
+            use_profile = long_gap & has_slot[slot]
+            fill_values[use_profile] = profile[slot[use_profile]]
+
+        counts['estimated'] = total
+        flags = np.where(good, ACTUAL, SUSPECT).astype(object)
+        timestamps = np.r_[timestamps, fill_ts]
+        values = np.r_[values, fill_values]
+        flags = np.r_[flags, np.full(total, ESTIMATED, dtype=object)]
+        order = np.argsort(timestamps, kind='stable')
+        return QualityResult(timestamps[order], values[order], flags[order], counts, late)
+
+    return QualityResult(timestamps, values, np.where(good, ACTUAL, SUSPECT).astype(object), counts, late)
+
+
+def last_good(result: QualityResult) -> Optional[Tuple[int, float]]:
+    """The reading to pass as ``previous`` to the next batch."""
+    good = np.flatnonzero(result.flags != SUSPECT)
+    if good.size == 0:
+        return None
+    i = good[-1]
+    return int(result.timestamps[i]), float(result.values[i])
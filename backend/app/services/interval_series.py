@@ -0,0 +1,141 @@
+"""
+Interval data shaped for charts: time buckets and LTTB downsampling.
+
+Readings for the requested range are fetched as two NumPy arrays (epoch
+seconds and values) and every transformation works on whole arrays, so a
+multi-year 15-minute series is reduced to a few hundred points without a
+Python loop per reading.
+"""
+from datetime import datetime, timezone
+from itertools import chain
+from typing import Optional, Tuple
+import numpy as np
+from sqlalchemy import func, select
+from .. import db
+from ..models import IntervalData
+
+AGGREGATES = ('sum', 'avg', 'min', 'max')
+# Bucket widths accepted by the API, in seconds
+INTERVALS = {'15m': 900, '1h': 3600, '1d': 86400, '1w': 7 * 86400}
+
+
+def fetch_series(meter_id: int, start: datetime, end: datetime) -> Tuple[np.ndarray, np.ndarray]:
+    """Return (epoch seconds, values) for readings in [start, end), ordered by time."""
+    result = db.session.execute(
+        select(func.extract('epoch', IntervalData.timestamp), IntervalData.value).where(
+            IntervalData.meter_id == meter_id,
+            IntervalData.timestamp >= start,
+            IntervalData.timestamp < end
+        ).order_by(IntervalData.timestamp)
+    )
+    # Streaming the flattened rows into one buffer avoids building a NumPy
+    # array from row objects, which is several times slower than the query
+    data = np.fromiter(chain.from_iterable(result), dtype=np.float64).reshape(-1, 2)
+    return data[:, 0].astype(np.int64), data[:, 1]
+
+
+def series_unit(meter_id: int) -> Optional[str]:
+    return db.session.execute(
+        select(IntervalData.unit).where(IntervalData.meter_id == meter_id).limit(1)
+    ).scalar()
+
+
+def bucket(timestamps: np.ndarray, values: np.ndarray, width: int,
+           agg: str = 'sum') -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Aggregate readings into fixed-width buckets aligned to the epoch.
+
+    ``timestamps`` must be sorted. Empty buckets are omitted rather than
+    reported as zero.
+
+    Returns:
+        (bucket start times, aggregated values)
+    """
+    if agg not in AGGREGATES:
+        raise ValueError(f'Unknown aggregate: {agg}')
+    if timestamps.size == 0:
+        return timestamps, values
+    keys = timestamps // width
+    # Sorted input: each bucket is a contiguous run starting where the key changes
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    if agg == 'min':
+        result = np.minimum.reduceat(values, starts)
+    elif agg == 'max':
+        result = np.maximum.reduceat(values, starts)
+    else:
+        result = np.add.reduceat(values, starts)
+        if agg == 'avg':
+            result = result / np.diff(np.r_[starts, values.size])
+    return keys[starts] * width, result
+
+
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets downsampling.
+
+    Keeps the first and last points and, from each of ``threshold - 2``
+    equal buckets in between, the point forming the largest triangle with
+    the previously kept point and the mean of the next bucket. Peaks and
+    troughs survive, unlike with plain averaging.
+
+    Returns:
+        Indices of the kept points
+    """
+    n = x.size
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    x = x.astype(np.float64)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    # Means of each bucket, computed once; the last "next bucket" is the final point
+    sums_x = np.add.reduceat(x[:-1], edges[:-1])
+    sums_y = np.add.reduceat(y[:-1], edges[:-1])
+    counts = np.diff(edges)
+    mean_x = np.r_[sums_x / counts, x[-1]]
+    mean_y = np.r_[sums_y / counts, y[-1]]
+
+    kept = np.empty(threshold, dtype=np.int64)
+    kept[0], kept[-1] = 0, n - 1
+    previous = 0
+    for i in range(threshold - 2):
+        lo, hi = edges[i], edges[i + 1]
+        px, py = x[previous], y[previous]
+        # Twice the triangle area; the constant factor does not change the argmax
+        areas = np.abs((px - mean_x[i + 1]) * (y[lo:hi] - py) - (px - x[lo:hi]) * (mean_y[i + 1] - py))
+        previous = lo + int(np.argmax(areas))
+        kept[i + 1] = previous
+    return kept
+
+
+def chart_series(meter_id: int, start: datetime, end: datetime, interval: Optional[str] = None,
+                 agg: str = 'sum', points: Optional[int] = None) -> dict:
+    """
+    Readings for a chart: optionally bucketed to ``interval``, then reduced
+    to at most ``points`` points with LTTB.
+    """
+    timestamps, values = fetch_series(meter_id, start, end)
+    raw_count = int(timestamps.size)
+    if interval:
+        timestamps, values = bucket(timestamps, values, INTERVALS[interval], agg)
+    if points and timestamps.size > points:
+        kept = lttb(timestamps, values, points)
+        timestamps, values = timestamps[kept], values[kept]
+    return {
+        'meter_id': meter_id,
+        'unit': series_unit(meter_id),
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'interval': interval,
+        'agg': agg if interval else None,
+        'raw_count': raw_count,
+        # Epoch milliseconds, as chart libraries expect
+        'timestamps': (timestamps * 1000).tolist(),
+        'values': values.tolist()
+    }
+
+
+def to_utc(value: datetime) -> datetime:
+    """Interval timestamps are stored as naive UTC."""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
@@ -0,0 +1,151 @@
+"""Job progress events published by tasks and streamed to API clients."""
+import json
+import os
+import queue
+import threading
+import time
+from typing import Dict, Optional, Set
+from flask import current_app
+import redis
+
+CHANNEL = 'jobs:{}:events'
+CHANNEL_PATTERN = 'jobs:*:events'
+STATUS_KEY = 'jobs:{}:status'
+
+# Bill uploads report queued, received, [classified,] sniffed, extracted,
+# audited, saved (or needs_review); exports report queued, received, exported
+TERMINAL_STATUSES = {'completed', 'failed', 'needs_review'}
+
+# Put on every watcher's queue when the subscription fails; the stream
+# closes and the client reconnects to a restarted listener
+LISTENER_LOST = {'status': 'listener_lost'}
+
+
+def register_job(task_id: str, user_id: int, kind: str) -> None:
+    """Record a job's owner and initial state before it is queued."""
+    publish_progress(task_id, 'queued', owner_id=user_id, kind=kind)
+
+
+def publish_progress(task_id: str, stage: str, status: str = 'running',
+                     owner_id: Optional[int] = None, kind: Optional[str] = None,
+                     **data) -> None:
+    """
+    Store a job's latest state and broadcast it to watchers.
+
+    Failures are logged and swallowed: progress reporting must never fail
+    the job itself.
+    """
+    event = {
+        'task_id': task_id,
+        'stage': stage,
+        'status': status,
+        'timestamp': time.time(),
+        'data': data
+    }
+    fields = {'stage': stage, 'status': status, 'timestamp': event['timestamp'],
+              'data': json.dumps(data, default=str)}
+    if owner_id is not None:
+        fields['owner_id'] = owner_id
+    if kind is not None:
+        fields['kind'] = kind
+
+    try:
+        pipe = current_app.redis.pipeline(transaction=False)
+        pipe.hset(STATUS_KEY.format(task_id), mapping=fields)
+        pipe.expire(STATUS_KEY.format(task_id), current_app.config.get('JOB_STATUS_TTL', 86400))
+        pipe.publish(CHANNEL.format(task_id), json.dumps(event, default=str))
+        pipe.execute()
+    except redis.RedisError as e:
+        current_app.logger.error(f"Error publishing progress for job {task_id}: {str(e)}")
+
+
+def get_job_status(task_id: str) -> Optional[dict]:
+    """Return a job's latest state, or None if unknown or expired."""
+    raw = current_app.redis.hgetall(STATUS_KEY.format(task_id))
+    if not raw:
+        return None
+    status = {k.decode(): v.decode() for k, v in raw.items()}
+    return {
+        'task_id': task_id,
+        'kind': status.get('kind'),
+        'owner_id': int(status['owner_id']) if status.get('owner_id') else None,
+        'stage': status['stage'],
+        'status': status['status'],
+        'timestamp': float(status['timestamp']),
+        'data': json.loads(status.get('data') or '{}')
+    }
+
+
+class ProgressHub:
+    """
+    Fan job events out to local watchers over one Redis subscription.
+
+    Each process holds a single pattern subscription, so the number of Redis
+    connections does not grow with the number of watchers; each watcher gets
+    an in-memory queue.
+    """
+
+    def __init__(self):
+        self._watchers: Dict[str, Set[queue.Queue]] = {}
+        self._lock = threading.Lock()
+        self._pid: Optional[int] = None
+
+    def watch(self, task_id: str, maxsize: int = 100) -> queue.Queue:
+        self._ensure_listener()
+        events: queue.Queue = queue.Queue(maxsize=maxsize)
+        with self._lock:
+            self._watchers.setdefault(task_id, set()).add(events)
+        return events
+
+    def unwatch(self, task_id: str, events: queue.Queue) -> None:
+        with self._lock:
+            watchers = self._watchers.get(task_id)
+            if watchers is not None:
+                watchers.discard(events)
+                if not watchers:
+                    del self._watchers[task_id]
+
+    def _dispatch(self, message: dict) -> None:
+        event = json.loads(message['data'])
+        with self._lock:
+            watchers = list(self._watchers.get(event['task_id'], ()))
+        for events in watchers:
+            try:
+                events.put_nowait(event)
+            except queue.Full:
+                # A stalled client only misses intermediate stages; the
+                # status endpoint always has the latest state
+                pass
+
+    def _ensure_listener(self) -> None:
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        with self._lock:
+            if self._pid == pid:
+                return
+            self._watchers = {}
+            pubsub = current_app.redis.pubsub(ignore_subscribe_messages=True)
+            pubsub.psubscribe(**{CHANNEL_PATTERN: self._dispatch})
+            pubsub.run_in_thread(sleep_time=1.0, daemon=True,
+                                 exception_handler=self._on_listener_error)
+            self._pid = pid
+
+    def _on_listener_error(self, error, pubsub, thread) -> None:
+        thread.stop()
+        with self._lock:
+            watchers = [events for queues in self._watchers.values() for events in queues]
+            self._watchers = {}
+            self._pid = None
+        for events in watchers:
+            # Nothing else fills these queues now; make room in a full one, as
+            # a client about to reconnect re-reads the latest state anyway
+            try:
+                if events.full():
+                    events.get_nowait()
+                events.put_nowait(LISTENER_LOST)
+            except (queue.Empty, queue.Full):
+                pass
+
+
+progress_hub = ProgressHub()
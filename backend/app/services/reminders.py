@@ -0,0 +1,180 @@
+"""
+Bill due-date reminders, delivered as one digest notification per user.
+
+A bill enters a reminder window LEAD days before its due date, for each
+lead in REMINDER_LEAD_DAYS (a negative lead is a day overdue). The job's
+progress is a ReminderState row: the last day whose windows were sent and
+the next time to run. The beat task checks that row and returns at once
+until the fire time passes, and a run then reads only the bills whose
+windows opened since the previous one: for each open status and lead, one
+due-date range of the (status, due_date, id) index, in keyset batches.
+Digests and the new state are committed together, so an interrupted run
+is simply repeated.
+"""
+from datetime import date, datetime, time, timedelta
+from typing import Dict, Iterator, List, Optional, Sequence
+from flask import current_app
+from sqlalchemy import select, tuple_
+from sqlalchemy.exc import IntegrityError
+from .. import db
+from ..models import Account, Bill, LinkedAccountMeter, Meter, Notification, ReminderState, Site, User
+
+STATE_NAME = 'bill_due'
+# Bills that still need paying; rejected bills are never reminded
+OPEN_STATUSES = ('pending', 'approved')
+DIGEST_KIND = 'bill_due_digest'
+# Bills listed in one digest; the totals cover all of them
+DIGEST_MAX_BILLS = 50
+
+
+def lead_days() -> List[int]:
+    """Configured leads, most urgent first so digests list those bills first."""
+    return sorted({int(d) for d in str(current_app.config.get('REMINDER_LEAD_DAYS', '7,1,-1')).split(',')})
+
+
+def next_fire_time(day: date) -> datetime:
+    """When the windows opening the day after ``day`` are sent (naive UTC)."""
+    return datetime.combine(day + timedelta(days=1), time(current_app.config.get('REMINDER_HOUR', 13)))
+
+
+def entering_bills(status: str, first_due: date, last_due: date, batch_size: int) -> Iterator[list]:
+    """
+    Yield batches of (bill id, due date, amount, organization id, account
+    number) for bills with ``status`` due in [first_due, last_due].
+    """
+    query = select(
+        Bill.id, Bill.due_date, Bill.amount, Site.organization_id, Account.number
+    ).select_from(Bill).join(
+        LinkedAccountMeter, LinkedAccountMeter.id == Bill.linked_account_meter_id
+    ).join(
+        Account, Account.id == LinkedAccountMeter.account_id
+    ).join(
+        Meter, Meter.id == LinkedAccountMeter.meter_id
+    ).join(
+        Site, Site.id == Meter.site_id
+    ).where(
+        Bill.status == status,
+        Bill.due_date <= last_due,
+        Bill.is_active.is_(True)
+    ).order_by(Bill.due_date, Bill.id).limit(batch_size)
+
+    batch = query.where(Bill.due_date >= first_due)
+    while True:
+        rows = db.session.execute(batch).all()
+        if not rows:
+            return
+        yield rows
+        if len(rows) < batch_size:
+            return
+        # Row comparison continues the (status, due_date, id) index scan
+        # where this batch stopped
+        batch = query.where(tuple_(Bill.due_date, Bill.id) > tuple_(rows[-1].due_date, rows[-1].id))
+
+
+class _Digest:
+    """Bills entering a window for one organization; only the first few are listed."""
+
+    __slots__ = ('count', 'overdue', 'total', 'bills')
+
+    def __init__(self):
+        self.count = 0
+        self.overdue = 0
+        self.total = 0.0
+        self.bills = []
+
+    def add(self, bill_id: int, due_date: date, amount: float, account_number: str, today: date) -> None:
+        self.count += 1
+        self.overdue += due_date < today
+        self.total += amount
+        if len(self.bills) < DIGEST_MAX_BILLS:
+            self.bills.append({'bill_id': bill_id, 'due_date': due_date.isoformat(), 'amount': amount,
+                               'account_number': account_number, 'days_until_due': (due_date - today).days})
+
+    def title(self) -> str:
+        title = f"{self.count} bill{'s' if self.count != 1 else ''} coming due"
+        return title + (f", {self.overdue} overdue" if self.overdue else '')
+
+    def payload(self) -> dict:
+        return {'count': self.count, 'overdue': self.overdue, 'total_amount': round(self.total, 2),
+                'bills': sorted(self.bills, key=lambda b: (b['due_date'], b['bill_id']))}
+
+
+def collect_digests(first_day: date, last_day: date, today: date, leads: Sequence[int],
+                    batch_size: int = 1000) -> Dict[int, _Digest]:
+    """Digests per organization of the bills whose windows open in [first_day, last_day]."""
+    digests: Dict[int, _Digest] = {}
+    for lead in leads:
+        first_due, last_due = first_day + timedelta(days=lead), last_day + timedelta(days=lead)
+        for status in OPEN_STATUSES:
+            for rows in entering_bills(status, first_due, last_due, batch_size):
+                for bill_id, due_date, amount, organization_id, account_number in rows:
+                    digest = digests.get(organization_id)
+                    if digest is None:
+                        digest = digests[organization_id] = _Digest()
+                    digest.add(bill_id, due_date, amount, account_number, today)
+    return digests
+
+
+def _lock_state(exists: bool, now: datetime) -> Optional[ReminderState]:
+    """Lock the state row, creating it on first use; None if another run holds it."""
+    if not exists:
+        # Start from today rather than replaying every past window
+        db.session.add(ReminderState(name=STATE_NAME, processed_through=now.date() - timedelta(days=1),
+                                     next_fire_at=now))
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+    # populate_existing: the unlocked read may have left a stale copy in the session
+    return ReminderState.query.filter_by(name=STATE_NAME).with_for_update(
+        skip_locked=True).populate_existing().first()
+
+
+def run_reminders(now: Optional[datetime] = None) -> dict:
+    """
+    Send the digests that are due by ``now`` (naive UTC) and move the
+    state forward. Cheap to call often: until the next fire time it reads
+    one row.
+    """
+    now = now or datetime.utcnow()
+    state = ReminderState.query.get(STATE_NAME)
+    if state is not None and state.next_fire_at > now:
+        return {'status': 'idle', 'next_fire_at': state.next_fire_at.isoformat()}
+
+    state = _lock_state(state is not None, now)
+    if state is None:
+        return {'status': 'busy'}
+    if state.next_fire_at > now:
+        # Another run finished between the two reads
+        db.session.rollback()
+        return {'status': 'idle', 'next_fire_at': state.next_fire_at.isoformat()}
+
+    today = now.date()
+    first_day = state.processed_through + timedelta(days=1)
+    digests = collect_digests(first_day, today, today, lead_days(),
+                              current_app.config.get('REMINDER_BATCH_SIZE', 1000)) if first_day <= today else {}
+
+    notifications = []
+    if digests:
+        users = db.session.execute(
+            select(User.id, User.organization_id).where(
+                User.organization_id.in_(list(digests)), User.is_active.is_(True))
+        ).all()
+        messages = {org: (digest.title(), digest.payload()) for org, digest in digests.items()}
+        for user_id, organization_id in users:
+            title, payload = messages[organization_id]
+            notifications.append({'user_id': user_id, 'kind': DIGEST_KIND, 'title': title,
+                                  'payload': payload, 'created_at': now})
+        if notifications:
+            db.session.execute(Notification.__table__.insert(), notifications)
+
+    state.processed_through = max(state.processed_through, today)
+    state.next_fire_at = next_fire_time(today)
+    db.session.commit()
+    return {
+        'status': 'success',
+        'days': max((today - first_day).days + 1, 0),
+        'bills': sum(d.count for d in digests.values()),
+        'notifications': len(notifications),
+        'next_fire_at': state.next_fire_at.isoformat()
+    }
@@ -0,0 +1,264 @@
+"""
+Spend and usage totals for an organization, by site, utility type and meter.
+
+All levels come from one grouped query over bills joined up to their site.
+On PostgreSQL the query uses ROLLUP so the database returns the meter rows
+together with the site and organization subtotals; other databases group
+by meter only and the subtotals are added up here. Results are cached in
+Redis per organization and period, under a generation number bumped after
+any commit that changed the organization's bills or moved its sites or
+meters.
+"""
+import json
+import re
+from datetime import date, timedelta
+from typing import Dict, Optional, Set, Tuple
+import redis
+from flask import current_app, has_app_context
+from sqlalchemy import event, func, inspect, select, tuple_
+from sqlalchemy.orm import Session, object_session
+from .. import db
+from ..models import Bill, LinkedAccountMeter, Meter, Site
+
+SUMMARY_KEY = 'spend:{}:{}:{}:{}'
+GENERATION_KEY = 'spend:{}:gen'
+_CHANGED = 'spend_summary_changed'
+
+_QUARTER = re.compile(r'^(\d{4})-Q([1-4])$')
+_MONTH = re.compile(r'^(\d{4})-(\d{2})$')
+_YEAR = re.compile(r'^(\d{4})$')
+
+
+def parse_period(period: str) -> Tuple[date, date]:
+    """
+    Turn ``2024``, ``2024-Q1`` or ``2024-03`` into inclusive (start, end) dates.
+
+    Raises:
+        ValueError: If the period is not in one of those forms
+    """
+    match = _QUARTER.match(period)
+    if match:
+        year, quarter = int(match.group(1)), int(match.group(2))
+        start = date(year, 3 * quarter - 2, 1)
+        months = 3
+    elif _MONTH.match(period):
+        year, month = map(int, period.split('-'))
+        start = date(year, month, 1)
+        months = 1
+    elif _YEAR.match(period):
+        start = date(int(period), 1, 1)
+        months = 12
+    else:
+        raise ValueError(f'Invalid period: {period}')
+    next_month = start.month - 1 + months
+    end = date(start.year + next_month // 12, next_month % 12 + 1, 1) - timedelta(days=1)
+    return start, end
+
+
+def _totals() -> Dict[str, float]:
+    return {'spend': 0.0, 'usage': 0.0, 'bills': 0}
+
+
+def _add(totals: dict, spend, usage, bills) -> None:
+    totals['spend'] += spend or 0.0
+    totals['usage'] += usage or 0.0
+    totals['bills'] += bills
+
+
+def _summary_query(organization_id: int, start: date, end: date, rollup: bool):
+    group = (tuple_(Site.id, Site.name), Meter.utility_type, tuple_(Meter.id, Meter.number))
+    query = select(
+        Site.id, Site.name, Meter.utility_type, Meter.id, Meter.number,
+        func.sum(Bill.amount), func.sum(Bill.usage_amount), func.count(Bill.id)
+    ).select_from(Bill).join(
+        LinkedAccountMeter, LinkedAccountMeter.id == Bill.linked_account_meter_id
+    ).join(
+        Meter, Meter.id == LinkedAccountMeter.meter_id
+    ).join(
+        Site, Site.id == Meter.site_id
+    ).where(
+        Site.organization_id == organization_id,
+        Bill.bill_date >= start, Bill.bill_date <= end
+    )
+    if rollup:
+        return query.group_by(func.rollup(*group))
+    return query.group_by(Site.id, Site.name, Meter.utility_type, Meter.id, Meter.number)
+
+
+def compute_spend_summary(organization_id: int, start: date, end: date) -> dict:
+    """
+    Run the grouped query and shape its rows into nested totals.
+
+    The query always runs on the primary: generations are bumped when the
+    primary commits, so a summary read from a lagging replica could be
+    cached under a generation that already counts writes it has not seen.
+    """
+    primary = db.engine
+    rollup = primary.dialect.name == 'postgresql'
+    rows = db.session.execute(_summary_query(organization_id, start, end, rollup),
+                              bind_arguments={'bind': primary})
+
+    total = _totals()
+    by_utility: Dict[str, dict] = {}
+    sites: Dict[int, dict] = {}
+    for site_id, site_name, utility_type, meter_id, meter_number, spend, usage, bills in rows:
+        if site_id is None:
+            # ROLLUP grand total
+            _add(total, spend, usage, bills)
+            continue
+        site = sites.get(site_id)
+        if site is None:
+            site = sites[site_id] = {'site_id': site_id, 'name': site_name, **_totals(),
+                                     'utility_types': {}, 'meters': []}
+        if meter_id is not None:
+            site['meters'].append({'meter_id': meter_id, 'number': meter_number,
+                                   'utility_type': utility_type, 'spend': spend or 0.0,
+                                   'usage': usage or 0.0, 'bills': bills})
+            if rollup:
+                continue
+            # Without ROLLUP every subtotal is accumulated from the meter rows
+            _add(site['utility_types'].setdefault(utility_type, _totals()), spend, usage, bills)
+            _add(site, spend, usage, bills)
+            _add(total, spend, usage, bills)
+        elif utility_type is not None:
+            site['utility_types'][utility_type] = {'spend': spend or 0.0, 'usage': usage or 0.0,
+                                                   'bills': bills}
+        else:
+            _add(site, spend, usage, bills)
+
+    for site in sites.values():
+        for utility_type, totals in site['utility_types'].items():
+            _add(by_utility.setdefault(utility_type, _totals()),
+                 totals['spend'], totals['usage'], totals['bills'])
+
+    return {
+        'organization_id': organization_id,
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'total': total,
+        'utility_types': by_utility,
+        'sites': sorted(sites.values(), key=lambda s: s['spend'], reverse=True)
+    }
+
+
+def get_spend_summary(organization_id: int, start: date, end: date) -> dict:
+    """Return the summary from the cache, computing and caching it on a miss."""
+    key = None
+    try:
+        generation = int(current_app.redis.get(GENERATION_KEY.format(organization_id)) or 0)
+        key = SUMMARY_KEY.format(organization_id, generation, start.isoformat(), end.isoformat())
+        cached = current_app.redis.get(key)
+        if cached is not None:
+            return json.loads(cached)
+    except redis.RedisError as e:
+        current_app.logger.error(f"Error reading spend summary cache: {str(e)}")
+
+    summary = compute_spend_summary(organization_id, start, end)
+    if key is not None:
+        try:
+            current_app.redis.setex(key, current_app.config.get('SPEND_SUMMARY_CACHE_TTL', 900),
+                                    json.dumps(summary))
+        except redis.RedisError as e:
+            current_app.logger.error(f"Error writing spend summary cache: {str(e)}")
+    return summary
+
+
+def invalidate_spend_summary(organization_id: Optional[int]) -> None:
+    """Make every cached summary of the organization unreachable."""
+    if organization_id is None:
+        return
+    try:
+        current_app.redis.incr(GENERATION_KEY.format(organization_id))
+    except redis.RedisError as e:
+        current_app.logger.error(f"Error invalidating spend summary cache: {str(e)}")
+
+
+def _touch(target, *organization_ids) -> None:
+    """Remember organizations whose summaries changed, to invalidate them on commit."""
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault(_CHANGED, set()).update(i for i in organization_ids if i is not None)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_committed(session) -> None:
+    # Bumping during the flush would let a concurrent request cache the
+    # pre-commit totals under the new generation
+    changed: Set[int] = session.info.pop(_CHANGED, None)
+    if not changed or not has_app_context():
+        return
+    for organization_id in changed:
+        invalidate_spend_summary(organization_id)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_changed(session) -> None:
+    session.info.pop(_CHANGED, None)
+
+
+def _changed(target, *fields) -> bool:
+    state = inspect(target)
+    return any(state.attrs[field].history.has_changes() for field in fields)
+
+
+def _organization_of(connection, linked_account_meter_id: int) -> Optional[int]:
+    return connection.execute(
+        select(Site.organization_id).join(
+            Meter, Meter.site_id == Site.id
+        ).join(
+            LinkedAccountMeter, LinkedAccountMeter.meter_id == Meter.id
+        ).where(LinkedAccountMeter.id == linked_account_meter_id)
+    ).scalar()
+
+
+def _organization_of_meter(connection, meter_id: int) -> Optional[int]:
+    return connection.execute(
+        select(Site.organization_id).join(Meter, Meter.site_id == Site.id).where(Meter.id == meter_id)
+    ).scalar()
+
+
+def _organization_of_site(connection, site_id: int) -> Optional[int]:
+    return connection.execute(select(Site.organization_id).where(Site.id == site_id)).scalar()
+
+
+# Updates are handled before the row is written, while the database still
+# holds the organization a moved bill, link, meter or site belonged to
+
+@event.listens_for(Bill, 'after_insert')
+@event.listens_for(Bill, 'after_delete')
+def _invalidate_on_bill_change(mapper, connection, target) -> None:
+    _touch(target, _organization_of(connection, target.linked_account_meter_id))
+
+
+@event.listens_for(Bill, 'before_update')
+def _invalidate_on_bill_update(mapper, connection, target) -> None:
+    organization_ids = [_organization_of(connection, target.linked_account_meter_id)]
+    if _changed(target, 'linked_account_meter_id'):
+        organization_ids.append(connection.execute(
+            select(Site.organization_id).join(
+                Meter, Meter.site_id == Site.id
+            ).join(
+                LinkedAccountMeter, LinkedAccountMeter.meter_id == Meter.id
+            ).join(
+                Bill, Bill.linked_account_meter_id == LinkedAccountMeter.id
+            ).where(Bill.id == target.id)
+        ).scalar())
+    _touch(target, *organization_ids)
+
+
+@event.listens_for(Site, 'before_update')
+def _invalidate_on_site_change(mapper, connection, target) -> None:
+    _touch(target, target.organization_id, _organization_of_site(connection, target.id))
+
+
+@event.listens_for(Meter, 'before_update')
+def _invalidate_on_meter_change(mapper, connection, target) -> None:
+    _touch(target, _organization_of_site(connection, target.site_id),
+           _organization_of_meter(connection, target.id))
+
+
+@event.listens_for(LinkedAccountMeter, 'before_update')
+def _invalidate_on_link_change(mapper, connection, target) -> None:
+    if _changed(target, 'meter_id'):
+        _touch(target, _organization_of_meter(connection, target.meter_id),
+               _organization_of(connection, target.id))
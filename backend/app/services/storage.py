@@ -0,0 +1,257 @@
+"""Object storage for uploaded files shared by web and worker processes."""
+import io
+import os
+import shutil
+import tempfile
+import uuid
+from typing import BinaryIO, List, Optional, Tuple
+from werkzeug.utils import secure_filename
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def make_upload_key(filename: str) -> str:
+    """Return a unique storage key that keeps the sanitized original name."""
+    return f"uploads/{uuid.uuid4().hex}/{secure_filename(filename) or 'upload'}"
+
+
+class LocalStorage:
+    """
+    Filesystem stand-in for object storage.
+
+    Keys map to paths under ``root``; point it at a shared volume to run web
+    and worker processes on different hosts without S3.
+    """
+
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+
+    def _path(self, key: str) -> str:
+        path = os.path.abspath(os.path.join(self.root, key))
+        if not path.startswith(self.root + os.sep):
+            raise ValueError(f"Invalid storage key: {key}")
+        return path
+
+    def put_stream(self, key: str, stream: BinaryIO, content_type: Optional[str] = None) -> int:
+        """Copy ``stream`` to ``key`` in chunks and return the number of bytes written."""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temporary name so readers never see a partial object
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.part-')
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                shutil.copyfileobj(stream, out, CHUNK_SIZE)
+                size = out.tell()
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        return size
+
+    def open(self, key: str) -> BinaryIO:
+        return open(self._path(key), 'rb')
+
+    def size(self, key: str) -> int:
+        return os.path.getsize(self._path(key))
+
+    def delete(self, key: str) -> None:
+        try:
+            os.unlink(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    # Multipart uploads: parts are kept as separate files until completion
+
+    def _parts_dir(self, upload_id: str) -> str:
+        return self._path(os.path.join('.multipart', secure_filename(upload_id)))
+
+    def create_multipart(self, key: str, content_type: Optional[str] = None) -> str:
+        upload_id = uuid.uuid4().hex
+        os.makedirs(self._parts_dir(upload_id))
+        return upload_id
+
+    def upload_part(self, key: str, upload_id: str, part_number: int, stream: BinaryIO) -> str:
+        """Store one part (replacing any earlier attempt) and return its ETag."""
+        path = os.path.join(self._parts_dir(upload_id), f'{part_number:05d}')
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.part-')
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                shutil.copyfileobj(stream, out, CHUNK_SIZE)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        return f'{part_number:05d}'
+
+    def complete_multipart(self, key: str, upload_id: str, parts: List[Tuple[int, str]]) -> None:
+        """Assemble ``parts`` (part number, ETag) in order into ``key``."""
+        parts_dir = self._parts_dir(upload_id)
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.part-')
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                for _, etag in sorted(parts):
+                    with open(os.path.join(parts_dir, etag), 'rb') as part:
+                        shutil.copyfileobj(part, out, CHUNK_SIZE)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        shutil.rmtree(parts_dir, ignore_errors=True)
+
+    def abort_multipart(self, key: str, upload_id: str) -> None:
+        shutil.rmtree(self._parts_dir(upload_id), ignore_errors=True)
+
+
+class S3RangeReader(io.RawIOBase):
+    """Seekable read-only view of an S3 object that fetches byte ranges on demand."""
+
+    def __init__(self, client, bucket: str, key: str):
+        self.client = client
+        self.bucket = bucket
+        self.key = key
+        self.length = client.head_object(Bucket=bucket, Key=key)['ContentLength']
+        self.position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self.position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            self.position = offset
+        elif whence == io.SEEK_CUR:
+            self.position += offset
+        elif whence == io.SEEK_END:
+            self.position = self.length + offset
+        else:
+            raise ValueError(f"Invalid whence: {whence}")
+        return self.position
+
+    def readinto(self, buffer) -> int:
+        if self.position >= self.length or len(buffer) == 0:
+            return 0
+        end = min(self.position + len(buffer), self.length) - 1
+        response = self.client.get_object(
+            Bucket=self.bucket, Key=self.key, Range=f'bytes={self.position}-{end}'
+        )
+        data = response['Body'].read()
+        buffer[:len(data)] = data
+        self.position += len(data)
+        return len(data)
+
+    def readall(self) -> bytes:
+        # One request for the remainder instead of many small ranges
+        if self.position >= self.length:
+            return b''
+        response = self.client.get_object(
+            Bucket=self.bucket, Key=self.key, Range=f'bytes={self.position}-'
+        )
+        data = response['Body'].read()
+        self.position += len(data)
+        return data
+
+
+class S3Storage:
+    """S3 (or any S3-compatible service such as MinIO via ``endpoint_url``)."""
+
+    def __init__(self, bucket: str, endpoint_url: Optional[str] = None,
+                 read_buffer_size: int = CHUNK_SIZE):
+        self.bucket = bucket
+        self.endpoint_url = endpoint_url
+        self.read_buffer_size = read_buffer_size
+        self._client = None
+
+    @property
+    def client(self):
+        """S3 client, imported and constructed lazily to keep startup cheap."""
+        if self._client is None:
+            import boto3
+            self._client = boto3.client('s3', endpoint_url=self.endpoint_url)
+        return self._client
+
+    def put_stream(self, key: str, stream: BinaryIO, content_type: Optional[str] = None) -> int:
+        """Stream ``stream`` to ``key`` (multipart for large bodies) and return its size."""
+        from boto3.s3.transfer import TransferConfig
+
+        counter = _CountingReader(stream)
+        extra = {'ServerSideEncryption': 'AES256'}
+        if content_type:
+            extra['ContentType'] = content_type
+        self.client.upload_fileobj(
+            counter, self.bucket, key, ExtraArgs=extra,
+            Config=TransferConfig(multipart_chunksize=8 * CHUNK_SIZE, max_concurrency=4)
+        )
+        return counter.size
+
+    def open(self, key: str) -> BinaryIO:
+        return io.BufferedReader(S3RangeReader(self.client, self.bucket, key),
+                                 buffer_size=self.read_buffer_size)
+
+    def size(self, key: str) -> int:
+        return self.client.head_object(Bucket=self.bucket, Key=key)['ContentLength']
+
+    def delete(self, key: str) -> None:
+        self.client.delete_object(Bucket=self.bucket, Key=key)
+
+    # Multipart uploads map directly onto S3's; parts other than the last
+    # must be at least 5 MiB
+
+    def create_multipart(self, key: str, content_type: Optional[str] = None) -> str:
+        extra = {'ServerSideEncryption': 'AES256'}
+        if content_type:
+            extra['ContentType'] = content_type
+        response = self.client.create_multipart_upload(Bucket=self.bucket, Key=key, **extra)
+        return response['UploadId']
+
+    def upload_part(self, key: str, upload_id: str, part_number: int, stream: BinaryIO) -> str:
+        """Upload one part from a seekable stream and return its ETag."""
+        response = self.client.upload_part(
+            Bucket=self.bucket, Key=key, UploadId=upload_id,
+            PartNumber=part_number, Body=stream
+        )
+        return response['ETag']
+
+    def complete_multipart(self, key: str, upload_id: str, parts: List[Tuple[int, str]]) -> None:
+        self.client.complete_multipart_upload(
+            Bucket=self.bucket, Key=key, UploadId=upload_id,
+            MultipartUpload={'Parts': [
+                {'PartNumber': number, 'ETag': etag} for number, etag in sorted(parts)
+            ]}
+        )
+
+    def abort_multipart(self, key: str, upload_id: str) -> None:
+        self.client.abort_multipart_upload(Bucket=self.bucket, Key=key, UploadId=upload_id)
+
+
+class _CountingReader:
+    """File-like wrapper that counts the bytes read through it."""
+
+    def __init__(self, stream: BinaryIO):
+        self.stream = stream
+        self.size = 0
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.stream.read(size)
+        self.size += len(data)
+        return data
+
+
+def create_storage(config):
+    """Build the storage backend selected by ``STORAGE_BACKEND``."""
+    backend = config.get('STORAGE_BACKEND', 'local')
+    if backend == 'local':
+        return LocalStorage(config['STORAGE_LOCAL_ROOT'])
+    if backend == 's3':
+        return S3Storage(
+            config['STORAGE_BUCKET'],
+            endpoint_url=config.get('STORAGE_ENDPOINT_URL'),
+            read_buffer_size=config.get('STORAGE_READ_BUFFER', CHUNK_SIZE)
+        )
+    raise ValueError(f"Unknown STORAGE_BACKEND: {backend}")
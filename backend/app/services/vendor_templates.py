@@ -0,0 +1,203 @@
+"""
+Region-based field extraction from vendor PDF bills.
+
+A template is a JSON file named after ``Vendor.code`` in VENDOR_TEMPLATE_DIR:
+
+    {
+        "vendor_code": "ACME",
+        "fields": {
+            "amount": {"page": 0, "bbox": [400, 120, 580, 150],
+                       "pattern": "\\$?([\\d,]+\\.\\d{2})", "type": "amount"},
+            "due_date": {"page": 0, "anchor": "Payment Due",
+                         "search_bbox": [0, 150, 612, 400],
+                         "offset": [0, 0, 220, 18],
+                         "pattern": "(\\d{2}/\\d{2}/\\d{4})", "type": "date",
+                         "date_formats": ["%m/%d/%Y"]}
+        }
+    }
+
+``bbox`` is (x0, top, x1, bottom) in PDF points. With ``anchor`` the region is
+``offset`` relative to the top-left corner of the first match of the anchor
+text within ``search_bbox``, so fields follow layouts that shift vertically
+inside that band. Only the regions named by a template are extracted, and
+anchors are looked up in their band, never in the full page text.
+"""
+import json
+import os
+import re
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+DEFAULT_DATE_FORMATS = ('%m/%d/%Y', '%m/%d/%y', '%Y-%m-%d', '%b %d, %Y', '%B %d, %Y')
+FIELD_TYPES = {'amount', 'number', 'date', 'text'}
+
+
+class TemplateError(ValueError):
+    """Raised for invalid templates or documents a template cannot read."""
+
+
+class FieldSpec(NamedTuple):
+    name: str
+    page: int
+    pattern: 're.Pattern'
+    type: str
+    bbox: Optional[Tuple[float, float, float, float]] = None
+    anchor: Optional[str] = None
+    offset: Optional[Tuple[float, float, float, float]] = None
+    search_bbox: Optional[Tuple[float, float, float, float]] = None
+    date_formats: Tuple[str, ...] = DEFAULT_DATE_FORMATS
+    required: bool = True
+
+
+def _convert(spec: FieldSpec, raw: str) -> Any:
+    raw = raw.strip()
+    if spec.type in ('amount', 'number'):
+        value = raw.replace('$', '').replace(',', '')
+        # Statements print credits as "(12.50)" or "12.50CR"
+        negative = value.startswith('(') and value.endswith(')') or value.upper().endswith('CR')
+        value = float(value.strip('()').upper().rstrip('CR').strip())
+        return -value if negative else value
+    if spec.type == 'date':
+        for date_format in spec.date_formats:
+            try:
+                return datetime.strptime(raw, date_format).date()
+            except ValueError:
+                continue
+        raise TemplateError(f"Field {spec.name}: unrecognised date {raw!r}")
+    return raw
+
+
+def _clamp(page, region: Tuple[float, float, float, float]) -> Tuple[float, float, float, float]:
+    # Clamp to the page so slightly generous regions still work
+    x0, top, x1, bottom = region
+    return (max(x0, 0), max(top, 0), min(x1, page.width), min(bottom, page.height))
+
+
+class VendorTemplate:
+    """A compiled template; patterns and regions are resolved once at load time."""
+
+    def __init__(self, vendor_code: str, fields: List[FieldSpec]):
+        self.vendor_code = vendor_code
+        self.fields = fields
+        self.pages: Dict[int, List[FieldSpec]] = {}
+        for spec in fields:
+            self.pages.setdefault(spec.page, []).append(spec)
+
+    @classmethod
+    def compile(cls, definition: Dict[str, Any]) -> 'VendorTemplate':
+        vendor_code = definition.get('vendor_code')
+        if not vendor_code:
+            raise TemplateError('Template is missing vendor_code')
+        fields = []
+        for name, field in definition.get('fields', {}).items():
+            field_type = field.get('type', 'text')
+            if field_type not in FIELD_TYPES:
+                raise TemplateError(f"{vendor_code}.{name}: unknown type {field_type}")
+            if ('bbox' in field) == ('anchor' in field):
+                raise TemplateError(f"{vendor_code}.{name}: set exactly one of bbox or anchor")
+            if 'anchor' in field and 'search_bbox' not in field:
+                raise TemplateError(f"{vendor_code}.{name}: an anchor needs a search_bbox")
+            try:
+                pattern = re.compile(field.get('pattern', r'(.+)'), re.IGNORECASE | re.DOTALL)
+            except re.error as e:
+                raise TemplateError(f"{vendor_code}.{name}: invalid pattern: {e}")
+            if pattern.groups < 1:
+                raise TemplateError(f"{vendor_code}.{name}: pattern needs a capture group")
+            fields.append(FieldSpec(
+                name=name,
+                page=int(field.get('page', 0)),
+                pattern=pattern,
+                type=field_type,
+                bbox=tuple(field['bbox']) if 'bbox' in field else None,
+                anchor=field.get('anchor'),
+                offset=tuple(field.get('offset', (0, 0, 200, 20))),
+                search_bbox=tuple(field['search_bbox']) if 'search_bbox' in field else None,
+                date_formats=tuple(field.get('date_formats', DEFAULT_DATE_FORMATS)),
+                required=field.get('required', True)
+            ))
+        return cls(vendor_code, fields)
+
+    def _region(self, page, spec: FieldSpec) -> Optional[Tuple[float, float, float, float]]:
+        if spec.bbox is not None:
+            return spec.bbox
+        # Searching the whole page would build its full text map
+        matches = page.crop(_clamp(page, spec.search_bbox)).search(spec.anchor, regex=False, case=False)
+        if not matches:
+            return None
+        x, y = matches[0]['x0'], matches[0]['top']
+        dx0, dy0, dx1, dy1 = spec.offset
+        return (x + dx0, y + dy0, x + dx1, y + dy1)
+
+    def extract(self, pdf) -> Dict[str, Any]:
+        """
+        Extract all fields from an open pdfplumber document.
+
+        Raises:
+            TemplateError: If a required field cannot be found or parsed
+        """
+        values: Dict[str, Any] = {}
+        for page_number, specs in self.pages.items():
+            page = pdf.pages[page_number] if page_number < len(pdf.pages) else None
+            for spec in specs:
+                region = self._region(page, spec) if page is not None else None
+                match = None
+                if region is not None:
+                    text = page.within_bbox(_clamp(page, region)).extract_text() or ''
+                    match = spec.pattern.search(text)
+                if match is None:
+                    if spec.required:
+                        raise TemplateError(f"{self.vendor_code}: field {spec.name} not found")
+                    continue
+                values[spec.name] = _convert(spec, match.group(1))
+        return values
+
+
+class TemplateRegistry:
+    """Loads templates from a directory on first use and keeps them compiled."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._templates: Optional[Dict[str, VendorTemplate]] = None
+        self._lock = threading.Lock()
+
+    def _load(self) -> Dict[str, VendorTemplate]:
+        templates = {}
+        if os.path.isdir(self.directory):
+            for name in sorted(os.listdir(self.directory)):
+                if not name.endswith('.json') or name.startswith('_'):
+                    continue
+                with open(os.path.join(self.directory, name)) as f:
+                    template = VendorTemplate.compile(json.load(f))
+                templates[template.vendor_code] = template
+        return templates
+
+    def _compiled(self) -> Dict[str, VendorTemplate]:
+        templates = self._templates
+        if templates is None:
+            with self._lock:
+                if self._templates is None:
+                    self._templates = self._load()
+                templates = self._templates
+        return templates
+
+    def get(self, vendor_code: Optional[str]) -> Optional[VendorTemplate]:
+        return self._compiled().get(vendor_code) if vendor_code else None
+
+    def codes(self) -> List[str]:
+        return sorted(self._compiled())
+
+    def reload(self) -> None:
+        with self._lock:
+            self._templates = None
+
+
+_registries: Dict[str, TemplateRegistry] = {}
+
+
+def get_template_registry(directory: str) -> TemplateRegistry:
+    """Return the process-wide registry for ``directory``."""
+    registry = _registries.get(directory)
+    if registry is None:
+        registry = _registries.setdefault(directory, TemplateRegistry(directory))
+    return registry
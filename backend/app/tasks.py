@@ -1,15 +1,74 @@
-from typing import Dict, Any
+from typing import Dict, Any, Optional
+from datetime import date, datetime
+from flask import current_app
 from . import celery
-from .services.bill_processor import BillProcessor
-from .models import Bill, BillAudit, ExportLog
+from .celery_app import (
+    PARSE_QUEUE, PARSE_BULK_QUEUE, INTERACTIVE_PRIORITY, BULK_PRIORITY
+)
+from .models import Bill, BillAudit, BillReview, ExportLog, IntervalData, User
+from .services.progress import publish_progress
 from app import db
 
-@celery.task
-def process_bill_file(file_path: str, linked_account_meter_id: int) -> Dict[str, Any]:
-    """Process a bill file asynchronously"""
+@celery.task(bind=True)
+def process_bill_file(self, storage_key: str, linked_account_meter_id: Optional[int],
+                      mime_type: Optional[str] = None, uploaded_by: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Process a bill file asynchronously, reading it from object storage.
+
+    Without a linked account meter the bill is classified first; files the
+    classifier is not confident about are saved as a BillReview for the
+    uploader's organization and processed again once it is resolved.
+    """
+    # Imported here so web processes that only enqueue never load parsers
+    from .services.bill_processor import BillProcessor
+    from .services.bill_classifier import classify_bill
+    from .services.file_inspection import SNIFF_BYTES, sniff_mime
+    from .services.anomaly import detect_bill_anomalies
+
+    task_id = self.request.id
+    publish_progress(task_id, 'received')
     try:
-        with open(file_path, 'rb') as file:
-            processor = BillProcessor(file, linked_account_meter_id)
+        with current_app.storage.open(storage_key) as file:
+            vendor_code = None
+            if linked_account_meter_id is None:
+                if mime_type is None:
+                    mime_type = sniff_mime(file.read(SNIFF_BYTES))
+                    file.seek(0)
+                # Only the uploader's organization's accounts can match
+                uploader = User.query.get(uploaded_by) if uploaded_by is not None else None
+                organization_id = uploader.organization_id if uploader else None
+                result = classify_bill(file, mime_type, organization_id)
+                if (result.linked_account_meter_id is None
+                        or result.confidence < current_app.config['CLASSIFIER_MIN_CONFIDENCE']):
+                    details = {
+                        'storage_key': storage_key,
+                        'confidence': round(result.confidence, 2),
+                        'vendor_code': result.vendor_code,
+                        'account_id': result.account_id,
+                        'candidates': list(result.candidates)
+                    }
+                    review = BillReview(
+                        storage_key=storage_key, mime_type=mime_type, task_id=task_id,
+                        uploaded_by=uploaded_by, organization_id=organization_id,
+                        confidence=details['confidence'], vendor_code=result.vendor_code,
+                        account_id=result.account_id, candidates=details['candidates']
+                    )
+                    db.session.add(review)
+                    db.session.commit()
+                    details['review_id'] = review.id
+                    publish_progress(task_id, 'needs_review', status='needs_review', **details)
+                    return {'status': 'needs_review', **details}
+                linked_account_meter_id = result.linked_account_meter_id
+                vendor_code = result.vendor_code
+                publish_progress(task_id, 'classified', vendor_code=vendor_code,
+                                 linked_account_meter_id=linked_account_meter_id,
+                                 confidence=round(result.confidence, 2))
+
+            processor = BillProcessor(
+                file, linked_account_meter_id, storage_key=storage_key, mime_type=mime_type,
+                vendor_code=vendor_code,
+                on_stage=lambda stage, **data: publish_progress(task_id, stage, **data)
+            )
             bill, audits = processor.process()
 
             # Save bill and audits to database
@@ -17,22 +76,46 @@ def process_bill_file(file_path: str, linked_account_meter_id: int) -> Dict[str,
             for audit in audits:
                 audit.bill = bill
                 db.session.add(audit)
+            db.session.flush()
+            alerts = detect_bill_anomalies(bill)
             db.session.commit()
+            publish_progress(task_id, 'saved', status='completed',
+                             bill_id=bill.id, audit_count=len(audits), alert_count=len(alerts))
 
             return {
                 'status': 'success',
                 'bill_id': bill.id,
-                'audit_count': len(audits)
+                'audit_count': len(audits),
+                'alert_count': len(alerts)
             }
     except Exception as e:
+        db.session.rollback()
+        publish_progress(task_id, 'failed', status='failed', error=str(e))
         return {
             'status': 'error',
             'error': str(e)
         }
 
-@celery.task
-def export_bills_to_accounting(bill_ids: list) -> Dict[str, Any]:
+def enqueue_bill_file(storage_key: str, linked_account_meter_id: Optional[int], bulk: bool = False,
+                      task_id: Optional[str] = None, mime_type: Optional[str] = None,
+                      uploaded_by: Optional[int] = None):
+    """Queue a bill file for parsing in the interactive or the bulk lane"""
+    kwargs = {'mime_type': mime_type, 'uploaded_by': uploaded_by}
+    if bulk:
+        return process_bill_file.apply_async(
+            (storage_key, linked_account_meter_id), kwargs, task_id=task_id,
+            queue=PARSE_BULK_QUEUE, priority=BULK_PRIORITY
+        )
+    return process_bill_file.apply_async(
+        (storage_key, linked_account_meter_id), kwargs, task_id=task_id,
+        queue=PARSE_QUEUE, priority=INTERACTIVE_PRIORITY
+    )
+
+@celery.task(bind=True)
+def export_bills_to_accounting(self, bill_ids: list) -> Dict[str, Any]:
     """Export bills to accounting system"""
+    task_id = self.request.id
+    publish_progress(task_id, 'received', bill_count=len(bill_ids))
     try:
         bills = Bill.query.filter(Bill.id.in_(bill_ids)).all()
         
@@ -49,29 +132,185 @@ def export_bills_to_accounting(bill_ids: list) -> Dict[str, Any]:
             db.session.add(export_log)
         
         db.session.commit()
+        publish_progress(task_id, 'exported', status='completed', exported_count=len(bills))
         
         return {
             'status': 'success',
             'exported_count': len(bills)
         }
     except Exception as e:
+        db.session.rollback()
+        publish_progress(task_id, 'failed', status='failed', error=str(e))
         return {
             'status': 'error',
             'error': str(e)
         }
 
-@celery.task
-def process_interval_data(meter_id: int, data_file_path: str) -> Dict[str, Any]:
-    """Process interval data for a meter"""
+@celery.task(bind=True)
+def export_columnar(self, datasets: list, fmt: str = 'parquet', organization_id: Optional[int] = None,
+                    start: Optional[str] = None, end: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Export interval data and/or bills as Parquet or Arrow IPC files,
+    partitioned by meter and month, under exports/<task id>/ in storage.
+    """
+    # pyarrow is only loaded by the workers that run exports
+    from .services.columnar_export import export_dataset
+
+    task_id = self.request.id
+    prefix = f'exports/{task_id}'
+    start_date = date.fromisoformat(start) if start else None
+    end_date = date.fromisoformat(end) if end else None
+    publish_progress(task_id, 'received', datasets=datasets, format=fmt)
+    try:
+        results = {}
+        for name in datasets:
+            results[name] = export_dataset(
+                name, prefix, fmt, organization_id, start_date, end_date,
+                on_progress=lambda rows, name=name: publish_progress(task_id, 'exporting', dataset=name, rows=rows)
+            )
+            publish_progress(task_id, 'exported', dataset=name, **results[name])
+        publish_progress(task_id, 'completed', status='completed', prefix=prefix)
+        return {
+            'status': 'success',
+            'prefix': prefix,
+            'datasets': results
+        }
+    except Exception as e:
+        publish_progress(task_id, 'failed', status='failed', error=str(e))
+        return {
+            'status': 'error',
+            'error': str(e)
+        }
+
+# Out-of-order interval readings deleted per statement (bound parameter limits)
+LATE_DELETE_BATCH = 500
+
+# Re-running replaces the same time ranges, so a redelivery after a worker
+# crash is safe; other tasks create rows or files and are acked on receipt
+@celery.task(acks_late=True, reject_on_worker_lost=True)
+def process_interval_data(meter_id: int, data_file_path: str, unit: str = 'kWh',
+                          cadence: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Ingest a CSV of interval readings (``timestamp,value`` columns) for a meter.
+
+    The file is read from object storage in batches. Each batch is checked
+    and gap-filled as arrays, replaces any stored readings in its time
+    range, and is written with one bulk insert. Readings that fall before an
+    earlier batch (an unsorted file) replace stored readings at their own
+    timestamps only, and are counted as ``out_of_order``.
+    """
+    # Imported here so web processes that only enqueue never load them
+    import numpy as np
+    import pandas as pd
+    from .services.interval_quality import ACTUAL, check_batch, infer_cadence, last_good
+    from .services.anomaly import detect_interval_anomalies
+
+    totals: Dict[str, int] = {}
+    previous = None
+    table = IntervalData.__table__
+
+    def rows(result):
+        times = result.timestamps.astype('datetime64[s]').tolist()
+        return times, [
+            {'meter_id': meter_id, 'timestamp': t, 'value': v, 'unit': unit, 'quality_flag': f}
+            for t, v, f in zip(times, result.values.tolist(), result.flags.tolist())
+        ]
+
     try:
-        # Implementation for processing interval data
-        # This would parse and store interval readings
+        with current_app.storage.open(data_file_path) as file:
+            for chunk in pd.read_csv(file, usecols=['timestamp', 'value'],
+                                     chunksize=current_app.config.get('INTERVAL_BATCH_SIZE', 50000)):
+                stamps = pd.to_datetime(chunk['timestamp'], utc=True, errors='coerce', format='ISO8601')
+                values = pd.to_numeric(chunk['value'], errors='coerce')
+                parsed = (stamps.notna() & values.notna()).to_numpy()
+                totals['unparsable'] = totals.get('unparsable', 0) + int((~parsed).sum())
+                timestamps = stamps[parsed].dt.tz_localize(None).to_numpy().astype('datetime64[s]').astype(np.int64)
+                if cadence is None and timestamps.size:
+                    # Inferred once so every batch is held to the same cadence
+                    cadence = infer_cadence(timestamps)
+
+                result = check_batch(
+                    timestamps, values[parsed].to_numpy(dtype=np.float64), cadence, previous,
+                    max_fill=current_app.config.get('INTERVAL_MAX_FILL', 96),
+                    linear_fill=current_app.config.get('INTERVAL_LINEAR_FILL', 4)
+                )
+                for key, count in result.counts.items():
+                    totals[key] = totals.get(key, 0) + count
+                if result.late is not None:
+                    # A range delete here would also drop the readings an
+                    # earlier batch wrote between these
+                    late_times, late_rows = rows(result.late)
+                    for start in range(0, len(late_times), LATE_DELETE_BATCH):
+                        db.session.execute(table.delete().where(
+                            table.c.meter_id == meter_id,
+                            table.c.timestamp.in_(late_times[start:start + LATE_DELETE_BATCH])
+                        ))
+                    db.session.execute(table.insert(), late_rows)
+                if result.timestamps.size == 0:
+                    db.session.commit()
+                    continue
+                previous = last_good(result) or previous
+
+                times, batch_rows = rows(result)
+                # Re-ingesting a period replaces what was stored for it
+                db.session.execute(table.delete().where(
+                    table.c.meter_id == meter_id,
+                    table.c.timestamp >= times[0],
+                    table.c.timestamp <= times[-1]
+                ))
+                db.session.execute(table.insert(), batch_rows)
+                # Estimated readings fill gaps with a guess; only actual ones
+                # describe the meter's usage
+                actual = result.flags == ACTUAL
+                alerts = detect_interval_anomalies(meter_id, result.timestamps[actual], result.values[actual])
+                totals['alerts'] = totals.get('alerts', 0) + len(alerts)
+                db.session.commit()
+
         return {
             'status': 'success',
-            'meter_id': meter_id
+            'meter_id': meter_id,
+            'cadence': cadence,
+            **totals
         }
     except Exception as e:
+        db.session.rollback()
         return {
             'status': 'error',
             'error': str(e)
         }
+
+@celery.task
+def send_due_date_reminders() -> Dict[str, Any]:
+    """
+    Run by beat every REMINDER_CHECK_INTERVAL seconds; sends bill due-date
+    digests once their fire time has passed and is a single-row read
+    otherwise.
+    """
+    from .services.reminders import run_reminders
+
+    try:
+        return run_reminders()
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Error sending due-date reminders: {str(e)}")
+        return {
+            'status': 'error',
+            'error': str(e)
+        }
+
+@celery.task(ignore_result=True)
+def persist_login_attempt(user_id: int, succeeded: bool, attempted_at: str,
+                          failed_attempts: int, locked_until: Optional[str]) -> None:
+    """Write login attempt state tracked in Redis back to the user row"""
+    values = {
+        'last_login_attempt': datetime.fromisoformat(attempted_at),
+        'failed_login_attempts': failed_attempts
+    }
+    if locked_until:
+        values['account_locked_until'] = datetime.fromisoformat(locked_until)
+    # Attempts can be persisted out of order; never move the timestamp back
+    User.query.filter(
+        User.id == user_id,
+        (User.last_login_attempt.is_(None)) | (User.last_login_attempt <= values['last_login_attempt'])
+    ).update(values, synchronize_session=False)
+    db.session.commit()
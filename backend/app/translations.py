@@ -1,14 +1,15 @@
-from flask import request, g
+from flask import request
 from flask_babel import Babel
-from app import db
-from app.models import User
 
 babel = Babel()
 
 def get_locale():
-    # Try to get language from user settings
-    if hasattr(g, 'current_user') and g.current_user and g.current_user.language:
-        return g.current_user.language
+    # Try to get language from user settings (imported here because this
+    # module is loaded before the models)
+    from app.principal import get_current_user
+    user = get_current_user(optional=True)
+    if user and user.get('language'):
+        return user['language']
     
     # Try to get language from request header
     header_lang = request.headers.get('Accept-Language')
@@ -0,0 +1,114 @@
+"""Interactive task latency during a bulk backfill.
+
+Uses a stand-in task that sleeps for a fixed "parse" time, so no database or
+sample bills are needed. Two layouts are compared:
+
+* shared: everything on one queue, default prefetch, no priorities
+  (the previous configuration)
+* routed: configure_task_routing() with interactive uploads on 'parse' at
+  high priority, the backfill on 'parse_bulk', plus one reserved worker
+  that only consumes 'parse'
+
+Requires Redis (REDIS_URL, default redis://localhost:6379/14); workers are
+started as subprocesses.
+
+    python benchmarks/bench_queue_latency.py --backfill 400 --interactive 30
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from celery import Celery
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.celery_app import (  # noqa: E402
+    configure_task_routing, PARSE_QUEUE, PARSE_BULK_QUEUE, INTERACTIVE_PRIORITY, BULK_PRIORITY
+)
+
+REDIS_URL = os.environ.get('REDIS_URL', 'redis://localhost:6379/14')
+LAYOUT = os.environ.get('BENCH_LAYOUT', 'shared')
+
+celery = Celery('bench', broker=REDIS_URL, backend=REDIS_URL)
+if LAYOUT == 'routed':
+    configure_task_routing(celery)
+
+
+@celery.task(name='bench.parse')
+def parse(enqueued_at: float, work_seconds: float) -> float:
+    """Return queue wait time, then simulate parsing."""
+    waited = time.time() - enqueued_at
+    time.sleep(work_seconds)
+    return waited
+
+
+def start_workers(layout, concurrency):
+    env = dict(os.environ, BENCH_LAYOUT=layout, REDIS_URL=REDIS_URL)
+    base = [sys.executable, '-m', 'celery', '-A', 'bench_queue_latency.celery', 'worker',
+            '-P', 'prefork', '--loglevel', 'WARNING']
+    if layout == 'routed':
+        commands = [base + ['-Q', f'{PARSE_QUEUE},{PARSE_BULK_QUEUE}', '-c', str(concurrency), '-n', 'parse@%h'],
+                    base + ['-Q', PARSE_QUEUE, '-c', '1', '-n', 'interactive@%h']]
+    else:
+        # Same total process count as the routed layout
+        commands = [base + ['-c', str(concurrency + 1), '-n', 'shared@%h']]
+    cwd = os.path.dirname(os.path.abspath(__file__))
+    return [subprocess.Popen(cmd, cwd=cwd, env=env) for cmd in commands]
+
+
+def submit(interactive, work_seconds):
+    args = (time.time(), work_seconds)
+    if LAYOUT != 'routed':
+        return parse.apply_async(args)
+    if interactive:
+        return parse.apply_async(args, queue=PARSE_QUEUE, priority=INTERACTIVE_PRIORITY)
+    return parse.apply_async(args, queue=PARSE_BULK_QUEUE, priority=BULK_PRIORITY)
+
+
+def run(layout, args):
+    global LAYOUT
+    LAYOUT = layout
+    if layout == 'routed':
+        configure_task_routing(celery)
+    celery.connection_for_write().default_channel.client.flushdb()
+
+    workers = start_workers(layout, args.concurrency)
+    try:
+        time.sleep(5)
+        for _ in range(args.backfill):
+            submit(False, args.work)
+        results = []
+        for _ in range(args.interactive):
+            results.append(submit(True, args.work))
+            time.sleep(args.interval)
+        waits = sorted(r.get(timeout=600) for r in results)
+        p95 = waits[int(len(waits) * 0.95) - 1]
+        print(f'{layout:<10}{statistics.median(waits) * 1000:>12.0f}{p95 * 1000:>12.0f}'
+              f'{max(waits) * 1000:>12.0f}')
+    finally:
+        for worker in workers:
+            worker.terminate()
+        for worker in workers:
+            worker.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--backfill', type=int, default=400)
+    parser.add_argument('--interactive', type=int, default=30)
+    parser.add_argument('--interval', type=float, default=0.5)
+    parser.add_argument('--work', type=float, default=0.2)
+    parser.add_argument('--concurrency', type=int, default=4)
+    args = parser.parse_args()
+
+    print(f"{'layout':<10}{'p50 ms':>12}{'p95 ms':>12}{'max ms':>12}")
+    # 'shared' must run first: routing cannot be unapplied from the producer
+    for layout in ('shared', 'routed'):
+        run(layout, args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""Compare the legacy sorted-set rate limiter with the GCRA limiter.
+
+Requires a running Redis (REDIS_URL, default redis://localhost:6379/15).
+The database is flushed before each scenario.
+
+    python benchmarks/bench_rate_limit.py --requests 20000 --clients 50
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+import redis
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.security.rate_limiter import RateLimiter  # noqa: E402
+
+
+def legacy_hit(client, key, limit, window):
+    """The previous four-command pipeline from middleware.rate_limit."""
+    current = time.time()
+    pipe = client.pipeline()
+    pipe.zremrangebyscore(key, 0, current - window)
+    pipe.zcard(key)
+    pipe.zadd(key, {str(current): current})
+    pipe.expire(key, window)
+    results = pipe.execute()
+    return results[1] < limit
+
+
+def run(name, hit, keys, total):
+    start = time.perf_counter()
+    allowed = 0
+    for _ in range(total):
+        allowed += bool(hit(random.choice(keys)))
+    elapsed = time.perf_counter() - start
+    return name, total / elapsed, elapsed / total * 1e6, allowed
+
+
+def memory(client, pattern):
+    return sum(client.memory_usage(k) or 0 for k in client.scan_iter(pattern))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=20000)
+    parser.add_argument('--clients', type=int, default=50)
+    parser.add_argument('--limit', type=int, default=100)
+    parser.add_argument('--window', type=int, default=60)
+    args = parser.parse_args()
+
+    client = redis.Redis.from_url(os.environ.get('REDIS_URL', 'redis://localhost:6379/15'))
+    keys = [f'10.0.0.{i}:bench' for i in range(args.clients)]
+    results = []
+
+    client.flushdb()
+    results.append(run('legacy zset pipeline',
+                       lambda k: legacy_hit(client, f'rate_limit:{k}', args.limit, args.window),
+                       keys, args.requests) + (memory(client, 'rate_limit:*'),))
+
+    client.flushdb()
+    gcra = RateLimiter(client, args.limit, args.window, prefilter=False)
+    results.append(run('gcra script', lambda k: gcra.hit(k)[0], keys, args.requests)
+                   + (memory(client, 'rate_limit:*'),))
+
+    client.flushdb()
+    prefiltered = RateLimiter(client, args.limit, args.window, prefilter=True)
+    results.append(run('gcra + local pre-filter', lambda k: prefiltered.hit(k)[0],
+                       keys, args.requests) + (memory(client, 'rate_limit:*'),))
+
+    print(f"{'scenario':<26}{'req/s':>12}{'us/req':>10}{'allowed':>10}{'redis bytes':>14}")
+    for name, rps, latency, allowed, mem in results:
+        print(f"{name:<26}{rps:>12.0f}{latency:>10.1f}{allowed:>10}{mem:>14}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+"""Per-run cost of the due-date reminder scheduler as the bill table grows.
+
+Bills are loaded in steps up to --bills. A fixed number per day (--per-day)
+fall due around the benchmarked days; every other bill is history due long
+before them. After each step the scheduler is run for --days consecutive
+days, then checked while idle, and compared with a naive scan of every
+open bill. Run and idle times should stay flat while the scan grows.
+
+The schema is dropped and recreated, so point it at a scratch database:
+
+    python benchmarks/bench_reminders.py --database-url postgresql://localhost/bench_reminders \\
+        --bills 10000000 --per-day 2000 --days 5
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from sqlalchemy import delete, select, text  # noqa: E402
+from app import create_app, db  # noqa: E402
+from app.models import (Account, Bill, CostCenter, LinkedAccountMeter, Meter, Notification,  # noqa: E402
+                        Organization, ReminderState, Site, User)
+from app.services.reminders import OPEN_STATUSES, run_reminders  # noqa: E402
+from config import Config  # noqa: E402
+
+FIRST_DAY = date(2026, 3, 2)
+STATUSES = ('pending', 'approved', 'rejected')
+
+
+def seed_hierarchy(organizations):
+    """One site, meter, account and link per organization, plus two users each."""
+    ids = range(1, organizations + 1)
+    tables = [
+        (Organization, [{'id': i, 'name': f'Org {i}'} for i in ids]),
+        (Site, [{'id': i, 'name': f'Site {i}', 'organization_id': i} for i in ids]),
+        (Meter, [{'id': i, 'number': f'M{i:07d}', 'site_id': i, 'utility_type': 'electricity'} for i in ids]),
+        (CostCenter, [{'id': i, 'name': f'CC {i}'} for i in ids]),
+        (Account, [{'id': i, 'number': f'A{i:07d}', 'cost_center_id': i} for i in ids]),
+        (LinkedAccountMeter, [{'id': i, 'account_id': i, 'meter_id': i, 'start_date': date(2015, 1, 1)}
+                              for i in ids]),
+        (User, [{'email': f'user{i}-{j}@example.com', 'password_hash': '-', 'name': f'User {i}-{j}',
+                 'organization_id': i, 'role': 'user'} for i in ids for j in range(2)]),
+    ]
+    for model, rows in tables:
+        db.session.execute(model.__table__.insert(), rows)
+    db.session.commit()
+
+
+def load_bills(count, due_dates, organizations, rng, chunk=50000):
+    """Insert ``count`` bills whose due dates are drawn from ``due_dates()``."""
+    table = Bill.__table__
+    for offset in range(0, count, chunk):
+        rows = []
+        for _ in range(min(chunk, count - offset)):
+            due = due_dates()
+            rows.append({'linked_account_meter_id': rng.randint(1, organizations),
+                         'bill_date': due - timedelta(days=30), 'due_date': due,
+                         'amount': round(rng.uniform(10, 5000), 2), 'status': rng.choice(STATUSES),
+                         'source_type': 'import', 'is_active': True})
+        db.session.execute(table.insert(), rows)
+        db.session.commit()
+
+
+def timed(fn, repeat=1):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - start) / repeat, result
+
+
+def measure(days):
+    """Time scheduled runs over ``days`` days, an idle check and a naive scan."""
+    db.session.execute(delete(ReminderState))
+    db.session.execute(delete(Notification))
+    db.session.commit()
+    runs = []
+    for day in range(days):
+        elapsed, result = timed(lambda: run_reminders(datetime.combine(FIRST_DAY + timedelta(days=day),
+                                                                       datetime.min.time()).replace(hour=13)))
+        runs.append((elapsed, result['bills']))
+    last = datetime.combine(FIRST_DAY + timedelta(days=days - 1), datetime.min.time()).replace(hour=13, minute=1)
+    idle, _ = timed(lambda: run_reminders(last), repeat=100)
+    scan, rows = timed(lambda: len(db.session.execute(
+        select(Bill.id, Bill.due_date, Bill.amount).where(Bill.status.in_(OPEN_STATUSES))).all()))
+    return runs, idle, scan, rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', default='sqlite:////tmp/bench_reminders.db')
+    parser.add_argument('--bills', type=int, default=10_000_000)
+    parser.add_argument('--per-day', type=int, default=2000)
+    parser.add_argument('--days', type=int, default=5)
+    parser.add_argument('--organizations', type=int, default=1000)
+    args = parser.parse_args()
+
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = args.database_url
+        SQLALCHEMY_REPLICA_URI = None
+        REMINDER_LEAD_DAYS = '7,1,-1'
+
+    app = create_app(BenchConfig)
+    rng = random.Random(42)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        seed_hierarchy(args.organizations)
+
+        # Bills due on every day a run can reach: the benchmarked days plus the leads
+        window = [FIRST_DAY + timedelta(days=d) for d in range(-1, args.days + 7)]
+        load_bills(args.per_day * len(window), lambda: rng.choice(window), args.organizations, rng)
+        loaded = args.per_day * len(window)
+        history_end = (FIRST_DAY - timedelta(days=60)).toordinal()
+
+        steps = [n for n in (10 ** k for k in range(4, 9)) if loaded < n < args.bills] + [args.bills]
+        print(f"{'bills':>12} {'per run':>10} {'bills/run':>10} {'idle check':>11} {'full scan':>10} {'open rows':>10}")
+        for target in steps:
+            load_bills(max(target - loaded, 0), lambda: date.fromordinal(history_end - rng.randrange(3650)),
+                       args.organizations, rng)
+            loaded = max(target, loaded)
+            if db.engine.dialect.name == 'postgresql':
+                db.session.execute(text('ANALYZE bill'))
+                db.session.commit()
+            runs, idle, scan, rows = measure(args.days)
+            per_run = sum(t for t, _ in runs) / len(runs)
+            per_run_bills = sum(n for _, n in runs) // len(runs)
+            print(f"{loaded:>12,} {per_run * 1000:>8.1f}ms {per_run_bills:>10,} {idle * 1000:>9.2f}ms "
+                  f"{scan * 1000:>8.0f}ms {rows:>10,}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""Microbenchmark of response sanitization on a 10k-bill payload.
+
+    python benchmarks/bench_sanitizer.py --bills 10000 --repeat 3
+"""
+import argparse
+import copy
+import os
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.schemas import BillSchema  # noqa: E402
+from app.security.sanitizer import ResponseSanitizer, SafeFields, clean_markup, safe_fields_from_schema  # noqa: E402
+
+
+def legacy_sanitize(d: dict) -> dict:
+    """The previous recursive sanitizer from middleware.sanitize_response."""
+    for key, value in d.items():
+        if isinstance(value, str):
+            d[key] = clean_markup(value)
+        elif isinstance(value, dict):
+            d[key] = legacy_sanitize(value)
+        elif isinstance(value, list):
+            d[key] = [legacy_sanitize(i) if isinstance(i, dict)
+                      else clean_markup(i) if isinstance(i, str)
+                      else i for i in value]
+    return d
+
+
+def make_payload(n: int) -> dict:
+    random.seed(42)
+    start = date(2023, 1, 1)
+    bills = []
+    for i in range(n):
+        bill_date = start + timedelta(days=i % 365)
+        bills.append({
+            'id': i,
+            'linked_account_meter_id': random.randint(1, 500),
+            'bill_date': bill_date.isoformat(),
+            'due_date': (bill_date + timedelta(days=30)).isoformat(),
+            'amount': round(random.uniform(10, 5000), 2),
+            'status': random.choice(['pending', 'approved', 'rejected']),
+            'source_type': random.choice(['PDF', 'Excel', 'XML']),
+            'file_path': f'uploads/{i:08x}/bill_{i}.pdf',
+            'usage_amount': round(random.uniform(100, 90000), 1),
+            'created_at': datetime(2023, 1, 1, 12, 0).isoformat(),
+            'audits': [
+                {'id': i * 2, 'bill_id': i, 'audit_type': 'amount_validation',
+                 'status': 'passed', 'message': 'Amount must be positive',
+                 'created_at': datetime(2023, 1, 1, 12, 0).isoformat()},
+                {'id': i * 2 + 1, 'bill_id': i, 'audit_type': 'date_validation',
+                 'status': 'passed', 'message': 'Due date must be after bill date',
+                 'created_at': datetime(2023, 1, 1, 12, 0).isoformat()},
+            ],
+            # A small share of user-influenced text that does need cleaning
+            'notes': '<b>Estimated</b> read & adjusted' if i % 50 == 0 else 'Actual read',
+        })
+    return {'bills': bills}
+
+
+def timed(fn, payload, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        data = copy.deepcopy(payload)
+        start = time.perf_counter()
+        fn(data)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--bills', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    payload = make_payload(args.bills)
+    schema = BillSchema()
+    # Safe keys apply to the records under the 'bills' envelope key
+    safe = SafeFields(nested={'bills': safe_fields_from_schema(schema)})
+
+    scenarios = [
+        ('legacy bleach on every string', legacy_sanitize),
+        ('fast path + memo', ResponseSanitizer().sanitize),
+        ('fast path + memo + safe fields', ResponseSanitizer(safe).sanitize),
+    ]
+    expected = legacy_sanitize(copy.deepcopy(payload))
+    baseline = None
+    for name, fn in scenarios:
+        assert fn(copy.deepcopy(payload)) == expected, f'{name} changed the output'
+        elapsed = timed(fn, payload, args.repeat)
+        baseline = baseline or elapsed
+        print(f'{name:<34}{elapsed * 1000:>10.1f} ms{baseline / elapsed:>8.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""Compare memory per worker and throughput across Gunicorn serving modes.
+
+Starts Gunicorn with gunicorn.conf.py for each mode, measures each worker's
+unique (USS) and proportional (PSS) memory from /proc/<pid>/smaps_rollup
+(Linux only), then drives an endpoint with concurrent keep-alive clients.
+
+    python benchmarks/bench_serving.py --workers 4 --seconds 15 --path /api/languages
+"""
+import argparse
+import http.client
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+# Gunicorn trusts this from 127.0.0.1, as from a TLS-terminating proxy;
+# without it Talisman answers every request with a redirect to HTTPS
+HEADERS = {'X-Forwarded-Proto': 'https'}
+
+MODES = {
+    'sync, no preload': {'GUNICORN_WORKER_CLASS': 'sync', 'GUNICORN_PRELOAD': 'false'},
+    'sync, preload': {'GUNICORN_WORKER_CLASS': 'sync', 'GUNICORN_PRELOAD': 'true'},
+    'gthread, preload': {'GUNICORN_WORKER_CLASS': 'gthread', 'GUNICORN_PRELOAD': 'true'},
+    'gevent, preload': {'GUNICORN_WORKER_CLASS': 'gevent', 'GUNICORN_PRELOAD': 'true'},
+}
+
+
+def worker_pids(master_pid):
+    with open(f'/proc/{master_pid}/task/{master_pid}/children') as f:
+        return [int(pid) for pid in f.read().split()]
+
+
+def memory_kb(pid):
+    values = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[0].rstrip(':') in ('Pss', 'Private_Clean', 'Private_Dirty'):
+                values[parts[0].rstrip(':')] = int(parts[1])
+    return values['Private_Clean'] + values['Private_Dirty'], values['Pss']
+
+
+def wait_ready(port, path, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            conn.request('GET', path, headers=HEADERS)
+            response = conn.getresponse()
+            response.read()
+            if response.status != 200:
+                raise RuntimeError(f'{path} returned {response.status}')
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError('server did not become ready')
+
+
+def load(port, path, seconds, clients):
+    counts = [0] * clients
+    stop = time.time() + seconds
+
+    def client(i):
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+        while time.time() < stop:
+            conn.request('GET', path, headers=HEADERS)
+            conn.getresponse().read()
+            counts[i] += 1
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return sum(counts) / seconds
+
+
+def run_mode(name, env_overrides, args):
+    env = dict(os.environ, GUNICORN_WORKERS=str(args.workers),
+               GUNICORN_BIND=f'127.0.0.1:{args.port}', **env_overrides)
+    proc = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:app'],
+                            cwd=BACKEND_DIR, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_ready(args.port, args.path)
+        # Warm every worker before measuring memory
+        load(args.port, args.path, 2, args.clients)
+        pids = worker_pids(proc.pid)
+        usage = [memory_kb(pid) for pid in pids]
+        uss = sum(u for u, _ in usage) / len(usage) / 1024
+        pss = sum(p for _, p in usage) / len(usage) / 1024
+        rps = load(args.port, args.path, args.seconds, args.clients)
+        print(f'{name:<20}{len(pids):>8}{uss:>12.1f}{pss:>12.1f}{rps:>12.0f}')
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        proc.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--clients', type=int, default=32)
+    parser.add_argument('--seconds', type=int, default=15)
+    parser.add_argument('--port', type=int, default=5055)
+    parser.add_argument('--path', default='/api/languages')
+    parser.add_argument('--modes', nargs='*', default=list(MODES))
+    args = parser.parse_args()
+
+    print(f"{'mode':<20}{'workers':>8}{'USS MiB':>12}{'PSS MiB':>12}{'req/s':>12}")
+    for name in args.modes:
+        run_mode(name, MODES[name], args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""Measure import time and RSS of loading wsgi.py.
+
+Runs each measurement in a fresh interpreter and reports wall time, peak
+RSS, the slowest imports (from -X importtime) and whether any of the heavy
+parsing/cloud libraries were loaded by a web process.
+
+    python benchmarks/bench_startup.py --runs 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+HEAVY_MODULES = ['pandas', 'numpy', 'pdfplumber', 'magic', 'xmltodict', 'boto3', 'botocore']
+
+PROBE = f"""
+import json, resource, sys, time
+start = time.perf_counter()
+import wsgi
+elapsed = time.perf_counter() - start
+print(json.dumps({{
+    'seconds': elapsed,
+    'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    'heavy': [m for m in {HEAVY_MODULES!r} if m in sys.modules],
+}}))
+"""
+
+
+def probe():
+    out = subprocess.run([sys.executable, '-c', PROBE], cwd=BACKEND_DIR,
+                         capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def slowest_imports(limit):
+    out = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import wsgi'],
+                         cwd=BACKEND_DIR, capture_output=True, text=True, check=True)
+    rows = []
+    for line in out.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative_us, name = (f.strip() for f in line[len('import time:'):].split('|'))
+        rows.append((int(cumulative_us), int(self_us), name))
+    return sorted(rows, reverse=True)[:limit]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=15)
+    args = parser.parse_args()
+
+    results = [probe() for _ in range(args.runs)]
+    seconds = [r['seconds'] for r in results]
+    rss = [r['max_rss_kb'] / 1024 for r in results]
+    print(f"import wsgi: median {statistics.median(seconds) * 1000:.0f} ms "
+          f"(min {min(seconds) * 1000:.0f} ms), peak RSS {statistics.median(rss):.1f} MiB")
+    print(f"heavy modules loaded: {', '.join(results[0]['heavy']) or 'none'}")
+
+    print(f"\n{'cumulative ms':>14}{'self ms':>10}  module")
+    for cumulative_us, self_us, name in slowest_imports(args.top):
+        print(f"{cumulative_us / 1000:>14.1f}{self_us / 1000:>10.1f}  {name}")
+
+
+if __name__ == '__main__':
+    main()
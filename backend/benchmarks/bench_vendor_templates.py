@@ -0,0 +1,170 @@
+"""Per-document extraction latency: vendor templates vs full-text regex scanning.
+
+The baseline extracts the full text of every page and runs every vendor's
+patterns over it, which is what field extraction without templates amounts
+to. The template path crops only the regions the matching template names.
+
+Without --corpus a synthetic corpus of multi-page statements is generated
+(no PDF library needed); with --corpus DIR --template-dir DIR --vendor CODE
+the PDFs in DIR are read with that vendor's template. Requires pdfplumber.
+
+    python benchmarks/bench_vendor_templates.py --documents 50 --pages 4 --vendors 40
+"""
+import argparse
+import glob
+import os
+import re
+import statistics
+import sys
+import tempfile
+import time
+
+import pdfplumber
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.services.vendor_templates import (  # noqa: E402
+    VendorTemplate, get_template_registry, TemplateError
+)
+
+SYNTHETIC_TEMPLATE = {
+    'vendor_code': 'SYNTH',
+    'fields': {
+        'bill_date': {'page': 0, 'anchor': 'Statement Date', 'offset': [0, -2, 260, 14],
+                      'pattern': r'Statement Date:\s*(\d{2}/\d{2}/\d{4})', 'type': 'date'},
+        'due_date': {'page': 0, 'anchor': 'Payment Due', 'offset': [0, -2, 260, 14],
+                     'pattern': r'Payment Due:\s*(\d{2}/\d{2}/\d{4})', 'type': 'date'},
+        'amount': {'page': 0, 'bbox': [360, 90, 580, 130],
+                   'pattern': r'\$\s*([\d,]+\.\d{2})', 'type': 'amount'},
+        'usage_amount': {'page': 0, 'anchor': 'Total Usage', 'offset': [0, -2, 260, 14],
+                         'pattern': r'Total Usage:\s*([\d,.]+)', 'type': 'number'},
+    }
+}
+
+
+def _pdf_escape(text):
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+def write_pdf(path, pages):
+    """Write a minimal PDF; ``pages`` is a list of [(x, top, text), ...]."""
+    objects = ['<< /Type /Catalog /Pages 2 0 R >>', None,
+               '<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>']
+    kids = []
+    for lines in pages:
+        stream = ''.join(f'BT /F1 10 Tf {x} {792 - top - 10} Td ({_pdf_escape(text)}) Tj ET\n'
+                         for x, top, text in lines)
+        objects.append(f'<< /Length {len(stream)} >>\nstream\n{stream}endstream')
+        objects.append(f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] '
+                       f'/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>')
+        kids.append(f'{len(objects)} 0 R')
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>"
+
+    out = bytearray(b'%PDF-1.4\n')
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f'{number} 0 obj\n{body}\nendobj\n'.encode('latin-1')
+    xref = len(out)
+    out += f'xref\n0 {len(objects) + 1}\n0000000000 65535 f \n'.encode()
+    for offset in offsets:
+        out += f'{offset:010d} 00000 n \n'.encode()
+    out += f'trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n'.encode()
+    with open(path, 'wb') as f:
+        f.write(out)
+
+
+def generate_corpus(directory, documents, pages):
+    paths = []
+    for i in range(documents):
+        first = [
+            (40, 40, 'Synthetic Power & Light'),
+            (40, 100, f'Statement Date: 01/{1 + i % 28:02d}/2024'),
+            (40, 120, f'Payment Due: 02/{1 + i % 28:02d}/2024'),
+            (400, 105, f'Amount Due $ {1000 + i * 7.31:,.2f}'),
+            (40, 160, f'Total Usage: {5000 + i * 13}'),
+            (40, 180, f'Account Number: 12-{i:06d}-9'),
+        ]
+        # Line items fill the rest of each page, as on real statements
+        line_items = [(40, top, f'Line item {top} delivery charge kWh {top * 3.1:.2f} rate 0.{top:04d}')
+                      for top in range(220, 760, 14)]
+        document = [first + line_items] + [line_items] * (pages - 1)
+        path = os.path.join(directory, f'bill_{i:04d}.pdf')
+        write_pdf(path, document)
+        paths.append(path)
+    return paths
+
+
+def fulltext_patterns(vendors):
+    """Field patterns for many vendors, as a template-less parser would carry."""
+    patterns = []
+    for v in range(vendors):
+        patterns += [re.compile(rf'Vendor{v} Statement Date:\s*(\d{{2}}/\d{{2}}/\d{{4}})'),
+                     re.compile(rf'Vendor{v} Payment Due:\s*(\d{{2}}/\d{{2}}/\d{{4}})'),
+                     re.compile(rf'Vendor{v} Amount Due\s*\$\s*([\d,]+\.\d{{2}})')]
+    # The matching vendor's own patterns come last
+    patterns += [re.compile(field['pattern'], re.IGNORECASE | re.DOTALL)
+                 for field in SYNTHETIC_TEMPLATE['fields'].values()]
+    return patterns
+
+
+def time_fulltext(path, patterns):
+    start = time.perf_counter()
+    with pdfplumber.open(path) as pdf:
+        text = '\n'.join(page.extract_text() or '' for page in pdf.pages)
+    for pattern in patterns:
+        pattern.search(text)
+    return time.perf_counter() - start
+
+
+def time_template(path, template):
+    start = time.perf_counter()
+    with pdfplumber.open(path) as pdf:
+        template.extract(pdf)
+    return time.perf_counter() - start
+
+
+def report(name, samples):
+    samples = sorted(samples)
+    p95 = samples[max(int(len(samples) * 0.95) - 1, 0)]
+    print(f'{name:<12}{statistics.median(samples) * 1000:>12.2f}{p95 * 1000:>12.2f}'
+          f'{sum(samples):>12.2f}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--corpus', help='directory of PDFs (default: generate one)')
+    parser.add_argument('--template-dir', help='template directory for --corpus')
+    parser.add_argument('--vendor', help='vendor code of the --corpus documents')
+    parser.add_argument('--documents', type=int, default=50)
+    parser.add_argument('--pages', type=int, default=4)
+    parser.add_argument('--vendors', type=int, default=40, help='vendors scanned by the baseline')
+    args = parser.parse_args()
+
+    if args.corpus:
+        paths = sorted(glob.glob(os.path.join(args.corpus, '*.pdf')))
+        template = get_template_registry(args.template_dir).get(args.vendor)
+        if template is None:
+            parser.error(f'no template for vendor {args.vendor} in {args.template_dir}')
+    else:
+        paths = generate_corpus(tempfile.mkdtemp(prefix='bills-'), args.documents, args.pages)
+        template = VendorTemplate.compile(SYNTHETIC_TEMPLATE)
+    patterns = fulltext_patterns(args.vendors)
+
+    fulltext, templated, failures = [], [], 0
+    for path in paths:
+        fulltext.append(time_fulltext(path, patterns))
+        try:
+            templated.append(time_template(path, template))
+        except TemplateError:
+            failures += 1
+
+    print(f'{len(paths)} documents, {len(patterns)} baseline patterns, {failures} template misses')
+    print(f"{'method':<12}{'p50 ms':>12}{'p95 ms':>12}{'total s':>12}")
+    report('full text', fulltext)
+    if templated:
+        report('template', templated)
+
+
+if __name__ == '__main__':
+    main()
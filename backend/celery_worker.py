@@ -0,0 +1,18 @@
+"""Celery worker entry point.
+
+Each queue gets its own worker type (see the Procfile):
+
+    celery -A celery_worker.celery worker -Q parse,parse_bulk -P prefork
+    celery -A celery_worker.celery worker -Q parse -P prefork          # reserved for uploads
+    celery -A celery_worker.celery worker -Q export,celery -P threads
+    celery -A celery_worker.celery worker -Q ingest -P prefork
+
+Periodic tasks (due-date reminders) need exactly one beat process:
+
+    celery -A celery_worker.celery beat
+"""
+import app
+from app import create_app
+
+flask_app = create_app()
+celery = app.celery
@@ -9,8 +9,96 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or \
         'sqlite:///' + os.path.join(basedir, 'app.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 10)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 20)),
+        'pool_pre_ping': os.environ.get('DB_POOL_PRE_PING', 'true').lower() == 'true',
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 1800))
+    }
+    # Read replica used by read-only GET endpoints (disabled when unset)
+    SQLALCHEMY_REPLICA_URI = os.environ.get('DATABASE_REPLICA_URL')
+    SQLALCHEMY_REPLICA_ENGINE_OPTIONS = {
+        'pool_size': int(os.environ.get('DB_REPLICA_POOL_SIZE', 20)),
+        'max_overflow': int(os.environ.get('DB_REPLICA_MAX_OVERFLOW', 20)),
+        'pool_pre_ping': os.environ.get('DB_REPLICA_POOL_PRE_PING', 'true').lower() == 'true',
+        'pool_recycle': int(os.environ.get('DB_REPLICA_POOL_RECYCLE', 1800))
+    }
+    REPLICA_STICKY_SECONDS = int(os.environ.get('REPLICA_STICKY_SECONDS', 5))
+    REPLICA_MAX_LAG_SECONDS = float(os.environ.get('REPLICA_MAX_LAG_SECONDS', 2.0))
+    REPLICA_LAG_CHECK_INTERVAL = float(os.environ.get('REPLICA_LAG_CHECK_INTERVAL', 1.0))
     JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY') or 'jwt-secret-string'
     AWS_ACCESS_KEY_ID = os.environ.get('AWS_ACCESS_KEY_ID')
     AWS_SECRET_ACCESS_KEY = os.environ.get('AWS_SECRET_ACCESS_KEY')
     S3_BUCKET_NAME = os.environ.get('S3_BUCKET_NAME')
     UPLOAD_FOLDER = os.path.join(basedir, 'uploads')
+    # Uploaded files: 'local' (directory, use a shared volume across hosts)
+    # or 's3' (set STORAGE_ENDPOINT_URL for MinIO and other S3-compatible stores)
+    STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'local')
+    STORAGE_LOCAL_ROOT = os.environ.get('STORAGE_LOCAL_ROOT') or UPLOAD_FOLDER
+    STORAGE_BUCKET = os.environ.get('STORAGE_BUCKET') or S3_BUCKET_NAME
+    STORAGE_ENDPOINT_URL = os.environ.get('STORAGE_ENDPOINT_URL')
+    STORAGE_READ_BUFFER = int(os.environ.get('STORAGE_READ_BUFFER', 1024 * 1024))
+    # Resumable chunked uploads (parts are at least 5 MiB for S3)
+    UPLOAD_PART_SIZE = int(os.environ.get('UPLOAD_PART_SIZE', 8 * 1024 * 1024))
+    UPLOAD_MAX_SIZE = int(os.environ.get('UPLOAD_MAX_SIZE', 1024 * 1024 * 1024))
+    UPLOAD_SESSION_TTL = int(os.environ.get('UPLOAD_SESSION_TTL', 86400))
+    # PDF field extraction templates, one <Vendor.code>.json per vendor
+    VENDOR_TEMPLATE_DIR = os.environ.get('VENDOR_TEMPLATE_DIR') or os.path.join(basedir, 'vendor_templates')
+    # Vendor/account classification of bills uploaded without an account meter
+    CLASSIFIER_MIN_CONFIDENCE = float(os.environ.get('CLASSIFIER_MIN_CONFIDENCE', 0.8))
+    CLASSIFIER_INDEX_TTL = int(os.environ.get('CLASSIFIER_INDEX_TTL', 300))
+    CLASSIFIER_PAGES = int(os.environ.get('CLASSIFIER_PAGES', 1))
+    # Interval data ingest: CSV rows per batch and gap estimation limits
+    INTERVAL_BATCH_SIZE = int(os.environ.get('INTERVAL_BATCH_SIZE', 50000))
+    INTERVAL_MAX_FILL = int(os.environ.get('INTERVAL_MAX_FILL', 96))
+    INTERVAL_LINEAR_FILL = int(os.environ.get('INTERVAL_LINEAR_FILL', 4))
+    # Unusual-usage alerts: EWMA smoothing, z-score threshold and the number
+    # of observations a slot needs before it can alert
+    ANOMALY_ALPHA = float(os.environ.get('ANOMALY_ALPHA', 0.1))
+    ANOMALY_Z_THRESHOLD = float(os.environ.get('ANOMALY_Z_THRESHOLD', 5.0))
+    ANOMALY_WARMUP = int(os.environ.get('ANOMALY_WARMUP', 8))
+    ANOMALY_BILL_ALPHA = float(os.environ.get('ANOMALY_BILL_ALPHA', 0.3))
+    ANOMALY_BILL_Z_THRESHOLD = float(os.environ.get('ANOMALY_BILL_Z_THRESHOLD', 3.0))
+    ANOMALY_BILL_WARMUP = int(os.environ.get('ANOMALY_BILL_WARMUP', 3))
+    # In-memory rate schedule / account link resolution for bulk jobs
+    EFFECTIVE_DATE_INDEX_TTL = int(os.environ.get('EFFECTIVE_DATE_INDEX_TTL', 300))
+    # Organization spend summaries are cached per (organization, period)
+    SPEND_SUMMARY_CACHE_TTL = int(os.environ.get('SPEND_SUMMARY_CACHE_TTL', 900))
+    # Columnar exports: rows per Parquet row group (also the fetch size),
+    # meter ranges read in parallel and partition files uploaded in parallel
+    EXPORT_ROW_GROUP_SIZE = int(os.environ.get('EXPORT_ROW_GROUP_SIZE', 131072))
+    EXPORT_PARALLELISM = int(os.environ.get('EXPORT_PARALLELISM', 4))
+    EXPORT_UPLOAD_CONCURRENCY = int(os.environ.get('EXPORT_UPLOAD_CONCURRENCY', 8))
+    # Bill due-date reminder digests: days before the due date (negative is
+    # overdue), the UTC hour they are sent and how often beat checks
+    REMINDER_LEAD_DAYS = os.environ.get('REMINDER_LEAD_DAYS', '7,1,-1')
+    REMINDER_HOUR = int(os.environ.get('REMINDER_HOUR', 13))
+    REMINDER_CHECK_INTERVAL = int(os.environ.get('REMINDER_CHECK_INTERVAL', 60))
+    REMINDER_BATCH_SIZE = int(os.environ.get('REMINDER_BATCH_SIZE', 1000))
+    REDIS_URL = os.environ.get('REDIS_URL') or 'redis://localhost:6379/0'
+    CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL') or REDIS_URL
+    CELERY_RESULT_BACKEND = os.environ.get('CELERY_RESULT_BACKEND') or REDIS_URL
+    # Seconds before the Redis broker redelivers an unacknowledged task;
+    # keep it above the longest export
+    CELERY_VISIBILITY_TIMEOUT = int(os.environ.get('CELERY_VISIBILITY_TIMEOUT', 6 * 60 * 60))
+    API_KEY_HASH_SECRET = os.environ.get('API_KEY_HASH_SECRET')
+    API_KEY_CACHE_TTL = int(os.environ.get('API_KEY_CACHE_TTL', 60))
+    API_KEY_CACHE_SIZE = int(os.environ.get('API_KEY_CACHE_SIZE', 10000))
+    USER_PROFILE_CACHE_TTL = int(os.environ.get('USER_PROFILE_CACHE_TTL', 30))
+    # Login throttling (tracked in Redis) and password hashing pool
+    LOGIN_MAX_FAILED_ATTEMPTS = int(os.environ.get('LOGIN_MAX_FAILED_ATTEMPTS', 5))
+    LOGIN_FAILURE_WINDOW = int(os.environ.get('LOGIN_FAILURE_WINDOW', 900))
+    LOGIN_LOCKOUT_SECONDS = int(os.environ.get('LOGIN_LOCKOUT_SECONDS', 900))
+    LOGIN_THROTTLE_SECONDS = float(os.environ.get('LOGIN_THROTTLE_SECONDS', 2))
+    LOGIN_HASH_WORKERS = int(os.environ.get('LOGIN_HASH_WORKERS', os.cpu_count() or 1))
+    LOGIN_HASH_QUEUE_DEPTH = int(os.environ.get('LOGIN_HASH_QUEUE_DEPTH', 4 * (os.cpu_count() or 1)))
+    LOGIN_HASH_TIMEOUT = float(os.environ.get('LOGIN_HASH_TIMEOUT', 5.0))
+    SECURITY_LOG_FILE = os.environ.get('SECURITY_LOG_FILE', 'security.log')
+    AUDIT_LOG_QUEUE_SIZE = int(os.environ.get('AUDIT_LOG_QUEUE_SIZE', 10000))
+    # Records buffered for the spill file once the audit queue is full
+    AUDIT_LOG_OVERFLOW_SIZE = int(os.environ.get('AUDIT_LOG_OVERFLOW_SIZE', 1000))
+    SECURITY_LOG_SPILL_FILE = os.environ.get('SECURITY_LOG_SPILL_FILE', 'security-spill.log')
+    # Background job status (Redis) and Server-Sent Events streams
+    JOB_STATUS_TTL = int(os.environ.get('JOB_STATUS_TTL', 86400))
+    JOB_EVENTS_KEEPALIVE = int(os.environ.get('JOB_EVENTS_KEEPALIVE', 15))
+    JOB_EVENTS_MAX_DURATION = int(os.environ.get('JOB_EVENTS_MAX_DURATION', 600))
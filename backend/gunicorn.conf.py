@@ -0,0 +1,73 @@
+"""Production Gunicorn settings.
+
+The app is preloaded once in the master so imported code and read-only data
+are shared copy-on-write between workers; ``post_fork`` then rebuilds
+everything that must not be shared (database pools, Redis connections, AWS
+clients, the audit log listener thread).
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+The default gevent worker serves each request on a greenlet, so the
+long-lived job progress streams (/api/jobs/<id>/events) cost a greenlet
+each rather than a thread and thousands can stay open per node without
+starving other requests. Password hashing still runs on native threads
+(see security/login_guard.py).
+
+Environment:
+    GUNICORN_WORKER_CLASS  gevent (default), gthread or sync
+    GUNICORN_WORKERS       worker processes (default depends on worker class)
+    GUNICORN_THREADS       threads per gthread worker (default 4)
+    GUNICORN_CONNECTIONS   concurrent connections per gevent worker (default 1000)
+    GUNICORN_PRELOAD       set to "false" to import the app in each worker
+"""
+import os
+
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gevent')
+
+if worker_class == 'gevent':
+    # Patch before the app is preloaded so every module sees cooperative I/O
+    from gevent import monkey
+    monkey.patch_all()
+
+
+def _cpu_count() -> int:
+    # Respect CPU affinity (containers) where available
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+_cpus = _cpu_count()
+_default_workers = {
+    'sync': 2 * _cpus + 1,        # one request per process
+    'gthread': _cpus + 1,         # threads cover I/O waits
+    'gevent': _cpus,              # one event loop per core
+}.get(worker_class, 2 * _cpus + 1)
+
+bind = os.environ.get('GUNICORN_BIND', f"0.0.0.0:{os.environ.get('PORT', '5000')}")
+workers = int(os.environ.get('GUNICORN_WORKERS', _default_workers))
+threads = int(os.environ.get('GUNICORN_THREADS', 4)) if worker_class == 'gthread' else 1
+worker_connections = int(os.environ.get('GUNICORN_CONNECTIONS', 1000))
+preload_app = os.environ.get('GUNICORN_PRELOAD', 'true').lower() == 'true'
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+graceful_timeout = 30
+keepalive = 5
+# Recycle workers periodically to bound memory growth; jitter avoids all
+# workers restarting at once
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 5000))
+max_requests_jitter = max_requests // 10
+
+accesslog = '-'
+errorlog = '-'
+
+
+def post_fork(server, worker):
+    if worker_class == 'gevent':
+        from psycogreen.gevent import patch_psycopg
+        patch_psycopg()
+
+    if preload_app:
+        from app import reinit_after_fork
+        reinit_after_fork(server.app.wsgi())
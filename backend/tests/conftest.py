@@ -0,0 +1,61 @@
+import fakeredis
+import pytest
+import redis
+from flask.testing import FlaskClient
+from app import create_app, db as _db
+from config import Config
+
+
+def make_config(tmp_path, **overrides):
+    """Test configuration on a file-backed SQLite database under ``tmp_path``."""
+    attrs = {
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'app.db'}",
+        'SQLALCHEMY_REPLICA_URI': None,
+        'STORAGE_BACKEND': 'local',
+        'STORAGE_LOCAL_ROOT': str(tmp_path / 'storage'),
+        **overrides
+    }
+    return type('TestConfig', (Config,), attrs)
+
+
+class HttpsClient(FlaskClient):
+    """Test client that sends HTTPS requests, as Talisman redirects plain HTTP."""
+
+    def open(self, *args, **kwargs):
+        kwargs.setdefault('base_url', 'https://localhost')
+        return super().open(*args, **kwargs)
+
+
+@pytest.fixture
+def make_app(tmp_path, monkeypatch):
+    """Build an app with its schema created and Redis replaced by fakeredis."""
+    apps = []
+    monkeypatch.setattr(redis.Redis, 'from_url', lambda url, **kwargs: fakeredis.FakeRedis())
+
+    def build(**overrides):
+        app = create_app(make_config(tmp_path, **overrides))
+        app.test_client_class = HttpsClient
+        with app.app_context():
+            _db.create_all(bind_key=None)
+        apps.append(app)
+        return app
+
+    yield build
+    for app in apps:
+        with app.app_context():
+            _db.session.remove()
+            for engine in _db.engines.values():
+                engine.dispose()
+
+
+@pytest.fixture
+def app(make_app):
+    app = make_app()
+    with app.app_context():
+        yield app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
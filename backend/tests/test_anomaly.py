@@ -0,0 +1,112 @@
+from datetime import date
+import numpy as np
+from app import db
+from app.models import Account, Bill, CostCenter, LinkedAccountMeter, Meter, Organization, Site
+from app.services.anomaly import (BILL_FOLDED_THROUGH, BILL_STATE_KEY, HOUR, METER_STATE_KEY, SeasonalState,
+                                  detect_bill_anomalies, detect_interval_anomalies, update_scalar,
+                                  update_seasonal)
+
+def weekly_readings(weeks, start=0):
+    # Four 15-minute readings per hour, higher during the day
+    timestamps = np.arange(start, start + weeks * 168 * HOUR, 900)
+    values = np.where((timestamps // HOUR) % 24 >= 8, 2.0, 1.0)
+    return timestamps, values
+
+def test_regular_usage_raises_no_alerts():
+    state = SeasonalState(SeasonalState.initial())
+    assert update_seasonal(state, *weekly_readings(10)) == []
+    assert state.count.min() >= 9
+
+def test_spike_after_warmup_is_reported_once():
+    state = SeasonalState(SeasonalState.initial())
+    timestamps, values = weekly_readings(10)
+    update_seasonal(state, timestamps, values)
+    more_ts, more_values = weekly_readings(1, start=int(timestamps[-1]) + 900)
+    more_values[40:44] = 50.0  # one hour at 25x its usual usage
+    anomalies = update_seasonal(state, more_ts, more_values)
+    assert len(anomalies) == 1
+    assert anomalies[0].observed_at == int(more_ts[40])
+    assert anomalies[0].value == 200.0
+
+def test_hour_split_across_batches_is_combined():
+    state = SeasonalState(SeasonalState.initial())
+    timestamps, values = weekly_readings(1)
+    update_seasonal(state, timestamps[:2], values[:2])
+    update_seasonal(state, timestamps[2:8], values[2:8])
+    slot = 72 % 168  # epoch hour 0 is Thursday 00:00
+    assert state.mean[slot] == 4.0
+
+def test_bill_amount_outlier():
+    state = np.zeros(6)
+    for amount in (100.0, 104.0, 98.0, 101.0):
+        assert update_scalar(state[0:3], amount) is None
+    assert update_scalar(state[0:3], 400.0) is not None
+
+def test_folding_a_batch_again_changes_nothing():
+    state = SeasonalState(SeasonalState.initial())
+    timestamps, values = weekly_readings(10)
+    # Both batches end part way through an hour
+    first, second = slice(0, 4 * 840 + 2), slice(4 * 840 + 2, None)
+    update_seasonal(state, timestamps[first], values[first])
+    update_seasonal(state, timestamps[second], values[second])
+    folded = state.data.copy()
+
+    assert update_seasonal(state, timestamps[first], values[first]) == []
+    assert update_seasonal(state, timestamps[second], values[second]) == []
+    assert np.array_equal(state.data, folded)
+    assert state.pending_hour == 10 * 168 - 1
+    assert state.folded_through == int(timestamps[-1])
+
+def test_state_is_saved_only_when_the_batch_commits(app):
+    key = METER_STATE_KEY.format(1)
+    timestamps, values = weekly_readings(1)
+    detect_interval_anomalies(1, timestamps, values)
+    assert app.redis.get(key) is None
+    db.session.rollback()
+    assert app.redis.get(key) is None
+
+    detect_interval_anomalies(1, timestamps[:100], values[:100])
+    detect_interval_anomalies(1, timestamps[100:], values[100:])
+    db.session.commit()
+    state = SeasonalState(np.frombuffer(app.redis.get(key), dtype=np.float64))
+    assert state.folded_through == int(timestamps[-1])
+    assert state.count.sum() == 167
+
+def test_concurrent_state_write_is_not_overwritten(app):
+    key = METER_STATE_KEY.format(1)
+    detect_interval_anomalies(1, *weekly_readings(1))
+    app.redis.set(key, b'other')
+    db.session.commit()
+    assert app.redis.get(key) == b'other'
+
+def test_redelivered_bill_is_folded_in_once(app):
+    organization = Organization(name='org')
+    cost_center = CostCenter(name='Facilities', code='FAC')
+    db.session.add_all([organization, cost_center])
+    db.session.flush()
+    site = Site(name='site', organization_id=organization.id)
+    db.session.add(site)
+    db.session.flush()
+    meter = Meter(number='m', site_id=site.id, utility_type='electricity')
+    account = Account(number='acct', cost_center_id=cost_center.id)
+    db.session.add_all([meter, account])
+    db.session.flush()
+    link = LinkedAccountMeter(account_id=account.id, meter_id=meter.id, start_date=date(2024, 1, 1))
+    db.session.add(link)
+    db.session.flush()
+
+    def parse(file_path):
+        bill = Bill(linked_account_meter_id=link.id, bill_date=date(2024, 1, 1), due_date=date(2024, 2, 1),
+                    amount=100.0, file_path=file_path)
+        db.session.add(bill)
+        db.session.flush()
+        detect_bill_anomalies(bill)
+        db.session.commit()
+        return np.frombuffer(app.redis.get(BILL_STATE_KEY.format(link.id)), dtype=np.float64)
+
+    first = parse('bills/january.pdf')
+    assert first[2] == 1
+    assert first[BILL_FOLDED_THROUGH] > 0
+    redelivered = parse('bills/january.pdf')
+    assert np.array_equal(redelivered, first)
+    assert parse('bills/february.pdf')[2] == 2
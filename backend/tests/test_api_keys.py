@@ -0,0 +1,116 @@
+import io
+import pytest
+from app import db
+from app.models import Meter, Organization, Site, User
+from app.security.api_keys import api_key_cache, hash_api_key
+
+
+@pytest.fixture
+def key_user(app):
+    api_key_cache.clear()
+    organization = Organization(name='Org')
+    db.session.add(organization)
+    db.session.flush()
+    user = User(email='u@example.com', password_hash='-', name='U', organization_id=organization.id, role='user')
+    db.session.add(user)
+    key = user.generate_api_key()
+    db.session.commit()
+    return user, key
+
+
+@pytest.fixture
+def ingest(app, key_user, monkeypatch):
+    from app.api import meters
+
+    user, _ = key_user
+    site = Site(name='Plant', organization_id=user.organization_id)
+    db.session.add(site)
+    db.session.flush()
+    meter = Meter(number='M-1', site_id=site.id, utility_type='electricity')
+    db.session.add(meter)
+    db.session.commit()
+
+    queued = []
+
+    class Task:
+        @staticmethod
+        def delay(*args):
+            queued.append(args)
+            return type('Result', (), {'id': 'task-1'})()
+
+    monkeypatch.setattr(meters, 'process_interval_data', Task)
+    return meter, queued
+
+
+def _upload(client, meter, key=None):
+    headers = {'X-API-Key': key} if key else {}
+    return client.post(f'/api/meters/{meter.id}/interval-data', headers=headers,
+                       data=io.BytesIO(b'timestamp,value\n2024-01-01T00:00:00Z,1.5\n'))
+
+
+def test_revoked_key_is_evicted_only_after_commit(key_user):
+    user, key = key_user
+    key_hash = hash_api_key(key)
+    assert api_key_cache.get(key_hash) is None  # starts the revocation listener
+    principal = {'id': user.id, 'role': 'user', 'organization_id': user.organization_id,
+                 'key_prefix': user.api_key_prefix}
+    api_key_cache.put(key_hash, principal, user.api_key_expires_at)
+
+    user.revoke_api_key()
+    db.session.flush()
+    assert api_key_cache.get(key_hash) == principal
+    db.session.rollback()
+    assert api_key_cache.get(key_hash) == principal
+
+    user.revoke_api_key()
+    db.session.commit()
+    assert api_key_cache.get(key_hash) is None
+
+
+def test_api_key_requests_are_served_from_the_cache_until_revoked(app, client, key_user, ingest, monkeypatch):
+    user, key = key_user
+    meter, queued = ingest
+
+    assert _upload(client, meter).status_code == 401
+    assert _upload(client, meter, key + 'x').status_code == 401
+    response = _upload(client, meter, key)
+    assert response.status_code == 202
+    [(meter_id, storage_key, unit, cadence)] = queued
+    assert (meter_id, unit, cadence) == (meter.id, 'kWh', None)
+    with app.storage.open(storage_key) as file:
+        assert file.read().startswith(b'timestamp,value')
+    assert api_key_cache.get(hash_api_key(key))['id'] == user.id
+
+    # A cached principal needs no lookup
+    with monkeypatch.context() as patch:
+        patch.setattr(User, 'verify_api_key', lambda self, api_key: pytest.fail('key looked up'))
+        assert _upload(client, meter, key).status_code == 202
+
+    user.revoke_api_key()
+    db.session.commit()
+    assert _upload(client, meter, key).status_code == 401
+
+
+def test_deactivating_a_user_evicts_their_key(client, key_user, ingest):
+    user, key = key_user
+    meter, _ = ingest
+    assert _upload(client, meter, key).status_code == 202
+
+    user.is_active = False
+    db.session.commit()
+    assert api_key_cache.get(hash_api_key(key)) is None
+    assert _upload(client, meter, key).status_code == 401
+
+
+def test_keys_only_reach_their_own_organization(client, key_user, ingest):
+    _, key = key_user
+    other = Organization(name='Other')
+    db.session.add(other)
+    db.session.flush()
+    site = Site(name='Depot', organization_id=other.id)
+    db.session.add(site)
+    db.session.flush()
+    meter = Meter(number='M-2', site_id=site.id, utility_type='electricity')
+    db.session.add(meter)
+    db.session.commit()
+    assert _upload(client, meter, key).status_code == 404
@@ -0,0 +1,53 @@
+import json
+import logging
+import queue
+import threading
+import time
+from app.security.audit_logging import NonBlockingQueueHandler
+
+
+def audit_record(action):
+    record = logging.LogRecord('app.security', logging.INFO, __file__, 1, 'Security Audit', None, None)
+    record.audit = {'action': action, 'status': 'success'}
+    return record
+
+
+def test_full_queue_spills_to_file(tmp_path, caplog):
+    spill = tmp_path / 'spill.log'
+    handler = NonBlockingQueueHandler(queue.Queue(maxsize=1), spill_path=str(spill))
+    with caplog.at_level(logging.WARNING, logger='app.audit_overflow'):
+        for action in ('login', 'logout', 'export'):
+            handler.enqueue(audit_record(action))
+        handler.close()
+    assert handler.queue.get_nowait().audit['action'] == 'login'
+    assert [json.loads(line)['action'] for line in spill.read_text().splitlines()] == ['logout', 'export']
+    assert (handler.spilled, handler.dropped) == (2, 0)
+    assert len(caplog.records) == 1
+
+
+def test_records_are_dropped_only_when_spilling_fails(tmp_path, caplog):
+    handler = NonBlockingQueueHandler(queue.Queue(maxsize=1), spill_path=str(tmp_path))
+    with caplog.at_level(logging.WARNING, logger='app.audit_overflow'):
+        for action in ('login', 'logout', 'export'):
+            handler.enqueue(audit_record(action))
+        handler.close()
+    assert (handler.spilled, handler.dropped) == (0, 2)
+    assert 'dropped' in caplog.records[0].getMessage()
+
+
+def test_full_queue_never_blocks_or_writes_on_the_caller(tmp_path, monkeypatch):
+    handler = NonBlockingQueueHandler(queue.Queue(maxsize=1), spill_path=str(tmp_path / 'spill.log'),
+                                      overflow_size=2)
+    caller_writes, release = [], threading.Event()
+    spill, drain = handler._spill, handler._drain_overflow
+    monkeypatch.setattr(handler, '_spill', lambda *args: (caller_writes.append(threading.current_thread()),
+                                                          spill(*args))[1])
+    monkeypatch.setattr(handler, '_drain_overflow', lambda: (release.wait(), drain()))
+    started = time.perf_counter()
+    for action in ('login', 'logout', 'export', 'delete'):
+        handler.enqueue(audit_record(action))
+    assert time.perf_counter() - started < 0.05
+    release.set()
+    handler.close()
+    assert threading.current_thread() not in caller_writes
+    assert (handler.spilled, handler.dropped) == (2, 1)
@@ -0,0 +1,88 @@
+from datetime import date
+from app import db
+from app.models import Account, CostCenter, LinkedAccountMeter, Meter, Organization, Site, Vendor
+from app.services.bill_classifier import ClassifierIndex, get_classifier_index, normalize_account_number
+
+def build_index():
+    index = ClassifierIndex()
+    index.vendor_codes = {1: 'PGE', 2: 'WTR'}
+    index.vendor_tokens = {'pacific': {1}, 'electric': {1}, 'pge': {1}, 'city': {2}, 'water': {2}, 'wtr': {2}}
+    index.vendor_phrases = {'total': [('total amount due', 1)]}
+    index.vendor_token_counts = {1: 4, 2: 3}
+    index.accounts = {1: {
+        normalize_account_number('12-3456-789'): (10, [(100, 1)]),
+        normalize_account_number('55 0001 22'): (11, [(110, 2), (111, 2)]),
+    }}
+    index.min_number_length = 8
+    return index
+
+def test_account_and_vendor_agree():
+    text = 'Pacific Electric\nAccount Number 12 3456 789\nTotal Amount Due $40.00'
+    result = build_index().classify(text, 1)
+    assert result.linked_account_meter_id == 100
+    assert result.vendor_code == 'PGE'
+    assert result.confidence >= 0.9
+
+def test_vendor_without_account_needs_review():
+    result = build_index().classify('Pacific Electric statement', 1)
+    assert result.linked_account_meter_id is None
+    assert result.vendor_id == 1
+    assert result.confidence <= 0.5
+
+def test_account_with_several_meters_is_ambiguous():
+    result = build_index().classify('City Water account 55-0001-22', 1)
+    assert result.linked_account_meter_id is None
+    assert set(result.candidates) == {110, 111}
+
+def test_conflicting_vendor_lowers_confidence():
+    result = build_index().classify('City Water services\nAccount 123456789', 1)
+    assert result.linked_account_meter_id == 100
+    assert result.confidence < 0.8
+
+def test_accounts_only_match_within_the_uploaders_organization(app):
+    cost_center = CostCenter(name='Facilities', code='FAC')
+    db.session.add(cost_center)
+    db.session.flush()
+    organizations, links = {}, {}
+    # Printed the same way on a bill, but two organizations' accounts
+    for name, number in (('ours', '12-3456-789'), ('theirs', '123456789')):
+        organization = Organization(name=name)
+        db.session.add(organization)
+        db.session.flush()
+        site = Site(name=name, organization_id=organization.id)
+        account = Account(number=number, cost_center_id=cost_center.id)
+        db.session.add_all([site, account])
+        db.session.flush()
+        meters = [Meter(number=f'{name}-{i}', site_id=site.id, utility_type='electricity') for i in range(2)]
+        db.session.add_all(meters)
+        db.session.flush()
+        # Theirs has two meters, so a match there would be ambiguous
+        links[name] = [LinkedAccountMeter(account_id=account.id, meter_id=meter.id, start_date=date(2024, 1, 1))
+                       for meter in meters[:1 if name == 'ours' else 2]]
+        db.session.add_all(links[name])
+        db.session.flush()
+        organizations[name] = organization.id
+    db.session.commit()
+
+    index = ClassifierIndex.build()
+    text = 'Account Number 12 3456 789'
+    ours = index.classify(text, organizations['ours'])
+    assert ours.linked_account_meter_id == links['ours'][0].id and ours.candidates == ()
+    theirs = index.classify(text, organizations['theirs'])
+    assert theirs.linked_account_meter_id is None
+    assert set(theirs.candidates) == {link.id for link in links['theirs']}
+    assert index.classify(text, None).account_id is None
+
+def test_index_is_dropped_only_when_changes_commit(app):
+    index = get_classifier_index()
+    vendor = Vendor(name='Northern Power', code='NP')
+    db.session.add(vendor)
+    db.session.flush()
+    assert get_classifier_index() is index
+    db.session.rollback()
+    assert get_classifier_index() is index
+
+    db.session.add(Vendor(name='Northern Power', code='NP'))
+    db.session.commit()
+    assert get_classifier_index() is not index
+    assert 'np' in get_classifier_index().vendor_tokens
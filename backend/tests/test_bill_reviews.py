@@ -0,0 +1,95 @@
+import io
+from datetime import date
+import pytest
+from flask_jwt_extended import create_access_token
+from app import db
+from app.models import (Account, BillReview, CostCenter, LinkedAccountMeter, Meter, Organization,
+                        Site, User)
+
+
+def _linked_account_meter(organization, number):
+    site = Site(name=f'Site {number}', organization_id=organization.id)
+    cost_center = CostCenter(name=f'CC {number}', code=f'CC{number}')
+    db.session.add_all([site, cost_center])
+    db.session.flush()
+    meter = Meter(number=f'M{number}', site_id=site.id, utility_type='electricity')
+    account = Account(number=f'A{number}', cost_center_id=cost_center.id)
+    db.session.add_all([meter, account])
+    db.session.flush()
+    lam = LinkedAccountMeter(account_id=account.id, meter_id=meter.id, start_date=date(2024, 1, 1))
+    db.session.add(lam)
+    db.session.flush()
+    return lam
+
+
+@pytest.fixture
+def setup(app, monkeypatch):
+    from app.api import bills
+
+    ours, theirs = Organization(name='Ours'), Organization(name='Theirs')
+    db.session.add_all([ours, theirs])
+    db.session.flush()
+    user = User(email='u@example.com', password_hash='-', name='U', organization_id=ours.id, role='user')
+    db.session.add(user)
+    lam, foreign_lam = _linked_account_meter(ours, 1), _linked_account_meter(theirs, 2)
+    db.session.commit()
+
+    queued = []
+    monkeypatch.setattr(bills, 'register_job', lambda *args: None)
+    monkeypatch.setattr(bills, 'enqueue_bill_file', lambda *args, **kwargs: queued.append((args, kwargs)))
+    return {
+        'user': user, 'organization': ours, 'other_organization': theirs,
+        'lam': lam, 'foreign_lam': foreign_lam, 'queued': queued,
+        'headers': {'Authorization': f"Bearer {create_access_token(identity=str(user.id))}"}
+    }
+
+
+def _review(app, organization_id, key='uploads/bill.pdf'):
+    app.storage.put_stream(key, io.BytesIO(b'%PDF-1.4'))
+    review = BillReview(storage_key=key, mime_type='application/pdf', organization_id=organization_id,
+                        confidence=0.5, candidates=[1, 2])
+    db.session.add(review)
+    db.session.commit()
+    return review
+
+
+def test_reviews_are_listed_per_organization(app, client, setup):
+    ours = _review(app, setup['organization'].id)
+    _review(app, setup['other_organization'].id, key='uploads/theirs.pdf')
+
+    response = client.get('/api/bill-reviews', headers=setup['headers'])
+    assert [review['id'] for review in response.get_json()] == [ours.id]
+
+
+def test_resolving_queues_the_file_with_the_chosen_meter(app, client, setup):
+    review = _review(app, setup['organization'].id)
+    url = f'/api/bill-reviews/{review.id}/resolve'
+
+    response = client.post(url, json={'linked_account_meter_id': setup['foreign_lam'].id},
+                           headers=setup['headers'])
+    assert response.status_code == 404
+    response = client.post(url, json={'linked_account_meter_id': setup['lam'].id}, headers=setup['headers'])
+    assert response.status_code == 202
+    assert response.get_json()['review']['status'] == 'resolved'
+    [(args, kwargs)] = setup['queued']
+    assert args == ('uploads/bill.pdf', setup['lam'].id)
+    assert kwargs['task_id'] == response.get_json()['task_id']
+
+    response = client.post(url, json={'linked_account_meter_id': setup['lam'].id}, headers=setup['headers'])
+    assert response.status_code == 409
+    assert len(setup['queued']) == 1
+
+
+def test_discarding_deletes_the_stored_file(app, client, setup):
+    review = _review(app, setup['organization'].id)
+    foreign = _review(app, setup['other_organization'].id, key='uploads/theirs.pdf')
+
+    assert client.post(f'/api/bill-reviews/{foreign.id}/discard', json={},
+                       headers=setup['headers']).status_code == 404
+    # A body-less action POST needs no JSON Content-Type
+    response = client.post(f'/api/bill-reviews/{review.id}/discard', headers=setup['headers'])
+    assert response.status_code == 200
+    assert response.get_json()['status'] == 'discarded'
+    with pytest.raises(Exception):
+        app.storage.open('uploads/bill.pdf')
+    assert setup['queued'] == []
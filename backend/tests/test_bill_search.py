@@ -0,0 +1,113 @@
+from datetime import date
+import pytest
+from flask_jwt_extended import create_access_token
+from app import db
+from app.models import (Account, Bill, BillSearchDocument, CostCenter, LinkedAccountMeter, Meter,
+                        Organization, RateSchedule, Site, User, Vendor)
+from app.services.bill_search import rebuild_search_documents
+
+
+@pytest.fixture
+def tree(app):
+    ours, theirs = Organization(name='Ours'), Organization(name='Theirs')
+    vendor = Vendor(name='Northern Power', code='NP')
+    cost_center = CostCenter(name='Facilities', code='FAC')
+    db.session.add_all([ours, theirs, vendor, cost_center])
+    db.session.flush()
+    schedule = RateSchedule(name='Standard', vendor_id=vendor.id, effective_date=date(2024, 1, 1))
+    links = []
+    for organization, number in ((ours, '1001'), (theirs, '2002')):
+        site = Site(name=f'{organization.name} Plant', organization_id=organization.id, address='1 Main St')
+        db.session.add_all([site, schedule])
+        db.session.flush()
+        meter = Meter(number=f'MTR-{number}', site_id=site.id, utility_type='electricity')
+        account = Account(number=f'ACCT-{number}', cost_center_id=cost_center.id)
+        db.session.add_all([meter, account])
+        db.session.flush()
+        links.append(LinkedAccountMeter(account_id=account.id, meter_id=meter.id,
+                                        rate_schedule_id=schedule.id, start_date=date(2024, 1, 1)))
+    db.session.add_all(links)
+    user = User(email='u@example.com', password_hash='-', name='U', organization_id=ours.id, role='user')
+    db.session.add(user)
+    db.session.flush()
+    return {'links': links, 'vendor': vendor, 'user': user}
+
+
+def _bill(link, day, amount=100.0):
+    bill = Bill(linked_account_meter_id=link.id, bill_date=date(2024, 1, day),
+                due_date=date(2024, 2, day), amount=amount)
+    db.session.add(bill)
+    return bill
+
+
+def _documents():
+    return {document.bill_id: document for document in BillSearchDocument.query.all()}
+
+
+def test_documents_follow_bills_and_renames(tree):
+    ours, _ = tree['links']
+    bill = _bill(ours, 1)
+    db.session.commit()
+    document = _documents()[bill.id]
+    assert (document.account_number, document.meter_number, document.vendor_name) == \
+        ('ACCT-1001', 'MTR-1001', 'Northern Power')
+
+    bill.status = 'approved'
+    tree['vendor'].name = 'Northern Grid'
+    ours.account.number = 'ACCT-1111'
+    db.session.commit()
+    db.session.expire_all()
+    document = _documents()[bill.id]
+    assert (document.status, document.vendor_name, document.account_number) == \
+        ('approved', 'Northern Grid', 'ACCT-1111')
+
+    db.session.delete(bill)
+    db.session.commit()
+    assert _documents() == {}
+
+
+def test_search_is_scoped_to_the_organization_and_paged(client, tree):
+    ours, theirs = tree['links']
+    bills = [_bill(ours, day) for day in (1, 2, 3)] + [_bill(theirs, 4)]
+    db.session.commit()
+    headers = {'Authorization': f"Bearer {create_access_token(identity=str(tree['user'].id))}"}
+
+    response = client.get('/api/bills/search?q=acct&limit=2', headers=headers)
+    page = response.get_json()
+    assert [result['bill_id'] for result in page['results']] == [bills[2].id, bills[1].id]
+    response = client.get(f"/api/bills/search?q=acct&limit=2&cursor={page['next_cursor']}", headers=headers)
+    page = response.get_json()
+    assert [result['bill_id'] for result in page['results']] == [bills[0].id]
+    assert page['next_cursor'] is None
+
+    assert client.get('/api/bills/search?meter=2002', headers=headers).get_json()['results'] == []
+    assert client.get('/api/bills/search?q=ac', headers=headers).status_code == 400
+    assert client.get('/api/bills/search?q=acct&cursor=x', headers=headers).status_code == 400
+
+
+def test_rebuild_rewrites_documents_in_place(tree):
+    ours, theirs = tree['links']
+    bills = [_bill(ours, day) for day in range(1, 6)] + [_bill(theirs, 6)]
+    db.session.commit()
+    expected = {bill_id: document.account_number for bill_id, document in _documents().items()}
+
+    # Stale, missing and orphaned documents, as after a bulk import
+    db.session.execute(BillSearchDocument.__table__.update().values(account_number='stale'))
+    db.session.execute(BillSearchDocument.__table__.delete().where(
+        BillSearchDocument.bill_id == bills[2].id))
+    db.session.execute(BillSearchDocument.__table__.insert().values(
+        bill_id=bills[-1].id + 10, organization_id=1, site_id=1, meter_id=1, account_id=1,
+        account_number='gone', meter_number='gone', site_name='gone', bill_date=date(2024, 1, 1), amount=0))
+    db.session.commit()
+
+    assert rebuild_search_documents(batch_size=2) == len(bills)
+    db.session.expire_all()
+    assert {bill_id: document.account_number for bill_id, document in _documents().items()} == expected
+
+
+def test_rebuild_command(app, tree):
+    _bill(tree['links'][0], 1)
+    db.session.commit()
+    result = app.test_cli_runner().invoke(args=['rebuild-search-documents', '--batch-size', '1'])
+    assert result.exit_code == 0
+    assert 'Wrote 1 search documents' in result.output
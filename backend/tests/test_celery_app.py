@@ -0,0 +1,18 @@
+import app as app_package
+
+
+def test_settings_load_without_mixing_key_styles(make_app):
+    make_app(CELERY_VISIBILITY_TIMEOUT=7200)
+    conf = app_package.celery.conf
+    assert conf.broker_transport_options['visibility_timeout'] == 7200
+    assert conf.worker_prefetch_multiplier == 1
+    assert not conf.task_acks_late
+
+
+def test_only_idempotent_tasks_ack_late(make_app):
+    make_app()
+    from app import tasks
+    assert tasks.process_interval_data.acks_late
+    assert tasks.process_interval_data.reject_on_worker_lost
+    for task in (tasks.process_bill_file, tasks.export_bills_to_accounting, tasks.export_columnar):
+        assert not task.acks_late
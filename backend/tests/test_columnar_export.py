@@ -0,0 +1,100 @@
+import json
+from datetime import date, datetime, timedelta
+import pyarrow as pa
+import pyarrow.parquet as pq
+from app import db
+from app.models import Account, Bill, CostCenter, IntervalData, LinkedAccountMeter, Meter, Organization, Site
+from app.services.columnar_export import (BILL_SCHEMA, INTERVAL_SCHEMA, PartitionWriter, export_dataset,
+                                          partition_bounds, rows_to_table)
+from app.services.progress import STATUS_KEY, publish_progress
+
+MARCH = 1709251200  # 2024-03-01T00:00:00Z
+
+def test_partitions_split_on_meter_and_month():
+    rows = [(1, MARCH - 900, 1.0, 'kWh', 'actual'), (1, MARCH, 2.0, 'kWh', 'actual'),
+            (1, MARCH + 900, 3.0, 'kWh', 'estimated'), (2, MARCH, 4.0, 'kWh', 'actual')]
+    table = rows_to_table(rows, INTERVAL_SCHEMA)
+    assert partition_bounds(table, 'timestamp') == [
+        (0, 1, 1, '2024-02'), (1, 3, 1, '2024-03'), (3, 4, 2, '2024-03')
+    ]
+
+def test_bill_partitions_use_bill_month():
+    rows = [(i, 5, 9, 3, date(2024, month, 15), date(2024, month, 28), 10.0, None, 'pending', None, None)
+            for i, month in enumerate((1, 1, 2), 1)]
+    table = rows_to_table(rows, BILL_SCHEMA)
+    assert [bounds[3] for bounds in partition_bounds(table, 'bill_date')] == ['2024-01', '2024-02']
+    assert table.column('usage_amount').null_count == 3
+
+def test_writer_emits_full_row_groups():
+    writer = PartitionWriter(INTERVAL_SCHEMA, 'parquet', row_group_size=4)
+    for start in range(0, 10, 3):
+        rows = [(1, MARCH + 900 * i, float(i), 'kWh', 'actual') for i in range(start, min(start + 3, 10))]
+        writer.write(rows_to_table(rows, INTERVAL_SCHEMA))
+    parquet = pq.ParquetFile(writer.close())
+    assert [parquet.metadata.row_group(i).num_rows for i in range(parquet.num_row_groups)] == [4, 4, 2]
+    assert parquet.read().column('value').to_pylist() == [float(i) for i in range(10)]
+
+def test_arrow_ipc_round_trip():
+    writer = PartitionWriter(INTERVAL_SCHEMA, 'arrow', row_group_size=100)
+    writer.write(rows_to_table([(7, MARCH, 1.5, 'kWh', '')], INTERVAL_SCHEMA))
+    table = pa.ipc.open_file(writer.close()).read_all()
+    assert table.schema == INTERVAL_SCHEMA
+    assert table.to_pylist()[0]['quality_flag'] == ''
+
+def _seed():
+    ours, theirs = Organization(name='Ours'), Organization(name='Theirs')
+    cost_center = CostCenter(name='Facilities', code='FAC')
+    db.session.add_all([ours, theirs, cost_center])
+    db.session.flush()
+    meters = []
+    for organization, count in ((ours, 2), (theirs, 1)):
+        site = Site(name=organization.name, organization_id=organization.id)
+        db.session.add(site)
+        db.session.flush()
+        for i in range(count):
+            meter = Meter(number=f'{organization.name}-{i}', site_id=site.id, utility_type='electricity')
+            account = Account(number=f'{organization.name}-A{i}', cost_center_id=cost_center.id)
+            db.session.add_all([meter, account])
+            db.session.flush()
+            link = LinkedAccountMeter(account_id=account.id, meter_id=meter.id, start_date=date(2024, 1, 1))
+            db.session.add(link)
+            db.session.flush()
+            meters.append(meter)
+            # Readings either side of a month boundary, and one bill per month
+            start = datetime(2024, 2, 29, 23)
+            db.session.add_all([IntervalData(meter_id=meter.id, timestamp=start + timedelta(minutes=15 * n),
+                                             value=float(n), unit='kWh') for n in range(8)])
+            db.session.add_all([Bill(linked_account_meter_id=link.id, bill_date=date(2024, month, 10),
+                                     due_date=date(2024, month, 28), amount=100.0) for month in (2, 3)])
+    db.session.commit()
+    return ours, meters
+
+
+def test_export_dataset_end_to_end(app):
+    app.config.update(EXPORT_PARALLELISM=2, EXPORT_ROW_GROUP_SIZE=3)
+    ours, meters = _seed()
+    progress = []
+
+    def on_progress(rows):
+        # Called on the shard threads, as the export task does
+        publish_progress('export-test', 'exporting', dataset='interval_data', rows=rows)
+        progress.append(rows)
+
+    result = export_dataset('interval_data', 'exports/test', 'parquet', ours.id, on_progress=on_progress)
+    assert result['rows'] == 16 and result['partitions'] == 4 and result['bytes'] > 0
+    assert max(progress) == 16
+    assert app.redis.hget(STATUS_KEY.format('export-test'), 'stage') == b'exporting'
+
+    with app.storage.open('exports/test/interval_data/_manifest.json') as file:
+        manifest = json.load(file)
+    assert [(partition['path'], partition['rows']) for partition in manifest['partitions']] == [
+        (f'meter_id={meter.id}/month={month}/part-0.parquet', 4)
+        for meter in meters[:2] for month in ('2024-02', '2024-03')
+    ]
+    with app.storage.open(f"exports/test/interval_data/{manifest['partitions'][1]['path']}") as file:
+        table = pq.read_table(file)
+    assert table.column('value').to_pylist() == [4.0, 5.0, 6.0, 7.0]
+    assert table.column('timestamp')[0].as_py().replace(tzinfo=None) == datetime(2024, 3, 1)
+
+    result = export_dataset('bills', 'exports/test', 'arrow', start=date(2024, 3, 1))
+    assert (result['rows'], result['partitions']) == (3, 3)
@@ -0,0 +1,72 @@
+import pytest
+from flask_jwt_extended import create_access_token
+from app import db
+from app import db_routing
+from app.db_routing import STICKY_KEY, engine_options, read_only
+
+OPTIONS = {'pool_size': 10, 'max_overflow': 20, 'pool_pre_ping': True}
+
+
+@pytest.fixture
+def routed_app(make_app, tmp_path, monkeypatch):
+    monkeypatch.setattr(db_routing, '_lag_state', {'checked_at': 0.0, 'healthy': False})
+    app = make_app(SQLALCHEMY_REPLICA_URI=f"sqlite:///{tmp_path / 'replica.db'}",
+                   REPLICA_LAG_CHECK_INTERVAL=0)
+
+    @app.route('/api/_bind')
+    @read_only
+    def current_bind():
+        return {'replica': db.session.get_bind().url.database.endswith('replica.db')}
+
+    @app.route('/api/_bind/unmarked')
+    def unmarked_bind():
+        return {'replica': db.session.get_bind().url.database.endswith('replica.db')}
+
+    @app.route('/api/_write', methods=['POST'])
+    def write():
+        return {}, 201
+
+    return app
+
+
+def headers_for(app, identity):
+    with app.app_context():
+        return {'Authorization': f"Bearer {create_access_token(identity=identity)}"}
+
+
+def reads_replica(app, path='/api/_bind', headers=None):
+    client = app.test_client(use_cookies=False)
+    return client.get(path, headers=headers).json['replica']
+
+
+def test_sqlite_engines_drop_queue_pool_sizing():
+    assert engine_options('sqlite://', OPTIONS) == {'pool_pre_ping': True}
+    assert engine_options('postgresql://db/app', OPTIONS) == OPTIONS
+
+
+def test_only_read_only_views_use_the_replica(routed_app):
+    assert reads_replica(routed_app) is True
+    assert reads_replica(routed_app, '/api/_bind/unmarked') is False
+
+
+def test_lagging_replica_falls_back_to_primary(routed_app, monkeypatch):
+    monkeypatch.setattr(db_routing, '_measure_replica_lag', lambda app: 30.0)
+    assert reads_replica(routed_app) is False
+
+
+def test_write_pins_jwt_identity_to_primary(routed_app):
+    alice, bob = headers_for(routed_app, '1'), headers_for(routed_app, '2')
+    client = routed_app.test_client(use_cookies=False)
+    assert client.post('/api/_write', json={}, headers=alice).status_code == 201
+    assert routed_app.redis.pttl(STICKY_KEY.format('1')) > 0
+
+    assert reads_replica(routed_app, headers=alice) is False
+    assert reads_replica(routed_app, headers=bob) is True
+    routed_app.redis.delete(STICKY_KEY.format('1'))
+    assert reads_replica(routed_app, headers=alice) is True
+
+
+def test_write_pins_cookie_client_to_primary(routed_app):
+    client = routed_app.test_client()
+    client.post('/api/_write', json={})
+    assert client.get('/api/_bind').json['replica'] is False
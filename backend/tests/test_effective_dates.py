@@ -0,0 +1,64 @@
+from datetime import date
+from app import db
+from app.models import RateSchedule, Vendor
+from app.services import effective_dates
+from app.services.effective_dates import EffectiveDateIndex, LinkEntry, ScheduleEntry, get_effective_date_index
+
+def build_index():
+    schedules = [
+        ScheduleEntry(2, 1, date(2024, 1, 1), 'tiered', None),
+        ScheduleEntry(1, 1, date(2023, 1, 1), 'fixed', None),
+        ScheduleEntry(3, 1, date(2024, 1, 1), 'tiered', None),
+    ]
+    links = [
+        LinkEntry(10, 5, 100, 1, date(2023, 1, 1), None),
+        LinkEntry(11, 5, 101, 2, date(2023, 6, 1), date(2023, 12, 31)),
+        LinkEntry(12, 6, 102, None, date(2024, 1, 1), date(2024, 6, 30)),
+    ]
+    return EffectiveDateIndex(schedules, links)
+
+def test_schedule_in_effect_on_date():
+    index = build_index()
+    assert index.rate_schedule_at(1, date(2022, 12, 31)) is None
+    assert index.rate_schedule_at(1, date(2023, 7, 1)).id == 1
+    # Same effective date: the later schedule wins
+    assert index.rate_schedule_at(1, date(2024, 1, 1)).id == 3
+    assert index.rate_schedule_at(99, date(2024, 1, 1)) is None
+
+def test_link_active_on_date():
+    index = build_index()
+    assert index.link_at(5, date(2023, 3, 1)).id == 10
+    assert index.link_at(5, date(2023, 12, 31)).id == 11
+    # After the later link ends the open-ended earlier one applies again
+    assert index.link_at(5, date(2024, 2, 1)).id == 10
+    assert index.link_at(6, date(2024, 7, 1)) is None
+    assert [e.id if e else None for e in index.links_at([(6, date(2024, 3, 1)), (6, date(2023, 1, 1))])] == [12, None]
+
+def test_index_is_dropped_only_when_changes_commit(app):
+    vendor = Vendor(name='Northern Power', code='NP')
+    db.session.add(vendor)
+    db.session.commit()
+    index = get_effective_date_index()
+
+    db.session.add(RateSchedule(name='Standard', vendor_id=vendor.id, effective_date=date(2024, 1, 1)))
+    db.session.flush()
+    assert get_effective_date_index() is index
+    db.session.rollback()
+    assert get_effective_date_index() is index
+
+    db.session.add(RateSchedule(name='Standard', vendor_id=vendor.id, effective_date=date(2024, 1, 1)))
+    db.session.commit()
+    assert get_effective_date_index().rate_schedule_at(vendor.id, date(2024, 2, 1)) is not None
+
+def test_build_overlapping_an_invalidation_is_not_kept(app, monkeypatch):
+    effective_dates.invalidate_effective_date_index()
+    build = EffectiveDateIndex.build
+
+    def racing_build():
+        index = build()
+        effective_dates.invalidate_effective_date_index()  # a commit lands mid-build
+        return index
+
+    monkeypatch.setattr(EffectiveDateIndex, 'build', racing_build)
+    assert get_effective_date_index() is not None
+    assert effective_dates._index is None
@@ -0,0 +1,43 @@
+import hashlib
+import io
+from app.services.file_inspection import SNIFF_BYTES, InspectingReader, inspect_buffer, inspect_file, inspect_stream
+
+ALLOWED = {'application/pdf': '.pdf', 'text/csv': '.csv'}
+# Larger than the sniffed head, so the digest covers more than libmagic sees
+PDF = b'%PDF-1.4\n1 0 obj\n<<>>\nendobj\n' + b'0' * (2 * SNIFF_BYTES) + b'\ntrailer\n<<>>\n%%EOF\n'
+
+
+def test_buffer_reports_type_size_and_digest():
+    result = inspect_buffer(PDF, 'bill.PDF', ALLOWED)
+    assert result.mime_type == 'application/pdf'
+    assert result.size == len(PDF)
+    assert result.sha256 == hashlib.sha256(PDF).hexdigest()
+    assert result.extension_ok is True
+
+
+def test_extension_must_match_the_detected_type():
+    assert inspect_buffer(PDF, 'bill.csv', ALLOWED).extension_ok is False
+    assert inspect_buffer(b'\x89PNG\r\n\x1a\n' + bytes(32), 'bill.pdf', ALLOWED).extension_ok is False
+    assert inspect_buffer(PDF).extension_ok is None
+
+
+def test_file_stream_and_buffer_agree(tmp_path):
+    path = tmp_path / 'bill.pdf'
+    path.write_bytes(PDF)
+    expected = inspect_buffer(PDF, 'bill.pdf', ALLOWED)
+    assert inspect_file(str(path), 'bill.pdf', ALLOWED) == expected
+    assert inspect_stream(io.BytesIO(PDF), 'bill.pdf', ALLOWED) == expected
+
+
+def test_empty_file(tmp_path):
+    path = tmp_path / 'empty.pdf'
+    path.write_bytes(b'')
+    result = inspect_file(str(path), 'empty.pdf', ALLOWED)
+    assert (result.size, result.sha256, result.extension_ok) == (0, hashlib.sha256().hexdigest(), False)
+
+
+def test_reader_inspects_what_the_consumer_reads():
+    reader = InspectingReader(io.BytesIO(PDF), 'bill.pdf', ALLOWED)
+    copied = b''.join(iter(lambda: reader.read(1000), b''))
+    assert copied == PDF
+    assert reader.result() == inspect_buffer(PDF, 'bill.pdf', ALLOWED)
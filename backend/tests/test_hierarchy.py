@@ -0,0 +1,96 @@
+from datetime import date
+import pytest
+from flask_jwt_extended import create_access_token
+from sqlalchemy import delete
+from app import db
+from app.models import (Account, CostCenter, HierarchyNode, LinkedAccountMeter, Meter, Organization,
+                        Site, User)
+from app.services.hierarchy import get_tree
+
+
+@pytest.fixture
+def tree(app):
+    ours, theirs = Organization(name='Ours'), Organization(name='Theirs')
+    cost_center = CostCenter(name='Facilities', code='FAC')
+    db.session.add_all([ours, theirs, cost_center])
+    db.session.flush()
+    plant, depot = Site(name='Plant', organization_id=ours.id), Site(name='Depot', organization_id=theirs.id)
+    db.session.add_all([plant, depot])
+    db.session.flush()
+    meter = Meter(number='M-1', site_id=plant.id, utility_type='electricity')
+    account = Account(number='A-1', cost_center_id=cost_center.id)
+    db.session.add_all([meter, account])
+    db.session.flush()
+    link = LinkedAccountMeter(account_id=account.id, meter_id=meter.id, start_date=date(2024, 1, 1))
+    user = User(email='u@example.com', password_hash='-', name='U', organization_id=ours.id, role='admin')
+    db.session.add_all([link, user])
+    db.session.commit()
+    return {'ours': ours, 'theirs': theirs, 'plant': plant, 'depot': depot, 'meter': meter,
+            'link': link, 'user': user}
+
+
+def _paths():
+    return {(node.node_type, node.node_id): (node.organization_id, node.path)
+            for node in HierarchyNode.query.all()}
+
+
+def test_inserts_get_paths_under_their_parent(tree):
+    ours, plant, meter, link = tree['ours'], tree['plant'], tree['meter'], tree['link']
+    paths = _paths()
+    assert paths[('meter', meter.id)] == (ours.id, f'/o{ours.id}/s{plant.id}/m{meter.id}/')
+    assert paths[('linked_account', link.id)] == \
+        (ours.id, f'/o{ours.id}/s{plant.id}/m{meter.id}/l{link.id}/')
+    assert get_tree(ours.id) == {'type': 'organization', 'id': ours.id, 'name': 'Ours', 'children': [
+        {'type': 'site', 'id': plant.id, 'name': 'Plant', 'children': [
+            {'type': 'meter', 'id': meter.id, 'name': 'M-1', 'children': [
+                {'type': 'linked_account', 'id': link.id, 'name': 'A-1'}]}]}]}
+
+
+def test_moving_a_meter_rewrites_its_subtree(tree):
+    theirs, depot, meter, link = tree['theirs'], tree['depot'], tree['meter'], tree['link']
+    meter.site_id = depot.id
+    db.session.commit()
+    paths = _paths()
+    assert paths[('meter', meter.id)] == (theirs.id, f'/o{theirs.id}/s{depot.id}/m{meter.id}/')
+    assert paths[('linked_account', link.id)] == \
+        (theirs.id, f'/o{theirs.id}/s{depot.id}/m{meter.id}/l{link.id}/')
+    assert get_tree(tree['ours'].id)['children'][0]['children'] == []
+
+
+def test_deleting_a_site_removes_its_subtree(tree):
+    # Children removed outside the ORM, e.g. by ON DELETE CASCADE
+    db.session.execute(delete(LinkedAccountMeter))
+    db.session.execute(delete(Meter))
+    db.session.delete(tree['plant'])
+    db.session.commit()
+    assert set(_paths()) == {('organization', tree['ours'].id), ('organization', tree['theirs'].id),
+                             ('site', tree['depot'].id)}
+
+
+def test_depth_limit(client, tree):
+    ours = tree['ours']
+    site = get_tree(ours.id, depth=1)['children'][0]
+    assert site == {'type': 'site', 'id': tree['plant'].id, 'name': 'Plant'}
+    headers = {'Authorization': f"Bearer {create_access_token(identity=str(tree['user'].id))}"}
+    assert client.get(f'/api/organizations/{ours.id}/tree?depth=4', headers=headers).status_code == 400
+
+
+def test_etag_changes_with_the_tree_and_survives_a_rebuild(app, client, tree):
+    headers = {'Authorization': f"Bearer {create_access_token(identity=str(tree['user'].id))}"}
+    url = f"/api/organizations/{tree['ours'].id}/tree"
+    etag = client.get(url, headers=headers).headers['ETag']
+    assert client.get(url, headers={**headers, 'If-None-Match': etag}).status_code == 304
+
+    tree['plant'].name = 'Main Plant'
+    db.session.commit()
+    response = client.get(url, headers={**headers, 'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.get_json()['children'][0]['name'] == 'Main Plant'
+    etag = response.headers['ETag']
+
+    # Redis holds nothing the ETag depends on
+    app.redis.flushall()
+    assert client.get(url, headers={**headers, 'If-None-Match': etag}).status_code == 304
+    result = app.test_cli_runner().invoke(args=['rebuild-hierarchy'])
+    assert 'Wrote 6 hierarchy nodes' in result.output
+    assert client.get(url, headers={**headers, 'If-None-Match': etag}).status_code == 200
@@ -0,0 +1,67 @@
+import io
+from datetime import datetime, timezone
+import pytest
+from app import db
+from app.models import IntervalData, Meter, Organization, Site
+
+# Two batches of four rows; the second holds a reading for 00:45, which the
+# first batch already estimated, and a row that does not parse
+CSV = """timestamp,value
+2024-01-01T00:00:00Z,1.0
+2024-01-01T00:15:00Z,1.0
+2024-01-01T00:30:00Z,1.0
+2024-01-01T01:00:00Z,1.0
+2024-01-01T01:15:00Z,1.0
+2024-01-01T00:45:00Z,5.0
+2024-01-01T01:30:00Z,1.0
+not a time,1.0
+"""
+
+
+@pytest.fixture
+def meter(app):
+    organization = Organization(name='Ours')
+    db.session.add(organization)
+    db.session.flush()
+    site = Site(name='Site', organization_id=organization.id)
+    db.session.add(site)
+    db.session.flush()
+    meter = Meter(number='M1', site_id=site.id, utility_type='electricity')
+    db.session.add(meter)
+    db.session.commit()
+    app.config['INTERVAL_BATCH_SIZE'] = 4
+    return meter
+
+
+def test_unsorted_file_is_stored_in_place(app, meter, monkeypatch):
+    from app import tasks
+    from app.services import anomaly
+
+    profiled = []
+    detect = anomaly.detect_interval_anomalies
+    monkeypatch.setattr(anomaly, 'detect_interval_anomalies',
+                        lambda meter_id, timestamps, values: (profiled.extend(timestamps.tolist()),
+                                                              detect(meter_id, timestamps, values))[1])
+    app.storage.put_stream('intervals/m1.csv', io.BytesIO(CSV.encode()))
+
+    # run() executes in this test's app context; calling the task would push
+    # the context of the app its Celery instance was created for
+    result = tasks.process_interval_data.run(meter.id, 'intervals/m1.csv', 'kWh', 900)
+    assert result['status'] == 'success', result
+    assert (result['out_of_order'], result['estimated'], result['unparsable']) == (1, 1, 1)
+
+    rows = IntervalData.query.filter_by(meter_id=meter.id).order_by(IntervalData.timestamp).all()
+    assert [(row.timestamp.strftime('%H:%M'), row.value, row.quality_flag) for row in rows] == [
+        ('00:00', 1.0, 'actual'),
+        ('00:15', 1.0, 'actual'),
+        ('00:30', 1.0, 'actual'),
+        # The late reading replaced the estimate; it is flagged against its own batch
+        ('00:45', 5.0, 'suspect'),
+        ('01:00', 1.0, 'actual'),
+        ('01:15', 1.0, 'actual'),
+        ('01:30', 1.0, 'actual'),
+    ]
+    assert all(row.unit == 'kWh' for row in rows)
+    # Only actual readings reach the usage profile
+    assert int(datetime(2024, 1, 1, 0, 45, tzinfo=timezone.utc).timestamp()) not in profiled
+    assert len(profiled) == 6
@@ -0,0 +1,51 @@
+import numpy as np
+from app.services.interval_quality import ACTUAL, ESTIMATED, SUSPECT, check_batch, last_good
+
+def test_duplicates_keep_last_reading():
+    result = check_batch(np.array([0, 900, 900, 1800]), np.array([1.0, 2.0, 3.0, 4.0]), 900)
+    assert result.timestamps.tolist() == [0, 900, 1800]
+    assert result.values.tolist() == [1.0, 3.0, 4.0]
+    assert result.counts['duplicates'] == 1
+
+def test_short_gap_is_interpolated():
+    result = check_batch(np.array([0, 900, 3600, 4500]), np.array([1.0, 1.0, 4.0, 4.0]), 900)
+    assert result.timestamps.tolist() == [0, 900, 1800, 2700, 3600, 4500]
+    assert result.values[2:4].tolist() == [2.0, 3.0]
+    assert result.flags.tolist() == [ACTUAL, ACTUAL, ESTIMATED, ESTIMATED, ACTUAL, ACTUAL]
+    assert result.counts['gaps'] == 1 and result.counts['missing'] == 2
+
+def test_gap_at_batch_boundary_uses_previous_reading():
+    result = check_batch(np.array([2700, 3600]), np.array([4.0, 4.0]), 900, previous=(900, 2.0))
+    assert result.timestamps.tolist() == [1800, 2700, 3600]
+    assert result.values[0] == 3.0
+
+def test_negative_and_spike_readings_are_suspect():
+    values = np.full(200, 10.0) + np.random.default_rng(0).normal(0, 1, 200)
+    values[50] = -5.0
+    values[120] = 99999.0
+    result = check_batch(np.arange(200) * 900, values, 900)
+    assert result.counts['negative'] == 1 and result.counts['spikes'] == 1
+    assert np.flatnonzero(result.flags == SUSPECT).tolist() == [50, 120]
+    assert last_good(result) == (199 * 900, values[199])
+
+def test_gaps_longer_than_max_fill_are_only_counted():
+    result = check_batch(np.array([0, 900 * 10]), np.array([1.0, 1.0]), 900, max_fill=4)
+    assert result.counts['missing'] == 9
+    assert result.counts['estimated'] == 0
+    assert result.timestamps.size == 2
+
+def test_readings_before_the_previous_batch_are_returned_as_late():
+    result = check_batch(np.array([900, 1800, 4500, 5400]), np.array([7.0, 8.0, 5.0, 6.0]), 900,
+                         previous=(3600, 4.0))
+    assert result.timestamps.tolist() == [4500, 5400]
+    assert result.late.timestamps.tolist() == [900, 1800]
+    assert result.late.values.tolist() == [7.0, 8.0]
+    assert result.late.flags.tolist() == [ACTUAL, ACTUAL]
+    assert result.counts['out_of_order'] == 2 and result.counts['duplicates'] == 0
+    assert result.counts['estimated'] == 0
+
+def test_batch_of_only_late_readings():
+    result = check_batch(np.array([0, 900]), np.array([1.0, 2.0]), 900, previous=(3600, 4.0))
+    assert result.timestamps.size == 0
+    assert result.late.timestamps.tolist() == [0, 900]
+    assert check_batch(np.array([4500]), np.array([1.0]), 900, previous=(3600, 4.0)).late is None
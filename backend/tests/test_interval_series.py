@@ -0,0 +1,30 @@
+import numpy as np
+import pytest
+from app.services.interval_series import bucket, lttb
+
+def test_bucket_aggregates_contiguous_runs():
+    timestamps = np.array([0, 900, 1800, 3600, 4500, 10800])
+    values = np.array([1.0, 2.0, 3.0, 4.0, 6.0, 5.0])
+    starts, sums = bucket(timestamps, values, 3600, 'sum')
+    assert starts.tolist() == [0, 3600, 10800]
+    assert sums.tolist() == [6.0, 10.0, 5.0]
+    assert bucket(timestamps, values, 3600, 'avg')[1].tolist() == [2.0, 5.0, 5.0]
+    assert bucket(timestamps, values, 3600, 'max')[1].tolist() == [3.0, 6.0, 5.0]
+    assert bucket(timestamps, values, 3600, 'min')[1].tolist() == [1.0, 4.0, 5.0]
+
+def test_bucket_rejects_unknown_aggregate():
+    with pytest.raises(ValueError):
+        bucket(np.array([0]), np.array([1.0]), 900, 'median')
+
+def test_lttb_keeps_endpoints_and_peaks():
+    x = np.arange(1000)
+    y = np.zeros(1000)
+    y[500] = 100.0
+    kept = lttb(x, y, 20)
+    assert kept.size == 20
+    assert kept[0] == 0 and kept[-1] == 999
+    assert 500 in kept
+    assert np.all(np.diff(kept) > 0)
+
+def test_lttb_returns_everything_below_threshold():
+    assert lttb(np.arange(5), np.ones(5), 10).tolist() == [0, 1, 2, 3, 4]
@@ -0,0 +1,95 @@
+import queue
+import pytest
+import redis
+from flask_jwt_extended import create_access_token
+from app import db
+from app.models import Organization, User
+from app.services.progress import LISTENER_LOST, ProgressHub, progress_hub, publish_progress, register_job
+
+
+class BrokenRedis:
+    def __getattr__(self, name):
+        raise redis.ConnectionError('down')
+
+
+class StoppedThread:
+    def stop(self):
+        pass
+
+
+@pytest.fixture
+def users(app, monkeypatch):
+    from app.api import jobs
+
+    # A hub per test, subscribed to this app's Redis
+    monkeypatch.setattr(jobs, 'progress_hub', ProgressHub())
+    app.config['JOB_EVENTS_KEEPALIVE'] = 0.1
+    organization = Organization(name='Ours')
+    db.session.add(organization)
+    db.session.flush()
+    owner, other = (User(email=f'{name}@example.com', password_hash='-', name=name,
+                         organization_id=organization.id, role='user') for name in ('owner', 'other'))
+    db.session.add_all([owner, other])
+    db.session.commit()
+    return {user.name: (user, {'Authorization': f"Bearer {create_access_token(identity=str(user.id))}"})
+            for user in (owner, other)}
+
+
+def test_redis_outage_returns_503(app, client, monkeypatch):
+    headers = {'Authorization': f"Bearer {create_access_token(identity='1')}"}
+    monkeypatch.setattr(app, 'redis', BrokenRedis())
+    monkeypatch.setattr(progress_hub, '_pid', None)
+    assert client.get('/api/jobs/abc', headers=headers).status_code == 503
+    assert client.get('/api/jobs/abc/events', headers=headers).status_code == 503
+
+
+def test_status_is_returned_to_the_owner_only(app, client, users):
+    owner, owner_headers = users['owner']
+    register_job('job-1', owner.id, 'bill_upload')
+    publish_progress('job-1', 'extracted', page_count=2)
+
+    response = client.get('/api/jobs/job-1', headers=owner_headers)
+    assert response.status_code == 200
+    status = response.get_json()
+    assert (status['kind'], status['stage'], status['status']) == ('bill_upload', 'extracted', 'running')
+    assert status['data'] == {'page_count': 2}
+    assert 'owner_id' not in status
+
+    assert client.get('/api/jobs/unknown', headers=owner_headers).status_code == 404
+
+    # A fresh app context, so the owner resolved into g is not reused
+    other_headers = users['other'][1]
+    with app.app_context():
+        assert client.get('/api/jobs/job-1', headers=other_headers).status_code == 404
+        assert client.get('/api/jobs/job-1/events', headers=other_headers).status_code == 404
+
+
+def test_stream_delivers_published_events_until_the_job_finishes(client, users):
+    owner, headers = users['owner']
+    register_job('job-1', owner.id, 'bill_upload')
+
+    response = client.get('/api/jobs/job-1/events', headers=headers, buffered=False)
+    assert response.status_code == 200
+    assert response.mimetype == 'text/event-stream'
+    publish_progress('job-1', 'saved', status='completed', bill_id=7)
+    body = b''.join(response.response).decode()
+    response.close()
+
+    assert '"stage": "queued"' in body
+    assert '"stage": "saved"' in body and '"bill_id": 7' in body
+    assert 'owner_id' not in body
+
+
+def test_listener_error_ends_streams_so_clients_reconnect(app):
+    hub = ProgressHub()
+    events = hub.watch('job-1', maxsize=1)
+    events.put_nowait({'status': 'running'})
+    hub._on_listener_error(redis.ConnectionError('lost'), None, StoppedThread())
+
+    assert events.get_nowait() is LISTENER_LOST
+    assert hub._watchers == {}
+    # The next watcher starts a new subscription
+    hub.watch('job-1')
+    assert hub._pid is not None
+    with pytest.raises(queue.Empty):
+        events.get_nowait()
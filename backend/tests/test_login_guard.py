@@ -0,0 +1,95 @@
+import threading
+import pytest
+import redis
+from werkzeug.security import generate_password_hash
+from app.security import login_guard
+from app.security.login_guard import (FAIL_KEY, LOCK_KEY, THROTTLE_KEY, LoginOverloaded, PasswordHasherPool,
+                                      begin_attempt, record_failure, record_success)
+
+
+@pytest.fixture
+def persisted(app, monkeypatch):
+    calls = []
+    monkeypatch.setattr(login_guard, '_persist', lambda *args: calls.append(args))
+    app.config.update(LOGIN_MAX_FAILED_ATTEMPTS=3, LOGIN_LOCKOUT_SECONDS=600)
+    return calls
+
+
+class BrokenRedis:
+    def __getattr__(self, name):
+        raise redis.ConnectionError('down')
+
+
+def test_attempts_are_throttled_per_account(app):
+    assert begin_attempt(1) is True
+    assert begin_attempt(1) is False
+    assert begin_attempt(2) is True
+    assert 0 < app.redis.pttl(THROTTLE_KEY.format(1)) <= 2000
+
+
+def test_failures_lock_the_account_at_the_threshold(app, persisted):
+    record_failure(1)
+    record_failure(1)
+    assert not app.redis.exists(LOCK_KEY.format(1))
+    record_failure(1)
+
+    assert app.redis.ttl(LOCK_KEY.format(1)) == 600
+    assert not app.redis.exists(FAIL_KEY.format(1))
+    assert [(call[3], call[4] is not None) for call in persisted] == [(1, False), (2, False), (3, True)]
+    app.redis.delete(THROTTLE_KEY.format(1))
+    assert begin_attempt(1) is False
+
+
+def test_success_resets_the_failure_count(app, persisted):
+    record_failure(1)
+    record_failure(1)
+    record_success(1)
+    record_failure(1)
+    assert int(app.redis.get(FAIL_KEY.format(1))) == 1
+    assert persisted[2][1] is True
+
+
+def test_redis_outage_fails_open(app, persisted, monkeypatch):
+    monkeypatch.setattr(app, 'redis', BrokenRedis())
+    monkeypatch.setattr(app, 'login_failure_script', lambda **kwargs: BrokenRedis().call())
+    assert begin_attempt(1) is True
+    record_failure(1)
+    record_success(1)
+    assert [call[1] for call in persisted] == [True]
+
+
+def test_hasher_verifies_passwords():
+    pool = PasswordHasherPool(max_workers=1, max_queue=1)
+    password_hash = generate_password_hash('correct horse')
+    assert pool.verify(password_hash, 'correct horse') is True
+    assert pool.verify(password_hash, 'battery staple') is False
+
+
+def test_hasher_sheds_load_when_saturated(monkeypatch):
+    started, release = threading.Event(), threading.Event()
+
+    def slow_check(*args):
+        started.set()
+        return release.wait(5)
+
+    monkeypatch.setattr(login_guard, 'check_password_hash', slow_check)
+    pool = PasswordHasherPool(max_workers=1, max_queue=0)
+    waiter = threading.Thread(target=pool.verify, args=('hash', 'password'))
+    waiter.start()
+    started.wait(5)
+    try:
+        with pytest.raises(LoginOverloaded):
+            pool.verify('hash', 'password')
+    finally:
+        release.set()
+        waiter.join()
+    assert pool.verify('hash', 'password') is True
+
+
+def test_hasher_times_out_slow_checks(monkeypatch):
+    release = threading.Event()
+    monkeypatch.setattr(login_guard, 'check_password_hash', lambda *args: release.wait(5))
+    pool = PasswordHasherPool(max_workers=1, max_queue=1)
+    with pytest.raises(LoginOverloaded):
+        pool.verify('hash', 'password', timeout=0.05)
+    release.set()
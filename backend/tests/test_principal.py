@@ -0,0 +1,38 @@
+import json
+from flask_jwt_extended import create_access_token
+from app import db
+from app.models import Organization, User
+from app.principal import PROFILE_KEY
+
+
+def test_profile_cache_is_invalidated_after_commit(app):
+    db.session.add(Organization(id=1, name='Org'))
+    user = User(email='u@example.com', password_hash='-', name='U', organization_id=1, role='admin')
+    db.session.add(user)
+    db.session.commit()
+    key = PROFILE_KEY.format(user.id)
+    app.redis.set(key, json.dumps({'id': user.id, 'role': 'admin'}))
+
+    user.role = 'user'
+    db.session.flush()
+    assert app.redis.exists(key)
+    db.session.commit()
+    assert not app.redis.exists(key)
+
+
+def test_tokens_of_deleted_or_deactivated_users_are_rejected(app, client):
+    db.session.add(Organization(id=1, name='Org'))
+    active, inactive = (User(email=f'{name}@example.com', password_hash='-', name=name, organization_id=1,
+                             role='user') for name in ('active', 'inactive'))
+    db.session.add_all([active, inactive])
+    db.session.commit()
+    tokens = {user.email: create_access_token(identity=str(user.id)) for user in (active, inactive)}
+
+    def status(email):
+        return client.get('/api/auth/user', headers={'Authorization': f'Bearer {tokens[email]}'}).status_code
+
+    assert status('active@example.com') == status('inactive@example.com') == 200
+    inactive.is_active = False
+    db.session.delete(active)
+    db.session.commit()
+    assert status('active@example.com') == status('inactive@example.com') == 401
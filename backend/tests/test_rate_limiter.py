@@ -0,0 +1,78 @@
+import fakeredis
+import pytest
+from app.security.rate_limiter import LocalTokenBucket, RateLimiter, retry_after_header
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+def test_bucket_allows_up_to_capacity(clock):
+    bucket = LocalTokenBucket(3, 60, clock=clock)
+    assert [bucket.take('ip') for _ in range(4)] == [True, True, True, False]
+
+def test_bucket_refills_over_time(clock):
+    bucket = LocalTokenBucket(2, 10, clock=clock)
+    bucket.take('ip')
+    bucket.take('ip')
+    assert not bucket.take('ip')
+    clock.now = 5.0
+    assert bucket.take('ip')
+    assert not bucket.take('ip')
+
+def test_refund_restores_token(clock):
+    bucket = LocalTokenBucket(1, 60, clock=clock)
+    assert bucket.take('ip')
+    bucket.refund('ip')
+    assert bucket.take('ip')
+
+def test_keys_are_independent_and_bounded(clock):
+    bucket = LocalTokenBucket(1, 60, max_keys=2, clock=clock)
+    assert bucket.take('a')
+    assert bucket.take('b')
+    assert bucket.take('c')
+    # 'a' was evicted, so it starts with a full bucket again
+    assert bucket.take('a')
+    assert not bucket.take('c')
+
+def test_retry_after_header_rounds_up():
+    assert retry_after_header(0.2) == '1'
+    assert retry_after_header(2.5) == '3'
+
+def test_script_allows_the_limit_then_denies_without_storing():
+    redis_client = fakeredis.FakeRedis(server=fakeredis.FakeServer())
+    limiter = RateLimiter(redis_client, 2, 60, prefilter=False)
+    assert limiter.hit('ip') == (True, 0.0)
+    assert limiter.hit('ip') == (True, 0.0)
+    stored = redis_client.get('rate_limit:ip')
+
+    allowed, retry_after = limiter.hit('ip')
+    # The next slot opens one emission interval (60s / 2) later
+    assert not allowed and 29 < retry_after <= 30
+    assert redis_client.get('rate_limit:ip') == stored
+    assert redis_client.keys('rate_limit:*') == [b'rate_limit:ip']
+    assert 0 < redis_client.pttl('rate_limit:ip') <= 60000
+    assert limiter.hit('other') == (True, 0.0)
+
+def test_script_denies_when_local_buckets_are_split():
+    # Two processes each see half the traffic; Redis enforces the total
+    redis_client = fakeredis.FakeRedis(server=fakeredis.FakeServer())
+    limiters = [RateLimiter(redis_client, 2, 60) for _ in range(2)]
+    assert limiters[0].hit('ip')[0] and limiters[1].hit('ip')[0]
+    allowed, retry_after = limiters[0].hit('ip')
+    assert not allowed and retry_after > 0
+
+def test_login_is_limited_per_client(client):
+    attempt = {'email': 'nobody@example.com', 'password': 'wrong'}
+    statuses = [client.post('/api/auth/login', json=attempt).status_code for _ in range(11)]
+    assert statuses == [401] * 10 + [429]
+    response = client.post('/api/auth/login', json=attempt)
+    assert response.status_code == 429
+    assert response.get_json() == {'error': 'Rate limit exceeded'}
+    assert int(response.headers['Retry-After']) >= 1
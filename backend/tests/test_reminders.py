@@ -0,0 +1,105 @@
+from datetime import date, datetime, timedelta
+import pytest
+from app import db
+from app.models import (Account, Bill, CostCenter, LinkedAccountMeter, Meter, Notification, Organization,
+                        ReminderState, Site, User)
+from app.services import reminders
+from app.services.reminders import STATE_NAME, run_reminders
+
+NOW = datetime(2024, 5, 10, 13, 30)
+TODAY = NOW.date()
+
+
+@pytest.fixture
+def orgs(app):
+    app.config.update(REMINDER_LEAD_DAYS='7,1,-1', REMINDER_HOUR=13)
+    cost_center = CostCenter(name='Facilities', code='FAC')
+    db.session.add(cost_center)
+    db.session.flush()
+    links = {}
+    for name in ('ours', 'theirs'):
+        organization = Organization(name=name)
+        db.session.add(organization)
+        db.session.flush()
+        site = Site(name=f'{name} site', organization_id=organization.id)
+        db.session.add(site)
+        db.session.flush()
+        meter = Meter(number=f'{name}-m', site_id=site.id, utility_type='electricity')
+        account = Account(number=f'{name}-acct', cost_center_id=cost_center.id)
+        db.session.add_all([meter, account])
+        db.session.flush()
+        link = LinkedAccountMeter(account_id=account.id, meter_id=meter.id, start_date=date(2024, 1, 1))
+        db.session.add(link)
+        for i in range(2):
+            db.session.add(User(email=f'{name}{i}@example.com', password_hash='-', name=name,
+                                organization_id=organization.id, role='user'))
+        db.session.flush()
+        links[name] = link
+    db.session.commit()
+    return links
+
+
+def _bill(link, due_date, amount=10.0, status='pending'):
+    db.session.add(Bill(linked_account_meter_id=link.id, bill_date=due_date - timedelta(days=30),
+                        due_date=due_date, amount=amount, status=status))
+
+
+def test_first_run_sends_todays_windows_then_idles(orgs):
+    _bill(orgs['ours'], TODAY + timedelta(days=7))
+    db.session.commit()
+
+    result = run_reminders(NOW)
+    assert (result['status'], result['days'], result['bills'], result['notifications']) == \
+        ('success', 1, 1, 2)
+    state = db.session.get(ReminderState, STATE_NAME)
+    assert state.processed_through == TODAY
+    assert state.next_fire_at == datetime(2024, 5, 11, 13)
+
+    assert run_reminders(NOW + timedelta(hours=1)) == \
+        {'status': 'idle', 'next_fire_at': '2024-05-11T13:00:00'}
+    assert Notification.query.count() == 2
+
+
+def test_leads_include_the_overdue_window(orgs):
+    link = orgs['ours']
+    for days, amount in ((7, 1.0), (1, 2.0), (-1, 4.0), (3, 8.0), (0, 16.0)):
+        _bill(link, TODAY + timedelta(days=days), amount)
+    _bill(link, TODAY + timedelta(days=1), 32.0, status='rejected')
+    db.session.commit()
+
+    run_reminders(NOW)
+    notification = Notification.query.first()
+    assert notification.title == '3 bills coming due, 1 overdue'
+    payload = notification.payload
+    assert (payload['count'], payload['overdue'], payload['total_amount']) == (3, 1, 7.0)
+    assert [bill['days_until_due'] for bill in payload['bills']] == [-1, 1, 7]
+
+
+def test_missed_days_are_caught_up(orgs):
+    db.session.add(ReminderState(name=STATE_NAME, processed_through=TODAY - timedelta(days=3),
+                                 next_fire_at=datetime(2024, 5, 8, 13)))
+    # Windows that opened on each missed day, and one already sent before them
+    for days in (7 - 2, 7 - 1, 7, 7 - 3):
+        _bill(orgs['ours'], TODAY + timedelta(days=days))
+    db.session.commit()
+
+    result = run_reminders(NOW)
+    assert (result['days'], result['bills']) == (3, 3)
+
+
+def test_digests_are_per_organization_and_truncated(orgs, monkeypatch):
+    monkeypatch.setattr(reminders, 'DIGEST_MAX_BILLS', 2)
+    for amount in (1.0, 2.0, 3.0):
+        _bill(orgs['ours'], TODAY + timedelta(days=1), amount)
+    _bill(orgs['theirs'], TODAY + timedelta(days=7), 5.0)
+    db.session.commit()
+
+    run_reminders(NOW)
+    by_user = {n.user_id: n for n in Notification.query.all()}
+    users = {u.id: u.email for u in User.query.all()}
+    ours = [n for user_id, n in by_user.items() if users[user_id].startswith('ours')]
+    theirs = [n for user_id, n in by_user.items() if users[user_id].startswith('theirs')]
+    assert len(ours) == len(theirs) == 2
+    assert ours[0].payload['count'] == 3 and len(ours[0].payload['bills']) == 2
+    assert ours[0].payload['total_amount'] == 6.0
+    assert theirs[0].payload['count'] == 1 and theirs[0].title == '1 bill coming due'
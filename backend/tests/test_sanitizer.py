@@ -0,0 +1,81 @@
+from datetime import date
+from flask_jwt_extended import create_access_token
+from marshmallow import Schema, fields, validate
+from app import db
+from app.models import Account, Bill, CostCenter, LinkedAccountMeter, Meter, Organization, Site, User
+from app.security.sanitizer import ResponseSanitizer, safe_fields_from_schema
+from app.schemas import BillSchema
+
+class CountingCleaner:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, value):
+        self.calls.append(value)
+        return value.replace('<', '').replace('>', '')
+
+def test_plain_strings_skip_cleaning():
+    cleaner = CountingCleaner()
+    data = {'status': 'approved', 'bill_date': '2024-01-31', 'amount': '12.50'}
+    assert ResponseSanitizer(clean=cleaner).sanitize(data) == data
+    assert cleaner.calls == []
+
+def test_markup_is_cleaned_once_per_value():
+    cleaner = CountingCleaner()
+    data = [{'note': '<b>x</b>'}, {'note': '<b>x</b>', 'tags': ['<i>', 'ok']}]
+    result = ResponseSanitizer(clean=cleaner).sanitize(data)
+    assert result == [{'note': 'bx/b'}, {'note': 'bx/b', 'tags': ['i', 'ok']}]
+    assert cleaner.calls == ['<b>x</b>', '<i>']
+
+def test_safe_fields_are_not_inspected():
+    cleaner = CountingCleaner()
+    data = {'status': '<pending>', 'message': '<pending>'}
+    result = ResponseSanitizer({'status'}, clean=cleaner).sanitize(data)
+    assert result == {'status': '<pending>', 'message': 'pending'}
+
+def test_schema_declares_safe_fields():
+    safe = safe_fields_from_schema(BillSchema())
+    assert {'bill_date', 'due_date', 'status'} <= safe
+    assert not {'file_path', 'source_type'} & safe
+    assert 'status' in safe.nested['audits']
+
+def test_free_text_cannot_be_marked_safe():
+    class NoteSchema(Schema):
+        note = fields.Str(metadata={'safe': True})
+        site_name = fields.Str(dump_only=True, metadata={'safe': True})
+        kind = fields.Str(dump_only=True, validate=validate.OneOf(['digest']), metadata={'safe': True})
+    assert safe_fields_from_schema(NoteSchema()) == {'kind'}
+
+def test_safe_fields_apply_at_their_own_level():
+    cleaner = CountingCleaner()
+    sanitizer = ResponseSanitizer(safe_fields_from_schema(BillSchema()), clean=cleaner)
+    data = [{'status': '<s>', 'source_type': '<t>', 'vendor': {'status': '<v>'},
+             'audits': [{'status': '<a>', 'message': '<m>'}]}]
+    assert sanitizer.sanitize(data) == [{'status': '<s>', 'source_type': 't', 'vendor': {'status': 'v'},
+                                         'audits': [{'status': '<a>', 'message': 'm'}]}]
+
+def test_bill_endpoints_strip_markup_from_free_text(client):
+    organization = Organization(name='Org')
+    cost_center = CostCenter(name='Facilities', code='FAC')
+    db.session.add_all([organization, cost_center])
+    db.session.flush()
+    site = Site(name='<b>Plant</b>', organization_id=organization.id)
+    db.session.add(site)
+    db.session.flush()
+    meter = Meter(number='MTR-1', site_id=site.id, utility_type='electricity')
+    account = Account(number='ACCT-1', cost_center_id=cost_center.id)
+    db.session.add_all([meter, account])
+    db.session.flush()
+    link = LinkedAccountMeter(account_id=account.id, meter_id=meter.id, start_date=date(2024, 1, 1))
+    user = User(email='u@example.com', password_hash='-', name='U', organization_id=organization.id, role='user')
+    db.session.add_all([link, user])
+    db.session.flush()
+    db.session.add(Bill(linked_account_meter_id=link.id, bill_date=date(2024, 1, 1), due_date=date(2024, 2, 1),
+                        amount=10.0, source_type='<script>x</script>PDF'))
+    db.session.commit()
+    headers = {'Authorization': f"Bearer {create_access_token(identity=str(user.id))}"}
+
+    [bill] = client.get('/api/bills', headers=headers).get_json()
+    assert (bill['source_type'], bill['status']) == ('xPDF', 'pending')
+    [result] = client.get('/api/bills/search?q=acct', headers=headers).get_json()['results']
+    assert (result['site_name'], result['account_number']) == ('Plant', 'ACCT-1')
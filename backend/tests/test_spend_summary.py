@@ -0,0 +1,93 @@
+from datetime import date
+import pytest
+from app import db
+from app.models import Account, Bill, CostCenter, LinkedAccountMeter, Meter, Organization, Site
+from app.services.spend_summary import GENERATION_KEY, compute_spend_summary, get_spend_summary, parse_period
+
+def test_quarter_month_and_year_periods():
+    assert parse_period('2024-Q1') == (date(2024, 1, 1), date(2024, 3, 31))
+    assert parse_period('2024-Q4') == (date(2024, 10, 1), date(2024, 12, 31))
+    assert parse_period('2024-02') == (date(2024, 2, 1), date(2024, 2, 29))
+    assert parse_period('2023') == (date(2023, 1, 1), date(2023, 12, 31))
+
+def test_invalid_period_is_rejected():
+    with pytest.raises(ValueError):
+        parse_period('2024-Q5')
+    with pytest.raises(ValueError):
+        parse_period('last quarter')
+
+
+@pytest.fixture
+def sites(app):
+    ours, theirs = Organization(name='Ours'), Organization(name='Theirs')
+    cost_center = CostCenter(name='Facilities', code='FAC')
+    db.session.add_all([ours, theirs, cost_center])
+    db.session.flush()
+    plant, office = Site(name='Plant', organization_id=ours.id), Site(name='Office', organization_id=ours.id)
+    db.session.add_all([plant, office])
+    db.session.flush()
+    links = {}
+    for site, utility_type in ((plant, 'electricity'), (plant, 'gas'), (office, 'electricity')):
+        meter = Meter(number=f'{site.name}-{utility_type}', site_id=site.id, utility_type=utility_type)
+        account = Account(number=f'A-{site.name}-{utility_type}', cost_center_id=cost_center.id)
+        db.session.add_all([meter, account])
+        db.session.flush()
+        link = LinkedAccountMeter(account_id=account.id, meter_id=meter.id, start_date=date(2024, 1, 1))
+        db.session.add(link)
+        links[(site.name, utility_type)] = link
+    db.session.commit()
+    return {'ours': ours, 'theirs': theirs, 'plant': plant, 'links': links}
+
+
+def _bill(link, bill_date, amount, usage):
+    db.session.add(Bill(linked_account_meter_id=link.id, bill_date=bill_date, due_date=bill_date,
+                        amount=amount, usage_amount=usage))
+
+
+def test_summary_adds_up_meter_rows(sites):
+    links = sites['links']
+    _bill(links[('Plant', 'electricity')], date(2024, 1, 15), 100.0, 1000.0)
+    _bill(links[('Plant', 'electricity')], date(2024, 2, 15), 50.0, 500.0)
+    _bill(links[('Plant', 'gas')], date(2024, 1, 15), 30.0, 20.0)
+    _bill(links[('Office', 'electricity')], date(2024, 3, 15), 40.0, None)
+    _bill(links[('Office', 'electricity')], date(2024, 4, 15), 999.0, 1.0)
+    db.session.commit()
+
+    summary = compute_spend_summary(sites['ours'].id, *parse_period('2024-Q1'))
+    assert summary['total'] == {'spend': 220.0, 'usage': 1520.0, 'bills': 4}
+    assert summary['utility_types'] == {'electricity': {'spend': 190.0, 'usage': 1500.0, 'bills': 3},
+                                        'gas': {'spend': 30.0, 'usage': 20.0, 'bills': 1}}
+    plant, office = summary['sites']
+    assert (plant['name'], plant['spend'], plant['bills'], len(plant['meters'])) == ('Plant', 180.0, 3, 2)
+    assert plant['utility_types']['gas'] == {'spend': 30.0, 'usage': 20.0, 'bills': 1}
+    assert (office['name'], office['spend'], office['usage']) == ('Office', 40.0, 0.0)
+
+
+def test_cache_is_invalidated_on_commit_only(app, sites):
+    link = sites['links'][('Plant', 'electricity')]
+    organization_id = sites['ours'].id
+    start, end = parse_period('2024')
+    assert get_spend_summary(organization_id, start, end)['total']['bills'] == 0
+
+    _bill(link, date(2024, 1, 15), 100.0, 1.0)
+    db.session.flush()
+    db.session.rollback()
+    assert app.redis.get(GENERATION_KEY.format(organization_id)) is None
+
+    _bill(link, date(2024, 1, 15), 100.0, 1.0)
+    db.session.commit()
+    assert get_spend_summary(organization_id, start, end)['total']['bills'] == 1
+
+
+def test_moving_a_site_invalidates_both_organizations(app, sites):
+    _bill(sites['links'][('Plant', 'electricity')], date(2024, 1, 15), 100.0, 1.0)
+    db.session.commit()
+    start, end = parse_period('2024')
+    ours, theirs = sites['ours'].id, sites['theirs'].id
+    assert get_spend_summary(ours, start, end)['total']['bills'] == 1
+    assert get_spend_summary(theirs, start, end)['total']['bills'] == 0
+
+    sites['plant'].organization_id = theirs
+    db.session.commit()
+    assert get_spend_summary(ours, start, end)['total']['bills'] == 0
+    assert get_spend_summary(theirs, start, end)['total']['bills'] == 1
@@ -0,0 +1,64 @@
+import pytest
+from flask_jwt_extended import create_access_token
+from app import db
+from app.models import Organization, User
+
+PDF = b'%PDF-1.4\n1 0 obj\n<<>>\nendobj\ntrailer\n<<>>\n%%EOF\n'
+PNG = b'\x89PNG\r\n\x1a\n' + bytes(64)
+
+
+@pytest.fixture
+def setup(app, monkeypatch):
+    from app.api import uploads
+
+    organization = Organization(name='Ours')
+    db.session.add(organization)
+    db.session.flush()
+    user = User(email='u@example.com', password_hash='-', name='U', organization_id=organization.id,
+                role='user')
+    db.session.add(user)
+    db.session.commit()
+
+    queued = []
+    monkeypatch.setattr(uploads, 'register_job', lambda *args: None)
+    monkeypatch.setattr(uploads, 'enqueue_bill_file', lambda *args, **kwargs: queued.append((args, kwargs)))
+    return {'queued': queued,
+            'headers': {'Authorization': f"Bearer {create_access_token(identity=str(user.id))}"}}
+
+
+def _upload(client, headers, filename, content):
+    session = client.post('/api/uploads', json={'filename': filename, 'size': len(content)},
+                          headers=headers).get_json()
+    response = client.put(f"/api/uploads/{session['upload_id']}/parts/1", data=content,
+                          headers={**headers, 'Content-Type': 'application/octet-stream'})
+    assert response.status_code == 200
+    # Completing sends no body, so no JSON Content-Type either
+    return client.post(f"/api/uploads/{session['upload_id']}/complete", headers=headers)
+
+
+def test_completed_upload_is_queued_with_its_detected_type(client, setup):
+    response = _upload(client, setup['headers'], 'bill.pdf', PDF)
+    assert response.status_code == 202
+    [(args, kwargs)] = setup['queued']
+    assert kwargs['mime_type'] == 'application/pdf'
+    assert kwargs['bulk'] is True
+
+
+def test_completed_upload_of_a_disallowed_type_is_rejected(app, client, setup, monkeypatch):
+    storage_key = []
+    original = app.storage.complete_multipart
+    monkeypatch.setattr(app.storage, 'complete_multipart',
+                        lambda key, *args: (storage_key.append(key), original(key, *args))[1])
+
+    response = _upload(client, setup['headers'], 'bill.pdf', PNG)
+    assert response.status_code == 415
+    assert response.get_json()['error'].startswith('Unsupported file type')
+    assert setup['queued'] == []
+    with pytest.raises(FileNotFoundError):
+        app.storage.open(storage_key[0])
+
+
+def test_posts_with_a_non_json_body_are_still_refused(client, setup):
+    response = client.post('/api/uploads', data='filename=bill.pdf',
+                           headers={**setup['headers'], 'Content-Type': 'text/plain'})
+    assert response.status_code == 415
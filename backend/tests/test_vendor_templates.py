@@ -0,0 +1,86 @@
+from datetime import date
+import pytest
+from app.services.vendor_templates import VendorTemplate, TemplateError
+
+TEMPLATE = {
+    'vendor_code': 'ACME',
+    'fields': {
+        'amount': {'bbox': [300, 100, 500, 120], 'pattern': r'\$\s*(\(?[\d,]+\.\d{2}\)?)', 'type': 'amount'},
+        'due_date': {'anchor': 'Payment Due', 'search_bbox': [0, 150, 612, 300], 'offset': [0, 0, 200, 15],
+                     'pattern': r'Due\s*(\d{2}/\d{2}/\d{4})', 'type': 'date'},
+        'usage_amount': {'bbox': [0, 0, 10, 10], 'type': 'number', 'required': False},
+    }
+}
+
+class FakeRegion:
+    def __init__(self, text):
+        self.text = text
+
+    def extract_text(self):
+        return self.text
+
+class FakeBand:
+    def __init__(self, bbox, anchors):
+        self.bbox = bbox
+        self.anchors = anchors
+
+    def search(self, text, regex=False, case=True):
+        x0, top, x1, bottom = self.bbox
+        match = self.anchors.get(text)
+        inside = match is not None and x0 <= match['x0'] <= x1 and top <= match['top'] <= bottom
+        return [match] if inside else []
+
+class FakePage:
+    width, height = 612, 792
+
+    def __init__(self, regions, anchors):
+        self.regions = regions
+        self.anchors = anchors
+        self.requested = []
+        self.cropped = []
+
+    def crop(self, bbox):
+        self.cropped.append(bbox)
+        return FakeBand(bbox, self.anchors)
+
+    def within_bbox(self, bbox):
+        self.requested.append(bbox)
+        return FakeRegion(self.regions.get(bbox, ''))
+
+class FakePdf:
+    def __init__(self, pages):
+        self.pages = pages
+
+def test_extracts_only_declared_regions():
+    page = FakePage(
+        {(300, 100, 500, 120): 'Amount Due $ 1,234.50', (50, 200, 250, 215): 'Payment Due 03/15/2024'},
+        {'Payment Due': {'x0': 50, 'top': 200}}
+    )
+    values = VendorTemplate.compile(TEMPLATE).extract(FakePdf([page]))
+    assert values == {'amount': 1234.5, 'due_date': date(2024, 3, 15)}
+    assert len(page.requested) == 3
+    assert page.cropped == [(0, 150, 612, 300)]
+
+def test_anchor_outside_its_band_is_not_found():
+    page = FakePage({(300, 100, 500, 120): '$ 12.50'}, {'Payment Due': {'x0': 50, 'top': 600}})
+    page.regions[(50, 600, 250, 615)] = 'Due 01/02/2024'
+    with pytest.raises(TemplateError):
+        VendorTemplate.compile(TEMPLATE).extract(FakePdf([page]))
+
+def test_credit_amounts_are_negative():
+    page = FakePage({(300, 100, 500, 120): '$ (12.50)'}, {'Payment Due': {'x0': 50, 'top': 200}})
+    page.regions[(50, 200, 250, 215)] = 'Due 01/02/2024'
+    assert VendorTemplate.compile(TEMPLATE).extract(FakePdf([page]))['amount'] == -12.5
+
+def test_missing_required_field_raises():
+    page = FakePage({}, {})
+    with pytest.raises(TemplateError):
+        VendorTemplate.compile(TEMPLATE).extract(FakePdf([page]))
+
+def test_invalid_templates_are_rejected():
+    with pytest.raises(TemplateError):
+        VendorTemplate.compile({'vendor_code': 'X', 'fields': {'a': {'bbox': [0, 0, 1, 1], 'pattern': 'no group'}}})
+    with pytest.raises(TemplateError):
+        VendorTemplate.compile({'vendor_code': 'X', 'fields': {'a': {'pattern': '(x)'}}})
+    with pytest.raises(TemplateError):
+        VendorTemplate.compile({'vendor_code': 'X', 'fields': {'a': {'anchor': 'Due', 'pattern': '(x)'}}})